@@ -18,72 +18,39 @@ from datetime import timedelta
 from decimal import Decimal
 
 import pandas as pd
-import yfinance as yf
 
+from core import price_history
+from core.instruments import get_currencies
+from core.market_data import get_provider
+from core.market_hours import exchange_for, is_trading_day
 from portfolios.models import Portfolio, PortfolioSnapshot
 from portfolios.constants import BENCHMARK_CHOICES
 
 today = timezone.now().date()
 
 
-def _get_close_series(hist_df, symbol, symbol_count):
-    if hist_df is None or hist_df.empty:
-        return None
-
-    if isinstance(hist_df.columns, pd.MultiIndex):
-        if symbol in hist_df.columns.get_level_values(0):
-            try:
-                return hist_df[symbol]["Close"]
-            except KeyError:
-                return None
-    elif symbol_count == 1 and "Close" in hist_df.columns:
-        return hist_df["Close"]
-
-    return None
-
-
-def build_currency_map(symbols, tickers=None):
+def build_currency_map(symbols, provider=None):
     if not symbols:
         return {}
 
-    tickers_obj = tickers or yf.Tickers(" ".join(symbols))
-    currency_map = {}
-    for symbol in symbols:
-        try:
-            info = tickers_obj.tickers.get(symbol)
-            currency = None
-            if info is not None:
-                fast_info = getattr(info, "fast_info", {})
-                currency = fast_info.get("currency") if hasattr(fast_info, "get") else None
-            currency_map[symbol] = currency or "USD"
-        except Exception:
-            currency_map[symbol] = "USD"
+    # Read from the Instrument table; only unknown symbols go upstream.
+    # Symbols whose currency cannot be found map to None.
+    return get_currencies(symbols, provider=provider, default=None)
 
-    return currency_map
 
-
-def _series_by_date(close_series):
-    close_series = close_series.copy()
-    close_series.index = close_series.index.date
-    close_series = close_series[~close_series.index.duplicated(keep="last")]
-    return close_series.sort_index()
-
-
-def build_price_history_maps(symbols, currency_map, price_hist, target_dates, total_symbol_count=None):
-    if not symbols or price_hist is None or price_hist.empty:
+def build_price_history_maps(symbols, currency_map, closes, target_dates):
+    if not symbols or not closes:
         return {snap_date: {} for snap_date in target_dates}
 
     price_map_by_date = {snap_date: {} for snap_date in target_dates}
     sorted_dates = sorted(target_dates)
-    symbol_count = total_symbol_count or len(symbols)
 
     for symbol in symbols:
         try:
-            close_series = _get_close_series(price_hist, symbol, symbol_count)
+            close_series = closes.get(symbol)
             if close_series is None or close_series.empty:
                 continue
 
-            close_series = _series_by_date(close_series)
             all_dates = sorted(set(close_series.index).union(sorted_dates))
             filled = close_series.reindex(all_dates).ffill()
 
@@ -103,22 +70,19 @@ def build_price_history_maps(symbols, currency_map, price_hist, target_dates, to
     return price_map_by_date
 
 
-def build_fx_history_maps(currencies, fx_hist, target_dates, total_symbol_count=None):
-    if not currencies or fx_hist is None or fx_hist.empty:
+def build_fx_history_maps(currencies, closes, target_dates):
+    if not currencies or not closes:
         return {snap_date: {} for snap_date in target_dates}
 
-    fx_symbols = [f"{currency}USD=X" for currency in currencies if currency]
     fx_map_by_date = {snap_date: {} for snap_date in target_dates}
     sorted_dates = sorted(target_dates)
-    symbol_count = total_symbol_count or len(fx_symbols)
 
     for currency in currencies:
         try:
-            close_series = _get_close_series(fx_hist, f"{currency}USD=X", symbol_count)
+            close_series = closes.get(f"{currency}USD=X")
             if close_series is None or close_series.empty:
                 continue
 
-            close_series = _series_by_date(close_series)
             all_dates = sorted(set(close_series.index).union(sorted_dates))
             filled = close_series.reindex(all_dates).ffill()
 
@@ -134,16 +98,15 @@ def build_fx_history_maps(currencies, fx_hist, target_dates, total_symbol_count=
     return fx_map_by_date
 
 
-def build_benchmark_price_maps(benchmark_symbols, currency_map, price_hist, fx_map_by_date, target_dates, total_symbol_count=None):
+def build_benchmark_price_maps(benchmark_symbols, currency_map, closes, fx_map_by_date, target_dates):
     if not benchmark_symbols:
         return {snap_date: {} for snap_date in target_dates}
 
     price_maps = build_price_history_maps(
         benchmark_symbols,
         currency_map,
-        price_hist,
+        closes,
         target_dates,
-        total_symbol_count=total_symbol_count,
     )
 
     benchmark_maps = {snap_date: {} for snap_date in target_dates}
@@ -151,13 +114,15 @@ def build_benchmark_price_maps(benchmark_symbols, currency_map, price_hist, fx_m
     for snap_date in target_dates:
         fx_map = fx_map_by_date.get(snap_date, {})
         for symbol, close_local in price_maps.get(snap_date, {}).items():
-            fx_currency = currency_map.get(symbol, "USD")
+            fx_currency = currency_map.get(symbol)
             if fx_currency == "GBp":
                 fx_currency = "GBP"
 
-            fx_rate = Decimal("1.0")
-            if fx_currency and fx_currency != "USD":
-                fx_rate = fx_map.get(fx_currency, Decimal("1.0"))
+            fx_rate = Decimal("1.0") if fx_currency == "USD" else fx_map.get(fx_currency)
+            if fx_rate is None:
+                # Unknown currency or no FX rate: leave the benchmark out
+                # rather than store a local-currency close as USD
+                continue
 
             # Convert to float for JSON serialization on PortfolioSnapshot
             benchmark_maps[snap_date][symbol] = float(close_local * fx_rate)
@@ -173,55 +138,48 @@ for p in portfolios:
 benchmark_symbols = [ticker for ticker, _ in BENCHMARK_CHOICES]
 all_requested_symbols = sorted(all_symbols.union(set(benchmark_symbols)))
 
-tickers = yf.Tickers(" ".join(all_requested_symbols)) if all_requested_symbols else None
-currency_map = build_currency_map(all_requested_symbols, tickers=tickers)
+provider = get_provider()
+currency_map = build_currency_map(all_requested_symbols, provider=provider)
 
 fx_currency_map = {
-    symbol: ("GBP" if currency_map.get(symbol) == "GBp" else currency_map.get(symbol, "USD"))
+    symbol: ("GBP" if currency_map.get(symbol) == "GBp" else currency_map.get(symbol) or "USD")
     for symbol in all_requested_symbols
 }
 fx_currencies = {currency for currency in fx_currency_map.values() if currency and currency != "USD"}
 
 start_date = today - timedelta(days=21)
-end_date = today + timedelta(days=1)
 
 fx_symbols = [f"{currency}USD=X" for currency in fx_currencies if currency]
 download_symbols = list(dict.fromkeys(all_requested_symbols + fx_symbols))
 
-price_hist = (
-    yf.download(
-        download_symbols,
-        start=start_date.isoformat(),
-        end=end_date.isoformat(),
-        interval="1d",
-        group_by="ticker",
-        progress=False,
-    )
-    if download_symbols
-    else None
-)
-
-snapshot_dates = [today - timedelta(days=days_ago) for days_ago in range(14, 0, -1) if (today - timedelta(days=days_ago)).weekday() <= 4]
+# Closes come from the local price-history store; only days it has not seen
+# yet are downloaded
+closes = price_history.get_closes(download_symbols, start_date, today, provider=provider)
+
+# A date gets a snapshot when any exchange our symbols trade on was open
+exchanges = {exchange_for(symbol) for symbol in all_requested_symbols} or {exchange_for("^GSPC")}
+snapshot_dates = [
+    today - timedelta(days=days_ago)
+    for days_ago in range(14, 0, -1)
+    if any(is_trading_day(exchange, today - timedelta(days=days_ago)) for exchange in exchanges)
+]
 price_maps_by_date = build_price_history_maps(
     all_symbols,
     currency_map,
-    price_hist,
+    closes,
     snapshot_dates,
-    total_symbol_count=len(download_symbols),
 )
 fx_maps_by_date = build_fx_history_maps(
     fx_currencies,
-    price_hist,
+    closes,
     snapshot_dates,
-    total_symbol_count=len(download_symbols),
 )
 benchmark_price_maps_by_date = build_benchmark_price_maps(
     benchmark_symbols,
     currency_map,
-    price_hist,
+    closes,
     fx_maps_by_date,
     snapshot_dates,
-    total_symbol_count=len(download_symbols),
 )
 
 for p in portfolios:
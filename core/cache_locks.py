@@ -0,0 +1,58 @@
+"""Atomic read-modify-write on the shared ``market_data`` cache.
+
+Django's file-based cache implements ``add`` as "has key, then set" and
+``incr`` as "get, then set", so two workers can both win an ``add`` and
+concurrent increments can be lost. Claims, counters and token buckets kept
+in that cache therefore do their read and write while holding an exclusive
+``fcntl.flock`` on a per-key lock file under ``MARKET_DATA_LOCK_DIR`` (as
+``core.price_history`` does for its close files). The lock is shared by
+every thread and process on the host, whatever the cache backend.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "trackstack-market-data-locks")
+
+
+def _path(key):
+    directory = getattr(settings, "MARKET_DATA_LOCK_DIR", DEFAULT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    name = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+    return os.path.join(directory, f"{name}.lock")
+
+
+@contextmanager
+def held(key):
+    """Hold the host-wide lock for cache ``key`` for the duration of the block."""
+
+    fd = os.open(_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+b") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def add(cache, key, value, timeout):
+    """``cache.add`` that only one caller on the host can win."""
+
+    with held(key):
+        if cache.get(key) is not None:
+            return False
+        cache.set(key, value, timeout=timeout)
+        return True
+
+
+def incr(cache, key, amount=1):
+    """Add ``amount`` to the counter at ``key`` (created at zero, never expiring)."""
+
+    with held(key):
+        value = (cache.get(key) or 0) + amount
+        cache.set(key, value, timeout=None)
+        return value
@@ -0,0 +1,168 @@
+"""Circuit breaker and per-request retry budget for upstream market data.
+
+Breaker state lives in the shared ``market_data`` cache, so once enough calls
+fail inside ``UPSTREAM_BREAKER_WINDOW`` seconds (successes in between do not
+reset the count) every worker stops calling Yahoo for
+``UPSTREAM_BREAKER_COOLDOWN`` seconds and callers fall back to the last known
+cached data. After the cooldown the breaker is half-open: exactly one caller
+across all workers wins the trial claim and goes upstream while everyone else
+keeps the fallback. A failed trial reopens the breaker for another cooldown,
+a successful one closes it. Updates run under ``core.cache_locks`` so
+concurrent workers cannot lose failures or both win the trial.
+
+Retries are capped per web request by a budget held in a context variable
+(see ``core.middleware.UpstreamBudgetMiddleware``), so one slow request cannot
+keep a worker busy retrying on a dead upstream.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import cache_locks
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "market_data"
+FAILURES_KEY = "breaker:{name}:failures"
+OPEN_KEY = "breaker:{name}:open"
+TRIAL_KEY = "breaker:{name}:trial"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_WINDOW = 60
+DEFAULT_COOLDOWN = 30
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, window, cooldown):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.cooldown = cooldown
+
+    @property
+    def _cache(self):
+        return caches[CACHE_ALIAS]
+
+    def is_open(self):
+        """True from opening until a trial call succeeds (including half-open)."""
+
+        return self._cache.get(OPEN_KEY.format(name=self.name)) is not None
+
+    def allow_call(self):
+        """Whether a call may go upstream now.
+
+        Always while closed and never during the cooldown. Once it is over,
+        only the caller that wins the trial claim is let through; the claim
+        lapses after another cooldown if that caller never reports back.
+        """
+
+        cache = self._cache
+        reopens_at = cache.get(OPEN_KEY.format(name=self.name))
+        if reopens_at is None:
+            return True
+        if time.time() < reopens_at:
+            return False
+        return cache_locks.add(
+            cache, TRIAL_KEY.format(name=self.name), True, max(1, self.cooldown)
+        )
+
+    def record_success(self):
+        # Only a half-open breaker has anything to close
+        if self.is_open():
+            self.reset()
+            logger.info("Circuit %s closed after a successful trial call", self.name)
+
+    def record_failure(self):
+        cache = self._cache
+        key = FAILURES_KEY.format(name=self.name)
+        with cache_locks.held(key):
+            now = time.time()
+            failures = [at for at in cache.get(key) or [] if at > now - self.window]
+            failures.append(now)
+            cache.set(key, failures, timeout=self.window)
+            was_open = self.is_open()
+            if not was_open and len(failures) < self.failure_threshold:
+                return
+            cache.set(OPEN_KEY.format(name=self.name), now + self.cooldown, timeout=None)
+            cache.delete(TRIAL_KEY.format(name=self.name))
+        if was_open:
+            logger.warning(
+                "Circuit %s trial call failed; pausing upstream calls for %ss",
+                self.name,
+                self.cooldown,
+            )
+        else:
+            logger.warning(
+                "Circuit %s opened after %d failures; pausing upstream calls for %ss",
+                self.name,
+                len(failures),
+                self.cooldown,
+            )
+
+    def reset(self):
+        self._cache.delete_many(
+            [
+                FAILURES_KEY.format(name=self.name),
+                OPEN_KEY.format(name=self.name),
+                TRIAL_KEY.format(name=self.name),
+            ]
+        )
+
+
+def get_breaker():
+    """Return the breaker guarding all upstream market-data calls."""
+
+    return CircuitBreaker(
+        "upstream",
+        failure_threshold=getattr(
+            settings, "UPSTREAM_BREAKER_FAILURES", DEFAULT_FAILURE_THRESHOLD
+        ),
+        window=getattr(settings, "UPSTREAM_BREAKER_WINDOW", DEFAULT_WINDOW),
+        cooldown=getattr(settings, "UPSTREAM_BREAKER_COOLDOWN", DEFAULT_COOLDOWN),
+    )
+
+
+class RetryBudget:
+    """A thread-safe allowance of upstream retries shared by one request."""
+
+    def __init__(self, retries):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+_budget = contextvars.ContextVar("upstream_retry_budget", default=None)
+
+
+@contextmanager
+def retry_budget(retries):
+    """Cap upstream retries made inside the block (including worker threads
+    started with a copied context) at ``retries``."""
+
+    token = _budget.set(RetryBudget(retries))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def take_retry():
+    """Consume one retry; always allowed outside a budgeted block."""
+
+    budget = _budget.get()
+    return True if budget is None else budget.take()
@@ -0,0 +1,145 @@
+"""Process-wide FX rate cache.
+
+Rates are USD per unit of currency, fetched for every missing currency with
+one batched download and kept for ``FX_RATE_TTL`` seconds. Historical rates
+for past dates never change, so those are kept for the life of the process
+and read from the local price-history store once the day's close is final.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import price_history
+from .market_data import get_provider
+
+DEFAULT_TTL = 300
+
+_latest = {}  # currency -> (rate, fetched_at)
+_historical = {}  # (currency, date) -> (rate, fetched_at)
+_lock = threading.Lock()
+
+
+def fx_symbol(currency):
+    return f"{currency}USD=X"
+
+
+def clear():
+    with _lock:
+        _latest.clear()
+        _historical.clear()
+
+
+def _ttl():
+    return getattr(settings, "FX_RATE_TTL", DEFAULT_TTL)
+
+
+def _download_closes(currencies, **kwargs):
+    """Return ``{currency: close series}`` from one batched download."""
+
+    symbols = [fx_symbol(currency) for currency in currencies]
+    hist = get_provider().download(symbols, interval="1d", **kwargs)
+    closes = {}
+    for currency in currencies:
+        series = price_history.close_series(hist, fx_symbol(currency), len(symbols))
+        if series is not None and not series.empty:
+            closes[currency] = series
+    return closes
+
+
+def _wanted(currencies):
+    return sorted({currency for currency in currencies if currency and currency != "USD"})
+
+
+def get_fx_rates(currencies):
+    """Return ``{currency: latest USD rate}``, downloading only what is missing.
+
+    USD is always 1.0. Currencies Yahoo cannot price are left out of the
+    result rather than raising.
+    """
+
+    currencies = list(currencies)
+    rates = {"USD": 1.0} if "USD" in currencies else {}
+    now = time.time()
+    ttl = _ttl()
+
+    missing = []
+    with _lock:
+        for currency in _wanted(currencies):
+            cached = _latest.get(currency)
+            if cached is not None and now - cached[1] <= ttl:
+                rates[currency] = cached[0]
+            else:
+                missing.append(currency)
+
+    if missing:
+        try:
+            closes = _download_closes(missing, period="5d")
+        except Exception:
+            closes = {}
+        fetched = {currency: float(series.iloc[-1]) for currency, series in closes.items()}
+        with _lock:
+            for currency, rate in fetched.items():
+                _latest[currency] = (rate, now)
+        rates.update(fetched)
+
+    return rates
+
+
+def get_fx_rate(currency):
+    """Return the latest USD rate for ``currency`` or ``None`` if unavailable."""
+
+    if currency == "USD":
+        return 1.0
+    return get_fx_rates([currency]).get(currency)
+
+
+def get_fx_rates_on(date, currencies):
+    """Return ``{currency: USD rate}`` as of the last close on or before ``date``."""
+
+    currencies = list(currencies)
+    rates = {"USD": 1.0} if "USD" in currencies else {}
+    now = time.time()
+    ttl = _ttl()
+    is_past = date < timezone.now().date()
+
+    missing = []
+    with _lock:
+        for currency in _wanted(currencies):
+            cached = _historical.get((currency, date))
+            if cached is not None and (is_past or now - cached[1] <= ttl):
+                rates[currency] = cached[0]
+            else:
+                missing.append(currency)
+
+    if missing:
+        start = date - timedelta(days=7)
+        if date <= price_history.final_day(fx_symbol(missing[0])):
+            stored = price_history.get_closes([fx_symbol(c) for c in missing], start, date)
+            closes = {c: stored[fx_symbol(c)] for c in missing if fx_symbol(c) in stored}
+        else:
+            try:
+                closes = _download_closes(
+                    missing,
+                    start=start.isoformat(),
+                    end=(date + timedelta(days=1)).isoformat(),
+                )
+            except Exception:
+                closes = {}
+            closes = {
+                currency: series[series.index.date <= date]
+                for currency, series in closes.items()
+            }
+        fetched = {
+            currency: float(series.iloc[-1])
+            for currency, series in closes.items()
+            if not series.empty
+        }
+        with _lock:
+            for currency, rate in fetched.items():
+                _historical[(currency, date)] = (rate, now)
+        rates.update(fetched)
+
+    return rates
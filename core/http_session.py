@@ -0,0 +1,157 @@
+"""Pooled keep-alive HTTP session for all Yahoo Finance traffic.
+
+Left alone, yfinance builds a fresh session for every ``yf.download`` and
+re-negotiates cookie and crumb whenever its session changes, so cold workers
+pay for TLS handshakes on every batch. ``YFinanceProvider`` instead passes the
+one per-process session from ``get_session()`` to every call.
+
+curl keeps live connections (and TLS session tickets) per easy handle, and
+curl_cffi normally gives each thread its own handle. Quote fetches run on
+short-lived pool threads, so ``PooledSession`` hands out handles from a
+process-wide idle list instead: whichever thread makes the next request picks
+up an already connected handle.
+
+``warm()`` makes one cheap request at worker start (see ``core/wsgi.py``) so the
+first user request finds a connection and crumb ready. Every response records
+whether it reused a pooled connection and how long any new TLS handshake
+took; ``get_stats()`` reports the totals shared by every worker.
+"""
+import logging
+import os
+import threading
+
+from curl_cffi import Curl
+from curl_cffi import requests as curl_requests
+from curl_cffi.const import CurlInfo
+from django.conf import settings
+from django.core.cache import caches
+
+from . import cache_locks
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "market_data"
+STATS_KEY = "http-session-stats:{name}"
+STAT_NAMES = ("requests", "reused", "connects", "handshake_ms")
+DEFAULT_IMPERSONATE = "chrome"
+WARM_SYMBOL = "SPY"
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class PooledSession(curl_requests.Session):
+    """curl_cffi session sharing one pool of connected handles across threads."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault(
+            "curl_infos",
+            [CurlInfo.NUM_CONNECTS, CurlInfo.CONNECT_TIME, CurlInfo.APPCONNECT_TIME],
+        )
+        super().__init__(**kwargs)
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._checked_out = threading.local()
+
+    @property
+    def curl(self):
+        handle = getattr(self._checked_out, "handle", None)
+        return handle if handle is not None else super().curl
+
+    def request(self, *args, **kwargs):
+        with self._idle_lock:
+            # Most recently used first: it is the likeliest to be still connected
+            handle = self._idle.pop() if self._idle else None
+        self._checked_out.handle = handle or Curl(debug=self.debug)
+        try:
+            response = super().request(*args, **kwargs)
+        finally:
+            handle, self._checked_out.handle = self._checked_out.handle, None
+            with self._idle_lock:
+                self._idle.append(handle)
+        _record(response)
+        return response
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _bump(name, amount=1):
+    if amount <= 0:
+        return
+    cache_locks.incr(get_cache(), STATS_KEY.format(name=name), amount)
+
+
+def _record(response):
+    infos = getattr(response, "infos", None) or {}
+    connects = infos.get(CurlInfo.NUM_CONNECTS)
+    if connects is None:
+        return
+    try:
+        _bump("requests")
+        if connects:
+            _bump("connects", connects)
+            # Both times are measured from the start of the transfer
+            handshake = infos.get(CurlInfo.APPCONNECT_TIME, 0) - infos.get(
+                CurlInfo.CONNECT_TIME, 0
+            )
+            _bump("handshake_ms", round(max(handshake, 0) * 1000))
+        else:
+            _bump("reused")
+    except Exception:
+        # Metrics must never fail an upstream call
+        logger.debug("Could not record HTTP session stats", exc_info=True)
+
+
+def get_stats():
+    """Return connection reuse and handshake counters shared by every worker."""
+
+    cache = get_cache()
+    stats = {name: cache.get(STATS_KEY.format(name=name), 0) for name in STAT_NAMES}
+    requests = stats["requests"]
+    stats["reuse_ratio"] = stats["reused"] / requests if requests else None
+    stats["avg_handshake_ms"] = (
+        stats["handshake_ms"] / stats["connects"] if stats["connects"] else None
+    )
+    return stats
+
+
+def reset_stats():
+    get_cache().delete_many([STATS_KEY.format(name=name) for name in STAT_NAMES])
+
+
+def get_session():
+    """Return this process's pooled session, building a new one after a fork."""
+
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = PooledSession(
+                    impersonate=getattr(settings, "MARKET_DATA_IMPERSONATE", DEFAULT_IMPERSONATE)
+                )
+                _session_pid = pid
+    return _session
+
+
+def warm():
+    """Open a pooled connection and fetch Yahoo's cookie and crumb now."""
+
+    from .market_data import get_provider
+
+    provider = get_provider()
+    if provider.name == "replay":
+        return
+    try:
+        provider.get_history(WARM_SYMBOL, period="5d")
+    except Exception:
+        logger.warning("Could not warm the market data session", exc_info=True)
+
+
+def warm_in_background():
+    """Run ``warm()`` on a daemon thread so worker start-up is not delayed."""
+
+    threading.Thread(target=warm, name="market-data-warm", daemon=True).start()
@@ -0,0 +1,174 @@
+"""Instrument metadata (currency, names, exchange) stored in the database.
+
+A symbol's quote currency, pence-quoting, names and exchange practically never
+change, so they are looked up once, saved in the ``Instrument`` table and only
+re-checked after ``INSTRUMENT_REFRESH_SECONDS``. Missing rows are filled lazily
+from ``fast_info``; names are added whenever a full quote is fetched.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from portfolios.models import Instrument
+
+from .market_data import get_provider
+
+DEFAULT_REFRESH_SECONDS = 60 * 60 * 24 * 30
+LOOKUP_WORKERS = 8
+
+_memo = {}  # symbol -> (Instrument, expires_at epoch)
+_lock = threading.Lock()
+
+
+def clear():
+    with _lock:
+        _memo.clear()
+
+
+def _normalise(symbol):
+    return symbol.strip().upper()
+
+
+def _refresh_seconds():
+    return getattr(settings, "INSTRUMENT_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)
+
+
+def _remember(instrument):
+    expires_at = instrument.refreshed_at.timestamp() + _refresh_seconds()
+    with _lock:
+        _memo[instrument.symbol] = (instrument, expires_at)
+
+
+def cached_instrument(symbol):
+    """Return the memoised instrument for ``symbol`` without touching the DB."""
+
+    with _lock:
+        entry = _memo.get(_normalise(symbol))
+    if entry is None or entry[1] <= time.time():
+        return None
+    return entry[0]
+
+
+def _save(symbol, **fields):
+    fields = {key: value for key, value in fields.items() if value}
+    fields["refreshed_at"] = timezone.now()
+    try:
+        instrument, _ = Instrument.objects.update_or_create(
+            symbol=_normalise(symbol), defaults=fields
+        )
+    except DatabaseError:
+        return None
+    _remember(instrument)
+    return instrument
+
+
+def _lookup(symbol, provider):
+    try:
+        return symbol, provider.get_fast_info(symbol)
+    except Exception:
+        return symbol, None
+
+
+def get_instruments(symbols, provider=None, lookup=True):
+    """Return ``{symbol: Instrument}``, looking up unknown or expired symbols.
+
+    Symbols that cannot be looked up, or that are not stored yet when
+    ``lookup`` is false, are left out of the result.
+    """
+
+    symbols = list(dict.fromkeys(symbols))
+    found = {}
+    unknown = []
+    for symbol in symbols:
+        instrument = cached_instrument(symbol)
+        if instrument is not None:
+            found[symbol] = instrument
+        else:
+            unknown.append(symbol)
+
+    if unknown:
+        oldest = timezone.now() - timedelta(seconds=_refresh_seconds())
+        try:
+            rows = {
+                row.symbol: row
+                for row in Instrument.objects.filter(
+                    symbol__in={_normalise(symbol) for symbol in unknown},
+                    refreshed_at__gt=oldest,
+                )
+            }
+        except DatabaseError:
+            rows = {}
+        for row in rows.values():
+            _remember(row)
+        missing = []
+        for symbol in unknown:
+            row = rows.get(_normalise(symbol))
+            if row is not None and row.currency:
+                found[symbol] = row
+            else:
+                missing.append(symbol)
+
+        if missing and lookup:
+            provider = provider or get_provider()
+            workers = max(1, min(LOOKUP_WORKERS, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        lambda s: contextvars.copy_context().run(_lookup, s, provider),
+                        missing,
+                    )
+                )
+            for symbol, fast_info in results:
+                if not fast_info or not fast_info.get("currency"):
+                    continue
+                instrument = _save(
+                    symbol,
+                    currency=fast_info.get("currency"),
+                    exchange=fast_info.get("exchange"),
+                    timezone=fast_info.get("timezone"),
+                    quote_type=fast_info.get("quote_type"),
+                )
+                if instrument is not None:
+                    found[symbol] = instrument
+
+    return found
+
+
+def get_currencies(symbols, provider=None, default="USD"):
+    """Return ``{symbol: currency as quoted}`` (e.g. ``GBp``) for ``symbols``."""
+
+    instruments = get_instruments(symbols, provider=provider)
+    return {
+        symbol: (instruments[symbol].currency if symbol in instruments else default)
+        for symbol in symbols
+    }
+
+
+def remember_quotes(quotes):
+    """Save names, currency and exchange carried by full quotes.
+
+    Only symbols whose memoised row is missing a name are written, so repeated
+    quotes for the same symbol cost nothing.
+    """
+
+    for symbol, quote in quotes.items():
+        if quote.get("light") or quote.get("stale"):
+            continue
+        instrument = cached_instrument(symbol)
+        if instrument is not None and (instrument.long_name or instrument.short_name):
+            continue
+        if not (quote.get("shortName") or quote.get("longName")):
+            continue
+        _save(
+            symbol,
+            currency=quote.get("native_currency"),
+            short_name=quote.get("shortName"),
+            long_name=quote.get("longName"),
+            exchange=quote.get("exchange"),
+        )
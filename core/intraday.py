@@ -0,0 +1,165 @@
+"""Shared cache of intraday minute bars for each symbol's current session.
+
+Bars live in the shared ``market_data`` cache under one key per symbol, so a
+symbol is fetched once for every viewer and portfolio that holds it, whichever
+worker serves them. An entry is refreshed at most every
+``INTRADAY_REFRESH_SECONDS`` and only while its exchange has traded since the
+last fetch (see ``core.market_hours``). A refresh asks upstream only for bars
+from the last one stored onwards; the last bar is fetched again because it
+may have been incomplete. Symbols due together share one batched download.
+
+Bars are closes in the currency the symbol is quoted in (pence for ``GBp``).
+"""
+import logging
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import cache_locks, market_hours
+from .market_data import get_provider
+from .price_history import close_series
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "market_data"
+BARS_KEY = "intraday-bars:{symbol}"
+REFRESH_LOCK_KEY = "intraday-refresh:{symbol}"
+REFRESH_LOCK_SECONDS = 60
+BARS_TIMEOUT = 60 * 60 * 24 * 4
+BAR_INTERVAL = "1m"
+DEFAULT_REFRESH_SECONDS = 60
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _normalise(symbol):
+    return symbol.strip().upper()
+
+
+def _refresh_seconds():
+    return getattr(settings, "INTRADAY_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)
+
+
+def _as_series(entry):
+    return pd.Series(
+        entry["closes"],
+        index=pd.to_datetime(np.asarray(entry["times"], dtype="int64"), unit="s", utc=True),
+        dtype=float,
+    )
+
+
+def _is_due(symbol, entry, session, now):
+    if entry is None or entry["opens"] != session[0].timestamp():
+        return True
+    fetched_at = datetime.fromtimestamp(entry["fetched_at"], dt_timezone.utc)
+    return (now - fetched_at).total_seconds() >= _refresh_seconds() and (
+        market_hours.prices_changed_since(symbol, fetched_at, now)
+    )
+
+
+def _merge(entry, session, series, fetched_at):
+    """Splice freshly downloaded bars onto the stored ones for ``session``."""
+
+    opens, closes = (int(bound.timestamp()) for bound in session)
+    index = pd.DatetimeIndex(series.index)
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    times = np.asarray((index - EPOCH) // pd.Timedelta(seconds=1), dtype="int64")
+    keep = (times >= opens) & (times < closes) & ~np.isnan(series.to_numpy(dtype=float))
+    times, values = times[keep], series.to_numpy(dtype=float)[keep]
+
+    old_times, old_values = [], []
+    if entry is not None and entry["opens"] == opens:
+        old_times, old_values = entry["times"], entry["closes"]
+        if len(times):
+            cut = int(np.searchsorted(old_times, times[0]))
+            old_times, old_values = old_times[:cut], old_values[:cut]
+    return {
+        "opens": opens,
+        "times": list(old_times) + times.tolist(),
+        "closes": list(old_values) + values.tolist(),
+        "fetched_at": fetched_at,
+    }
+
+
+def get_bars(symbols, now=None, provider=None):
+    """Return ``{symbol: Series of minute closes}`` for each symbol's current session.
+
+    Due symbols are refreshed first unless another worker is already doing
+    so; on upstream failure whatever is cached is returned. Symbols without
+    any bars are left out.
+    """
+
+    now = now or timezone.now()
+    symbols = list(dict.fromkeys(_normalise(symbol) for symbol in symbols))
+    cache = get_cache()
+    entries = cache.get_many([BARS_KEY.format(symbol=symbol) for symbol in symbols])
+    entries = {symbol: entries.get(BARS_KEY.format(symbol=symbol)) for symbol in symbols}
+
+    sessions = {}
+    batches = {}
+    for symbol in symbols:
+        session = market_hours.current_session(symbol, now)
+        if session is None:
+            continue
+        sessions[symbol] = session
+        entry = entries[symbol]
+        if not _is_due(symbol, entry, session, now):
+            continue
+        lock_key = REFRESH_LOCK_KEY.format(symbol=symbol)
+        if not cache_locks.add(cache, lock_key, True, REFRESH_LOCK_SECONDS):
+            continue  # another worker is refreshing it
+        start = session[0]
+        if entry is not None and entry["opens"] == session[0].timestamp() and entry["times"]:
+            start = datetime.fromtimestamp(entry["times"][-1], dt_timezone.utc)
+        batches.setdefault(start, []).append(symbol)
+
+    if batches:
+        provider = provider or get_provider()
+        fetched_at = now.timestamp()
+        updated = {}
+        try:
+            for start, batch in batches.items():
+                try:
+                    hist = provider.download(
+                        batch,
+                        start=start,
+                        end=now + timedelta(minutes=1),
+                        interval=BAR_INTERVAL,
+                        auto_adjust=False,
+                    )
+                except Exception:
+                    logger.warning("Intraday bar download failed for %s", batch, exc_info=True)
+                    continue
+                for symbol in batch:
+                    series = close_series(hist, symbol, len(batch))
+                    if series is None:
+                        series = pd.Series(dtype=float, index=pd.DatetimeIndex([], tz="UTC"))
+                    updated[symbol] = _merge(entries[symbol], sessions[symbol], series, fetched_at)
+            if updated:
+                cache.set_many(
+                    {BARS_KEY.format(symbol=symbol): entry for symbol, entry in updated.items()},
+                    timeout=BARS_TIMEOUT,
+                )
+                entries.update(updated)
+        finally:
+            cache.delete_many(
+                [REFRESH_LOCK_KEY.format(symbol=s) for batch in batches.values() for s in batch]
+            )
+
+    bars = {}
+    for symbol, entry in entries.items():
+        # An entry from an earlier session is no longer "today"
+        if entry and entry["times"] and symbol in sessions and (
+            entry["opens"] == sessions[symbol][0].timestamp()
+        ):
+            bars[symbol] = _as_series(entry)
+    return bars
@@ -0,0 +1,170 @@
+"""Shared live-quote refresh loop fanning out to streaming viewers.
+
+Each worker runs at most one refresh thread. It re-prices every symbol some
+connected viewer is watching once per ``LIVE_QUOTE_INTERVAL`` seconds with a
+single ``get_quotes`` call, and wakes every subscriber whose symbols changed.
+Quotes come through the shared quote cache with single-flight fetching, so
+the upstream cost is one fetch per symbol per cache TTL, whatever the number
+of viewers or workers.
+
+Streams hold their thread for as long as they are open, so they are off
+unless ``LIVE_STREAM_ENABLED`` is set, which should only be done when serving
+from threaded (``gunicorn --worker-class gthread``) or ASGI workers.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 15
+
+
+def _interval():
+    return getattr(settings, "LIVE_QUOTE_INTERVAL", DEFAULT_INTERVAL)
+
+
+class Subscription:
+    """One viewer's interest in a set of symbols."""
+
+    def __init__(self, hub, symbols):
+        self.hub = hub
+        self.symbols = symbols
+        self.seen = -1
+
+    def wait(self, timeout):
+        """Return ``{symbol: quote}`` once any watched price has changed since
+        the last call (straight away on the first), or ``None`` on timeout."""
+
+        return self.hub.wait(self, timeout)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    def __init__(self, fetch=None, interval=None):
+        self._fetch = fetch
+        self._interval = interval
+        self._watchers = {}  # symbol -> subscriber count
+        self._quotes = {}  # symbol -> latest quote
+        self._versions = {}  # symbol -> refresh counter of its last change
+        self._version = 0
+        self._changed = threading.Condition()
+        self._wake = False
+        self._thread = None
+
+    def _get_quotes(self, symbols):
+        if self._fetch is not None:
+            return self._fetch(symbols)
+        from .yfinance_client import get_quotes
+
+        return get_quotes(symbols, light=True)
+
+    def subscribe(self, symbols):
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols))
+        subscription = Subscription(self, symbols)
+        with self._changed:
+            if any(symbol not in self._watchers for symbol in symbols):
+                # Price newly watched symbols now rather than at the next tick
+                self._wake = True
+                self._changed.notify_all()
+            for symbol in symbols:
+                self._watchers[symbol] = self._watchers.get(symbol, 0) + 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="live-quotes", daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._changed:
+            for symbol in subscription.symbols:
+                count = self._watchers.get(symbol, 0) - 1
+                if count > 0:
+                    self._watchers[symbol] = count
+                else:
+                    self._watchers.pop(symbol, None)
+                    self._quotes.pop(symbol, None)
+                    self._versions.pop(symbol, None)
+
+    def wait(self, subscription, timeout):
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                latest = max(
+                    (self._versions.get(symbol, -1) for symbol in subscription.symbols),
+                    default=-1,
+                )
+                if latest > subscription.seen:
+                    subscription.seen = self._version
+                    return {
+                        symbol: self._quotes[symbol]
+                        for symbol in subscription.symbols
+                        if symbol in self._quotes
+                    }
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+
+    def refresh(self):
+        """Re-price every watched symbol once and wake affected subscribers."""
+
+        with self._changed:
+            symbols = list(self._watchers)
+        if not symbols:
+            return
+        try:
+            quotes = self._get_quotes(symbols)
+        except Exception:
+            logger.warning("Live quote refresh failed", exc_info=True)
+            return
+        with self._changed:
+            self._version += 1
+            for symbol, quote in quotes.items():
+                if symbol not in self._watchers:
+                    continue
+                previous = self._quotes.get(symbol)
+                if previous is None or previous.get("price") != quote.get("price"):
+                    self._versions[symbol] = self._version
+                self._quotes[symbol] = quote
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._wake = False
+            try:
+                self.refresh()
+            finally:
+                # This thread outlives requests; don't hold a stale DB connection
+                close_old_connections()
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._wake,
+                    timeout=self._interval if self._interval is not None else _interval(),
+                )
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub()
+    return _hub
+
+
+def subscribe(symbols):
+    """Watch ``symbols`` on this worker's shared refresh loop."""
+
+    return get_hub().subscribe(symbols)
@@ -0,0 +1,355 @@
+"""Pluggable market-data providers.
+
+Everything that needs quotes, FX, daily history, splits or dividends goes
+through ``get_provider()`` instead of importing yfinance directly. The backend
+is chosen with the ``MARKET_DATA_PROVIDER`` setting:
+
+``yfinance``
+    Live Yahoo Finance traffic (the default).
+``record``
+    Live traffic, with every response also written to
+    ``MARKET_DATA_RECORDINGS_DIR``.
+``replay``
+    Serve previously recorded responses from disk with no network access,
+    sleeping ``MARKET_DATA_REPLAY_LATENCY`` seconds (plus up to
+    ``MARKET_DATA_REPLAY_JITTER``) per call to imitate upstream latency.
+
+Whichever backend is chosen is wrapped in ``GuardedProvider``, which adds the
+circuit breaker and retry budget from ``core.circuit_breaker`` and the
+upstream rate limits from ``core.rate_limit``. Live traffic
+shares the pooled keep-alive session from ``core.http_session``.
+"""
+import hashlib
+import os
+import pickle
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import yfinance as yf
+from django.conf import settings
+
+from . import rate_limit
+from .circuit_breaker import CircuitOpenError, get_breaker, take_retry
+from .http_session import get_session
+
+# fast_info fields that all come from the same history request; other fields
+# (e.g. previous_close) trigger extra round trips and are left out.
+FAST_INFO_KEYS = (
+    "currency",
+    "last_price",
+    "open",
+    "regular_market_previous_close",
+    "exchange",
+    "timezone",
+    "quote_type",
+)
+
+
+class ReplayMissError(LookupError):
+    """Raised when a replayed call has no recording."""
+
+
+class MarketDataProvider(ABC):
+    """Interface implemented by every market-data backend.
+
+    ``download`` and ``get_history`` accept the same keyword arguments as
+    ``yf.download``/``Ticker.history`` and return DataFrames in the same
+    layout, so callers can swap backends without reshaping data.
+    """
+
+    name = None
+
+    @abstractmethod
+    def get_info(self, symbol):
+        """Return the full quote/fundamentals mapping for ``symbol``."""
+
+    @abstractmethod
+    def get_fast_info(self, symbol):
+        """Return a dict of ``FAST_INFO_KEYS`` for ``symbol``."""
+
+    @abstractmethod
+    def get_history(self, symbol, **kwargs):
+        """Return the OHLC history DataFrame for one symbol."""
+
+    @abstractmethod
+    def download(self, symbols, **kwargs):
+        """Return a batched OHLC DataFrame for ``symbols`` grouped by ticker."""
+
+    @abstractmethod
+    def get_splits(self, symbol):
+        """Return a Series of split ratios indexed by ex-date."""
+
+    @abstractmethod
+    def get_dividends(self, symbol):
+        """Return a Series of dividend amounts indexed by ex-date."""
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def _ticker(self, symbol):
+        return yf.Ticker(symbol, session=get_session())
+
+    def get_info(self, symbol):
+        return self._ticker(symbol).info
+
+    def get_fast_info(self, symbol):
+        fast_info = self._ticker(symbol).fast_info
+        values = {}
+        for key in FAST_INFO_KEYS:
+            try:
+                values[key] = getattr(fast_info, key)
+            except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+                # Field missing from Yahoo's response. Anything else (rate
+                # limits, transport errors) propagates as an upstream failure.
+                values[key] = None
+        return values
+
+    def get_history(self, symbol, **kwargs):
+        return self._ticker(symbol).history(**kwargs)
+
+    def download(self, symbols, **kwargs):
+        kwargs.setdefault("group_by", "ticker")
+        kwargs.setdefault("progress", False)
+        kwargs.setdefault("session", get_session())
+        return yf.download(list(symbols), **kwargs)
+
+    def get_splits(self, symbol):
+        return self._ticker(symbol).splits
+
+    def get_dividends(self, symbol):
+        return self._ticker(symbol).dividends
+
+
+def _recording_path(directory, method, args, kwargs):
+    payload = repr((args, sorted(kwargs.items()))).encode("utf-8")
+    digest = hashlib.sha1(payload).hexdigest()
+    return os.path.join(directory, method, f"{digest}.pickle")
+
+
+class RecordingProvider(MarketDataProvider):
+    """Pass calls through to ``inner`` and save every response to disk.
+
+    Upstream errors are recorded too, so a replay fails the same way.
+    """
+
+    name = "record"
+
+    def __init__(self, inner, directory):
+        self.inner = inner
+        self.directory = directory
+
+    def _record(self, method, *args, **kwargs):
+        path = _recording_path(self.directory, method, args, kwargs)
+        try:
+            result = getattr(self.inner, method)(*args, **kwargs)
+        except Exception as exc:
+            self._write(path, {"error": exc})
+            raise
+        self._write(path, {"result": result})
+        return result
+
+    def _write(self, path, entry):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            data = pickle.dumps(entry)
+        except Exception:
+            data = pickle.dumps({"error": RuntimeError(repr(entry.get("error")))})
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    def get_info(self, symbol):
+        return self._record("get_info", symbol)
+
+    def get_fast_info(self, symbol):
+        return self._record("get_fast_info", symbol)
+
+    def get_history(self, symbol, **kwargs):
+        return self._record("get_history", symbol, **kwargs)
+
+    def download(self, symbols, **kwargs):
+        return self._record("download", list(symbols), **kwargs)
+
+    def get_splits(self, symbol):
+        return self._record("get_splits", symbol)
+
+    def get_dividends(self, symbol):
+        return self._record("get_dividends", symbol)
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serve responses saved by ``RecordingProvider`` without any network.
+
+    Calls must be made with the same arguments as when recording. Injected
+    latency uses a seeded RNG so benchmark runs are repeatable.
+    """
+
+    name = "replay"
+
+    def __init__(self, directory, latency=0.0, jitter=0.0, seed=0):
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _sleep(self):
+        delay = self.latency
+        if self.jitter:
+            with self._random_lock:
+                delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _replay(self, method, *args, **kwargs):
+        path = _recording_path(self.directory, method, args, kwargs)
+        self._sleep()
+        try:
+            with open(path, "rb") as fh:
+                entry = pickle.load(fh)
+        except FileNotFoundError:
+            raise ReplayMissError(f"No recording for {method}{args} {kwargs}") from None
+        if "error" in entry:
+            raise entry["error"]
+        return entry["result"]
+
+    def get_info(self, symbol):
+        return self._replay("get_info", symbol)
+
+    def get_fast_info(self, symbol):
+        return self._replay("get_fast_info", symbol)
+
+    def get_history(self, symbol, **kwargs):
+        return self._replay("get_history", symbol, **kwargs)
+
+    def download(self, symbols, **kwargs):
+        return self._replay("download", list(symbols), **kwargs)
+
+    def get_splits(self, symbol):
+        return self._replay("get_splits", symbol)
+
+    def get_dividends(self, symbol):
+        return self._replay("get_dividends", symbol)
+
+
+def _charge_key(args):
+    """What a provider call fetches, for charging rate limits per symbol."""
+
+    if not args:
+        return None
+    return tuple(args[0]) if isinstance(args[0], list) else args[0]
+
+
+class GuardedProvider(MarketDataProvider):
+    """Wrap ``inner`` with the upstream circuit breaker and retries.
+
+    A failed call is retried with exponential backoff up to ``max_retries``
+    times while the current request's retry budget allows. ``LookupError``
+    means upstream answered (e.g. unknown symbol) and is neither retried nor
+    counted against the breaker. While the breaker is open every call raises
+    ``CircuitOpenError`` immediately, apart from the one trial call let
+    through once its cooldown is over, and a call that would exceed an
+    upstream rate limit raises ``RateLimitedError`` (a ``CircuitOpenError``).
+    Rate limits are charged for the call, not for each retry.
+    """
+
+    def __init__(self, inner, max_retries=1, backoff=0.25, breaker=None):
+        self.inner = inner
+        self.name = inner.name
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker
+
+    def _call(self, method, *args, **kwargs):
+        breaker = self.breaker or get_breaker()
+        attempt = 0
+        while True:
+            if not breaker.allow_call():
+                raise CircuitOpenError(f"Upstream market data unavailable ({method})")
+            if attempt == 0:
+                rate_limit.acquire(method, _charge_key(args))
+            try:
+                result = getattr(self.inner, method)(*args, **kwargs)
+            except LookupError:
+                # Upstream answered, so a trial call still proves it is back
+                breaker.record_success()
+                raise
+            except Exception:
+                breaker.record_failure()
+                if attempt >= self.max_retries or not take_retry():
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            breaker.record_success()
+            return result
+
+    def get_info(self, symbol):
+        return self._call("get_info", symbol)
+
+    def get_fast_info(self, symbol):
+        return self._call("get_fast_info", symbol)
+
+    def get_history(self, symbol, **kwargs):
+        return self._call("get_history", symbol, **kwargs)
+
+    def download(self, symbols, **kwargs):
+        return self._call("download", list(symbols), **kwargs)
+
+    def get_splits(self, symbol):
+        return self._call("get_splits", symbol)
+
+    def get_dividends(self, symbol):
+        return self._call("get_dividends", symbol)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def _build_backend(name, directory):
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "record":
+        return RecordingProvider(YFinanceProvider(), directory)
+    if name == "replay":
+        return ReplayProvider(
+            directory,
+            latency=getattr(settings, "MARKET_DATA_REPLAY_LATENCY", 0.0),
+            jitter=getattr(settings, "MARKET_DATA_REPLAY_JITTER", 0.0),
+        )
+    raise ValueError(f"Unknown market data provider: {name}")
+
+
+def build_provider(name=None):
+    """Construct the provider named ``name`` (or the configured one)."""
+
+    name = name or getattr(settings, "MARKET_DATA_PROVIDER", "yfinance")
+    directory = getattr(settings, "MARKET_DATA_RECORDINGS_DIR", "market_data_recordings")
+    return GuardedProvider(
+        _build_backend(name, directory),
+        max_retries=getattr(settings, "UPSTREAM_MAX_RETRIES", 1),
+    )
+
+
+def get_provider():
+    """Return the process-wide market-data provider."""
+
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """Swap the process-wide provider (``None`` rebuilds it from settings)."""
+
+    global _provider
+    with _provider_lock:
+        _provider = provider
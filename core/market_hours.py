@@ -0,0 +1,454 @@
+"""Offline exchange calendar and trading-session engine.
+
+Knows regular hours, time zones and holidays for the exchanges our symbols
+trade on (US, LSE, Xetra, TSE, SSE), so open/closed checks, "have prices
+changed since T" checks and cache TTL choices need no network call.
+
+Holidays are computed from each exchange's rules. The Shanghai exchange sets
+its closures by annual notice (they follow the lunar calendar), so those are
+listed per year in ``SSE_HOLIDAYS`` and need extending each December.
+Early closes (US and London half-days around Christmas, New Year and
+Independence Day) shorten the session; other one-off closures are not
+modelled.
+
+Symbols on an exchange we have no calendar for resolve to ``None``. The
+session helpers then answer ``None`` ("unknown") rather than guessing, and
+callers fall back to the quote's own ``market_state``.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)."""
+
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """``n``-th ``weekday`` (Mon=0) of a month; ``n=-1`` for the last one."""
+
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _us_observed(day):
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _us_holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _us_observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _us_observed(date(year, 12, 25)),
+    }
+    new_year = date(year, 1, 1)
+    # NYSE does not close on Friday 31 Dec for a Saturday New Year's Day
+    if new_year.weekday() != 5:
+        days.add(_us_observed(new_year))
+    if year >= 2022:
+        days.add(_us_observed(date(year, 6, 19)))  # Juneteenth
+    return days
+
+
+def _us_early_closes(year):
+    close = time(13, 0)
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1): close}  # Day after Thanksgiving
+    independence_eve = date(year, 7, 3)
+    if independence_eve.weekday() < 4:
+        days[independence_eve] = close
+    christmas_eve = date(year, 12, 24)
+    if christmas_eve.weekday() < 5:
+        days[christmas_eve] = close
+    return days
+
+
+def _uk_substitute(day, taken):
+    while day.weekday() >= 5 or day in taken:
+        day += timedelta(days=1)
+    return day
+
+
+def _lse_holidays(year):
+    easter = _easter(year)
+    days = {
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        _nth_weekday(year, 5, 0, 1),  # Early May bank holiday
+        _nth_weekday(year, 5, 0, -1),  # Spring bank holiday
+        _nth_weekday(year, 8, 0, -1),  # Summer bank holiday
+    }
+    days.add(_uk_substitute(date(year, 1, 1), set()))
+    christmas = _uk_substitute(date(year, 12, 25), set())
+    days.add(christmas)
+    days.add(_uk_substitute(date(year, 12, 26), {christmas}))
+    return days
+
+
+def _lse_early_closes(year):
+    return {date(year, 12, 24): time(12, 30), date(year, 12, 31): time(12, 30)}
+
+
+def _xetra_holidays(year):
+    easter = _easter(year)
+    return {
+        date(year, 1, 1),
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        date(year, 5, 1),
+        date(year, 12, 24),
+        date(year, 12, 25),
+        date(year, 12, 26),
+        date(year, 12, 31),
+    }
+
+
+def _equinox_day(year, base):
+    return int(base + 0.242194 * (year - 1980) - (year - 1980) // 4)
+
+
+def _tse_holidays(year):
+    national = {
+        date(year, 1, 1),
+        _nth_weekday(year, 1, 0, 2),  # Coming of Age Day
+        date(year, 2, 11),
+        date(year, 2, 23),
+        date(year, 3, _equinox_day(year, 20.8431)),
+        date(year, 4, 29),
+        date(year, 5, 3),
+        date(year, 5, 4),
+        date(year, 5, 5),
+        _nth_weekday(year, 7, 0, 3),  # Marine Day
+        date(year, 8, 11),
+        _nth_weekday(year, 9, 0, 3),  # Respect for the Aged Day
+        date(year, 9, _equinox_day(year, 23.2488)),
+        _nth_weekday(year, 10, 0, 2),  # Sports Day
+        date(year, 11, 3),
+        date(year, 11, 23),
+    }
+    days = set(national)
+    # A holiday on Sunday moves to the next day that is not already a holiday
+    for day in sorted(national):
+        if day.weekday() == 6:
+            substitute = day + timedelta(days=1)
+            while substitute in days:
+                substitute += timedelta(days=1)
+            days.add(substitute)
+    # A day sandwiched between two holidays is also a holiday
+    respect = _nth_weekday(year, 9, 0, 3)
+    if date(year, 9, _equinox_day(year, 23.2488)) - respect == timedelta(days=2):
+        days.add(respect + timedelta(days=1))
+    # Exchange year-end closure
+    days.update({date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)})
+    return days
+
+
+def _date_range(start, end):
+    return {start + timedelta(days=n) for n in range((end - start).days + 1)}
+
+
+SSE_HOLIDAYS = {
+    2024: (
+        {date(2024, 1, 1)}
+        | _date_range(date(2024, 2, 9), date(2024, 2, 17))
+        | _date_range(date(2024, 4, 4), date(2024, 4, 5))
+        | _date_range(date(2024, 5, 1), date(2024, 5, 3))
+        | {date(2024, 6, 10), date(2024, 9, 16), date(2024, 9, 17)}
+        | _date_range(date(2024, 10, 1), date(2024, 10, 7))
+    ),
+    2025: (
+        {date(2025, 1, 1)}
+        | _date_range(date(2025, 1, 28), date(2025, 2, 4))
+        | {date(2025, 4, 4)}
+        | _date_range(date(2025, 5, 1), date(2025, 5, 5))
+        | {date(2025, 6, 2)}
+        | _date_range(date(2025, 10, 1), date(2025, 10, 8))
+    ),
+    2026: (
+        _date_range(date(2026, 1, 1), date(2026, 1, 2))
+        | _date_range(date(2026, 2, 16), date(2026, 2, 23))
+        | {date(2026, 4, 6)}
+        | _date_range(date(2026, 5, 1), date(2026, 5, 5))
+        | {date(2026, 6, 19), date(2026, 9, 25)}
+        | _date_range(date(2026, 10, 1), date(2026, 10, 7))
+    ),
+}
+
+
+def _sse_holidays(year):
+    return SSE_HOLIDAYS.get(year, set())
+
+
+@dataclass(frozen=True)
+class Exchange:
+    code: str
+    name: str
+    tz_name: str
+    open: time
+    close: time
+    holiday_rules: object = field(repr=False, compare=False)
+    lunch: tuple = None  # (start, end) of a midday break, if any
+    early_close_rules: object = field(default=None, repr=False, compare=False)
+
+    @property
+    def tz(self):
+        return ZoneInfo(self.tz_name)
+
+    def holidays(self, year):
+        return _holidays(self.code, year)
+
+    def early_closes(self, year):
+        """``{date: close time}`` for shortened sessions in ``year``."""
+
+        return _early_closes(self.code, year)
+
+
+EXCHANGES = {
+    "US": Exchange(
+        "US", "NYSE / Nasdaq", "America/New_York", time(9, 30), time(16, 0), _us_holidays,
+        early_close_rules=_us_early_closes,
+    ),
+    "LSE": Exchange(
+        "LSE", "London Stock Exchange", "Europe/London", time(8, 0), time(16, 30), _lse_holidays,
+        early_close_rules=_lse_early_closes,
+    ),
+    "XETRA": Exchange("XETRA", "Xetra", "Europe/Berlin", time(9, 0), time(17, 30), _xetra_holidays),
+    "TSE": Exchange(
+        "TSE", "Tokyo Stock Exchange", "Asia/Tokyo", time(9, 0), time(15, 30), _tse_holidays,
+        lunch=(time(11, 30), time(12, 30)),
+    ),
+    "SSE": Exchange(
+        "SSE", "Shanghai Stock Exchange", "Asia/Shanghai", time(9, 30), time(15, 0), _sse_holidays,
+        lunch=(time(11, 30), time(13, 0)),
+    ),
+}
+
+SUFFIX_EXCHANGES = {
+    ".L": "LSE",
+    ".IL": "LSE",
+    ".DE": "XETRA",
+    ".F": "XETRA",
+    ".T": "TSE",
+    ".SS": "SSE",
+    ".SZ": "SSE",  # Shenzhen keeps the same sessions and holidays
+}
+
+# Indices carry no exchange suffix; map the benchmarks explicitly.
+INDEX_EXCHANGES = {
+    "^GSPC": "US",
+    "^IXIC": "US",
+    "^DJI": "US",
+    "^RUT": "US",
+    "^FTLC": "LSE",
+    "^FTSE": "LSE",
+    "^STOXXE": "XETRA",
+    "^GDAXI": "XETRA",
+    "^N225": "TSE",
+}
+
+
+@lru_cache(maxsize=None)
+def _holidays(code, year):
+    return frozenset(EXCHANGES[code].holiday_rules(year))
+
+
+@lru_cache(maxsize=None)
+def _early_closes(code, year):
+    rules = EXCHANGES[code].early_close_rules
+    return rules(year) if rules else {}
+
+
+def exchange_for(symbol):
+    """Return the ``Exchange`` a symbol trades on, or ``None`` when unknown.
+
+    Plain tickers are US listings. An index, exchange suffix, currency pair
+    or future we have no mapping for is unknown rather than assumed to be US.
+    """
+
+    symbol = symbol.strip().upper()
+    if symbol in INDEX_EXCHANGES:
+        return EXCHANGES[INDEX_EXCHANGES[symbol]]
+    for suffix, code in SUFFIX_EXCHANGES.items():
+        if symbol.endswith(suffix):
+            return EXCHANGES[code]
+    if symbol.startswith("^") or "." in symbol or "=" in symbol:
+        return None
+    return EXCHANGES["US"]
+
+
+def _exchange(symbol_or_exchange):
+    if symbol_or_exchange is None or isinstance(symbol_or_exchange, Exchange):
+        return symbol_or_exchange
+    return exchange_for(symbol_or_exchange)
+
+
+def is_trading_day(symbol_or_exchange, day):
+    exchange = _exchange(symbol_or_exchange)
+    if exchange is None:
+        return day.weekday() < 5
+    return day.weekday() < 5 and day not in exchange.holidays(day.year)
+
+
+def trading_days(symbol_or_exchange, start, end):
+    """Trading days between ``start`` and ``end`` inclusive."""
+
+    exchange = _exchange(symbol_or_exchange)
+    day = start
+    days = []
+    while day <= end:
+        if is_trading_day(exchange, day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _sessions(exchange, day):
+    """Aware (start, end) trading intervals for ``day``, split at lunch."""
+
+    if not is_trading_day(exchange, day):
+        return []
+    tz = exchange.tz
+    close = exchange.early_closes(day.year).get(day, exchange.close)
+    bounds = [exchange.open]
+    if exchange.lunch and exchange.lunch[0] < close:
+        bounds += list(exchange.lunch)
+    bounds.append(close)
+    return [
+        (datetime.combine(day, bounds[i], tz), datetime.combine(day, bounds[i + 1], tz))
+        for i in range(0, len(bounds), 2)
+    ]
+
+
+def _now(at):
+    return at if at is not None else timezone.now()
+
+
+def is_open(symbol_or_exchange, at=None):
+    """True while a regular session is in progress (lunch breaks count as closed).
+
+    ``None`` when the symbol's exchange is unknown.
+    """
+
+    exchange = _exchange(symbol_or_exchange)
+    if exchange is None:
+        return None
+    at = _now(at)
+    local_day = at.astimezone(exchange.tz).date()
+    return any(start <= at < end for start, end in _sessions(exchange, local_day))
+
+
+def market_state(symbol_or_exchange, at=None):
+    """Local stand-in for Yahoo's ``marketState``: ``REGULAR``, ``CLOSED`` or
+    ``None`` when the exchange is unknown."""
+
+    is_regular = is_open(symbol_or_exchange, at)
+    if is_regular is None:
+        return None
+    return "REGULAR" if is_regular else "CLOSED"
+
+
+def last_closed_day(symbol_or_exchange, at=None):
+    """Latest local date whose trading, if any, had finished by ``at``."""
+
+    exchange = _exchange(symbol_or_exchange)
+    at = _now(at)
+    if exchange is None:
+        # Without a calendar only days over everywhere are known to be final
+        return at.astimezone(dt_timezone.utc).date() - timedelta(days=1)
+    day = at.astimezone(exchange.tz).date()
+    sessions = _sessions(exchange, day)
+    if sessions and at < sessions[-1][1]:
+        return day - timedelta(days=1)
+    return day
+
+
+def current_session(symbol_or_exchange, at=None, max_days=15):
+    """Aware (open, close) of the latest session to have started by ``at``
+    (``None`` if none recently or the exchange is unknown)."""
+
+    exchange = _exchange(symbol_or_exchange)
+    if exchange is None:
+        return None
+    at = _now(at)
+    day = at.astimezone(exchange.tz).date()
+    for offset in range(max_days):
+        sessions = _sessions(exchange, day - timedelta(days=offset))
+        if sessions and sessions[0][0] <= at:
+            return sessions[0][0], sessions[-1][1]
+    return None
+
+
+def next_open(symbol_or_exchange, at=None, max_days=15):
+    """Start of the next session at or after ``at`` (``None`` if none soon or
+    the exchange is unknown)."""
+
+    exchange = _exchange(symbol_or_exchange)
+    if exchange is None:
+        return None
+    at = _now(at)
+    day = at.astimezone(exchange.tz).date()
+    for offset in range(max_days):
+        for start, end in _sessions(exchange, day + timedelta(days=offset)):
+            if end > at:
+                return max(start, at)
+    return None
+
+
+def prices_changed_since(symbol_or_exchange, since, now=None):
+    """True if any trading happened between ``since`` and ``now``.
+
+    When it returns False a price fetched at ``since`` is still current. With
+    no calendar for the exchange any elapsed time counts as trading.
+    """
+
+    exchange = _exchange(symbol_or_exchange)
+    now = _now(now)
+    if since >= now:
+        return False
+    if exchange is None:
+        return True
+    day = since.astimezone(exchange.tz).date()
+    last_day = now.astimezone(exchange.tz).date()
+    while day <= last_day:
+        for start, end in _sessions(exchange, day):
+            if start < now and end > since:
+                return True
+        day += timedelta(days=1)
+    return False
+
+
+def seconds_until_change(symbol_or_exchange, at=None):
+    """Seconds until the price can next move (0 while the market is open)."""
+
+    at = _now(at)
+    opens = next_open(symbol_or_exchange, at)
+    if opens is None:
+        return None
+    return max(0.0, (opens - at).total_seconds())
@@ -0,0 +1,19 @@
+from django.conf import settings
+
+from .circuit_breaker import retry_budget
+from .rate_limit import for_caller, request_caller
+
+DEFAULT_REQUEST_RETRY_BUDGET = 2
+
+
+class UpstreamBudgetMiddleware:
+    """Give each request a fixed budget of upstream market-data retries and
+    charge its upstream calls to the user's (or client address's) rate limit."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        retries = getattr(settings, "UPSTREAM_REQUEST_RETRY_BUDGET", DEFAULT_REQUEST_RETRY_BUDGET)
+        with retry_budget(retries), for_caller(request_caller(request)):
+            return self.get_response(request)
@@ -0,0 +1,211 @@
+"""On-disk columnar store of daily closes.
+
+Every symbol (holding, benchmark index or ``XXXUSD=X`` FX pair) has one flat
+float64 column under ``PRICE_HISTORY_DIR``, indexed by calendar day since
+``EPOCH``: the close for day ``d`` lives at offset ``(d - EPOCH).days`` and
+days without trading hold NaN. Readers memory-map the column, so a lookup is
+a slice rather than a download or a parse. A small JSON sidecar records the
+contiguous range of days already asked of upstream.
+
+``ensure`` downloads only the days outside that range, one batched download
+per distinct gap, and writes them in place; nothing already on disk is
+fetched again. Only finished sessions are stored (see ``final_day``), and
+closes are unadjusted so stored values never change after the fact.
+"""
+import fcntl
+import json
+import logging
+import os
+from datetime import date, timedelta
+from datetime import timezone as dt_timezone
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from . import market_hours
+from .market_data import get_provider
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(2000, 1, 1)
+CLOSE_DTYPE = np.dtype("<f8")
+DEFAULT_DIR = "price_history"
+# Yahoo publishes some exchanges' final closes with a delay
+SETTLE_DELAY = timedelta(minutes=30)
+
+
+def close_series(hist, symbol, symbol_count):
+    """Pull the non-null ``Close`` column for ``symbol`` out of a download."""
+
+    if hist is None or hist.empty:
+        return None
+
+    if isinstance(hist.columns, pd.MultiIndex):
+        if symbol in hist.columns.get_level_values(0):
+            try:
+                return hist[symbol]["Close"].dropna()
+            except KeyError:
+                return None
+    elif symbol_count == 1 and "Close" in hist.columns:
+        return hist["Close"].dropna()
+
+    return None
+
+
+def _directory():
+    return getattr(settings, "PRICE_HISTORY_DIR", DEFAULT_DIR)
+
+
+def _base(symbol):
+    return os.path.join(_directory(), quote(symbol.strip().upper(), safe=""))
+
+
+def _offset(day):
+    return (day - EPOCH).days
+
+
+def final_day(symbol, now=None):
+    """Latest day whose close for ``symbol`` is final and may be stored."""
+
+    now = now or timezone.now()
+    if symbol.strip().upper().endswith("=X"):
+        # FX trades round the clock; a day's bar is final once the UTC day is over
+        return now.astimezone(dt_timezone.utc).date() - timedelta(days=1)
+    return market_hours.last_closed_day(symbol, now - SETTLE_DELAY)
+
+
+def _read_coverage(symbol):
+    try:
+        with open(f"{_base(symbol)}.json") as fh:
+            meta = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+    return date.fromisoformat(meta["from"]), date.fromisoformat(meta["through"])
+
+
+def _write_coverage(symbol, first, last):
+    path = f"{_base(symbol)}.json"
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump({"from": first.isoformat(), "through": last.isoformat()}, fh)
+    os.replace(tmp_path, path)
+
+
+def _gaps(symbol, start, end):
+    """Day ranges in ``[start, end]`` not yet covered for ``symbol``."""
+
+    coverage = _read_coverage(symbol)
+    if coverage is None:
+        return [(start, end)]
+    first, last = coverage
+    if start > last + timedelta(days=1) or end < first - timedelta(days=1):
+        # Keep the covered range contiguous
+        start, end = min(start, first), max(end, last)
+    gaps = []
+    if start < first:
+        gaps.append((start, first - timedelta(days=1)))
+    if end > last:
+        gaps.append((last + timedelta(days=1), end))
+    return gaps
+
+
+def _store(symbol, start, end, series):
+    """Write closes for ``[start, end]`` and extend the covered range."""
+
+    values = np.full(_offset(end) - _offset(start) + 1, np.nan, dtype=CLOSE_DTYPE)
+    for day, close in series.items():
+        if start <= day <= end:
+            values[_offset(day) - _offset(start)] = close
+
+    path = f"{_base(symbol)}.close"
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+b") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        length = fh.seek(0, os.SEEK_END) // CLOSE_DTYPE.itemsize
+        if length < _offset(start):
+            fh.write(np.full(_offset(start) - length, np.nan, dtype=CLOSE_DTYPE).tobytes())
+        fh.seek(_offset(start) * CLOSE_DTYPE.itemsize)
+        fh.write(values.tobytes())
+        fh.flush()
+        coverage = _read_coverage(symbol)
+        if coverage is not None:
+            start, end = min(start, coverage[0]), max(end, coverage[1])
+        _write_coverage(symbol, start, end)
+
+
+def ensure(symbols, start, end, provider=None):
+    """Download and store whatever final closes in ``[start, end]`` are missing."""
+
+    start = max(start, EPOCH)
+    now = timezone.now()
+    batches = {}
+    for symbol in dict.fromkeys(symbols):
+        last = min(end, final_day(symbol, now))
+        if start > last:
+            continue
+        for gap in _gaps(symbol, start, last):
+            batches.setdefault(gap, []).append(symbol)
+    if not batches:
+        return
+
+    os.makedirs(_directory(), exist_ok=True)
+    provider = provider or get_provider()
+    for (first, last), batch in batches.items():
+        try:
+            hist = provider.download(
+                batch,
+                start=first.isoformat(),
+                end=(last + timedelta(days=1)).isoformat(),
+                interval="1d",
+                auto_adjust=False,
+            )
+        except Exception:
+            logger.warning("Price history download failed for %s", batch, exc_info=True)
+            continue
+        for symbol in batch:
+            series = close_series(hist, symbol, len(batch))
+            if series is None:
+                # Nothing came back: only a range without sessions counts as covered
+                if market_hours.trading_days(symbol, first, last):
+                    continue
+                series = pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+            _store(symbol, first, last, pd.Series(series.values, index=series.index.date))
+
+
+def read(symbol, start, end):
+    """Return stored closes for ``symbol`` in ``[start, end]`` as a date-indexed Series."""
+
+    try:
+        column = np.memmap(f"{_base(symbol)}.close", dtype=CLOSE_DTYPE, mode="r")
+    except (FileNotFoundError, ValueError):
+        return pd.Series(dtype=float)
+    low = max(_offset(start), 0)
+    high = min(_offset(end) + 1, len(column))
+    if low >= high:
+        return pd.Series(dtype=float)
+    values = np.asarray(column[low:high])
+    present = np.flatnonzero(~np.isnan(values))
+    return pd.Series(
+        values[present],
+        index=[EPOCH + timedelta(days=low + int(i)) for i in present],
+        dtype=float,
+    )
+
+
+def get_closes(symbols, start, end, provider=None):
+    """Return ``{symbol: closes in [start, end]}``, filling gaps from upstream first.
+
+    Symbols with no stored closes in the range are left out.
+    """
+
+    symbols = list(dict.fromkeys(symbols))
+    ensure(symbols, start, end, provider=provider)
+    closes = {}
+    for symbol in symbols:
+        series = read(symbol, start, end)
+        if not series.empty:
+            closes[symbol] = series
+    return closes
@@ -0,0 +1,357 @@
+"""Shared quote cache sitting in front of the upstream quote fetchers.
+
+Entries live in the ``market_data`` cache, which is file-based by default so
+every gunicorn worker on the host reads and writes the same quotes. Each entry
+remembers when it was fetched and how long it stays fresh. Once it expires it
+is still served for a stale window while a single background refresh (claimed
+with a cross-worker lock, see ``core.cache_locks``) replaces it.
+
+Light quotes (price, currency and FX only) are kept under their own keys.
+A light lookup is also satisfied by a full quote, which is a superset.
+
+Misses are single-flight: concurrent requests for the same symbol share one
+upstream fetch, within a worker via in-process flights and across workers via
+the same atomic cache claim the background refresh uses.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import cache_locks, market_hours
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "market_data"
+QUOTE_KEY = "quote:{symbol}"
+LIGHT_QUOTE_KEY = "quote-light:{symbol}"
+REFRESH_LOCK_KEY = "quote-refresh:{symbol}"
+LIGHT_REFRESH_LOCK_KEY = "quote-light-refresh:{symbol}"
+STATS_KEY = "quote-cache-stats:{name}"
+STAT_NAMES = ("hits", "misses", "stale")
+COLLAPSED_STAT = "collapsed"
+
+REFRESH_LOCK_SECONDS = 60
+DEFAULT_SINGLE_FLIGHT_WAIT = 30
+
+DEFAULT_TTLS = {
+    "REGULAR": 60,
+    "PRE": 300,
+    "POST": 300,
+    "PREPRE": 900,
+    "POSTPOST": 900,
+    "CLOSED": 1800,
+}
+DEFAULT_TTL = 300
+DEFAULT_STALE_SECONDS = 600
+DEFAULT_RETAIN_SECONDS = 60 * 60 * 24
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _normalise(symbol):
+    return symbol.strip().upper()
+
+
+def _key(symbol, light=False):
+    template = LIGHT_QUOTE_KEY if light else QUOTE_KEY
+    return template.format(symbol=_normalise(symbol))
+
+
+def _lock_key(symbol, light=False):
+    template = LIGHT_REFRESH_LOCK_KEY if light else REFRESH_LOCK_KEY
+    return template.format(symbol=_normalise(symbol))
+
+
+def _bump(name, amount=1):
+    if amount <= 0:
+        return
+    cache_locks.incr(get_cache(), STATS_KEY.format(name=name), amount)
+
+
+def get_stats():
+    """Return hit/miss/staleness counters shared by every worker.
+
+    ``collapsed`` counts upstream fetches saved by single-flight coalescing.
+    """
+
+    cache = get_cache()
+    stats = {name: cache.get(STATS_KEY.format(name=name), 0) for name in STAT_NAMES}
+    lookups = sum(stats.values())
+    stats["hit_ratio"] = (stats["hits"] + stats["stale"]) / lookups if lookups else None
+    stats[COLLAPSED_STAT] = cache.get(STATS_KEY.format(name=COLLAPSED_STAT), 0)
+    return stats
+
+
+def reset_stats():
+    get_cache().delete_many(
+        [STATS_KEY.format(name=name) for name in (*STAT_NAMES, COLLAPSED_STAT)]
+    )
+
+
+def quote_ttl(symbol, quote):
+    """Seconds a quote for ``symbol`` stays fresh.
+
+    Explicit per-symbol overrides win; otherwise the TTL follows the market
+    state reported with the quote, so open markets refresh far more often than
+    closed ones. Quotes without a market state (e.g. light quotes) use the
+    local exchange calendar instead.
+    """
+
+    overrides = getattr(settings, "QUOTE_CACHE_SYMBOL_TTLS", {})
+    symbol_key = _normalise(symbol)
+    if symbol_key in overrides:
+        return overrides[symbol_key]
+
+    ttls = getattr(settings, "QUOTE_CACHE_TTLS", DEFAULT_TTLS)
+    default_ttl = getattr(settings, "QUOTE_CACHE_DEFAULT_TTL", DEFAULT_TTL)
+    state = (quote or {}).get("market_state") or market_hours.market_state(symbol_key)
+    return ttls.get(state, default_ttl)
+
+
+def _stale_seconds():
+    return getattr(settings, "QUOTE_CACHE_STALE_SECONDS", DEFAULT_STALE_SECONDS)
+
+
+def _retain_seconds():
+    return getattr(settings, "QUOTE_CACHE_RETAIN_SECONDS", DEFAULT_RETAIN_SECONDS)
+
+
+def _single_flight_wait():
+    return getattr(settings, "QUOTE_SINGLE_FLIGHT_WAIT", DEFAULT_SINGLE_FLIGHT_WAIT)
+
+
+def store_quotes(quotes, fetched_at=None, light=False):
+    """Write freshly fetched quotes into the shared cache."""
+
+    if not quotes:
+        return
+    fetched_at = fetched_at if fetched_at is not None else time.time()
+    # Kept past the stale window so get_last_known has something to serve
+    keep_seconds = _stale_seconds() + _retain_seconds()
+    cache = get_cache()
+    for symbol, quote in quotes.items():
+        ttl = quote_ttl(symbol, quote)
+        cache.set(
+            _key(symbol, light),
+            {"quote": quote, "fetched_at": fetched_at, "ttl": ttl},
+            timeout=ttl + keep_seconds,
+        )
+
+
+def _refresh_in_background(symbols, fetch, light=False):
+    """Refresh ``symbols`` on a daemon thread, once across all workers."""
+
+    cache = get_cache()
+    claimed = [
+        symbol
+        for symbol in symbols
+        if cache_locks.add(cache, _lock_key(symbol, light), True, REFRESH_LOCK_SECONDS)
+    ]
+    if not claimed:
+        return None
+
+    def run():
+        try:
+            store_quotes(fetch(claimed), light=light)
+        except Exception:
+            logger.warning("Background quote refresh failed for %s", claimed, exc_info=True)
+        finally:
+            cache.delete_many([_lock_key(s, light) for s in claimed])
+
+    thread = threading.Thread(target=run, name="quote-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_last_known(symbols, light=False):
+    """Return the most recent cached quote for each symbol, however old.
+
+    Used when upstream is unavailable; callers are expected to flag the
+    result as stale. A light lookup also accepts a full quote.
+    """
+
+    cache = get_cache()
+    keys = [_key(symbol, light) for symbol in symbols]
+    if light:
+        keys += [_key(symbol) for symbol in symbols]
+    entries = cache.get_many(keys)
+
+    quotes = {}
+    for symbol in symbols:
+        candidates = [entries.get(_key(symbol, light))]
+        if light:
+            candidates.append(entries.get(_key(symbol)))
+        candidates = [entry for entry in candidates if entry is not None]
+        if candidates:
+            quotes[symbol] = max(candidates, key=lambda e: e["fetched_at"])["quote"]
+    return quotes
+
+
+class _Flight:
+    """One in-process upstream fetch that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.quotes = {}
+
+
+_flights = {}  # cache key -> _Flight
+_flights_lock = threading.Lock()
+
+
+def _wait_for_other_workers(symbols, light, timeout):
+    """Poll for quotes another worker is fetching; return those that arrive.
+
+    Stops waiting for a symbol once its fetch lock is released, whether or not
+    a quote was stored.
+    """
+
+    cache = get_cache()
+    deadline = time.monotonic() + timeout
+    pending = list(symbols)
+    arrived = {}
+    delay = 0.02
+    while pending and time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+        now = time.time()
+        entries = cache.get_many([_key(symbol, light) for symbol in pending])
+        for symbol in list(pending):
+            entry = entries.get(_key(symbol, light))
+            if entry is not None and now - entry["fetched_at"] <= entry["ttl"]:
+                arrived[symbol] = entry["quote"]
+                pending.remove(symbol)
+        locks = cache.get_many([_lock_key(symbol, light) for symbol in pending])
+        pending = [symbol for symbol in pending if _lock_key(symbol, light) in locks]
+    return arrived
+
+
+def _fetch_and_store(symbols, fetch, light):
+    fetched = fetch(symbols)
+    store_quotes(fetched, light=light)
+    return fetched
+
+
+def _fetch_single_flight(missing, fetch, light):
+    """Fetch ``missing`` so each symbol goes upstream once across threads and workers."""
+
+    flight = _Flight()
+    leading = []
+    following = {}
+    with _flights_lock:
+        for symbol in missing:
+            key = _key(symbol, light)
+            if key in _flights:
+                following[symbol] = _flights[key]
+            else:
+                _flights[key] = flight
+                leading.append(symbol)
+
+    quotes = {}
+    collapsed = 0
+    try:
+        if leading:
+            cache = get_cache()
+            claimed = [
+                symbol
+                for symbol in leading
+                if cache_locks.add(cache, _lock_key(symbol, light), True, REFRESH_LOCK_SECONDS)
+            ]
+            elsewhere = [symbol for symbol in leading if symbol not in claimed]
+            try:
+                if claimed:
+                    quotes.update(_fetch_and_store(claimed, fetch, light))
+            finally:
+                cache.delete_many([_lock_key(symbol, light) for symbol in claimed])
+
+            if elsewhere:
+                # Another worker is already fetching these; reuse its result
+                arrived = _wait_for_other_workers(elsewhere, light, _single_flight_wait())
+                collapsed += len(arrived)
+                quotes.update(arrived)
+                remaining = [symbol for symbol in elsewhere if symbol not in arrived]
+                if remaining:
+                    quotes.update(_fetch_and_store(remaining, fetch, light))
+    finally:
+        flight.quotes = quotes
+        with _flights_lock:
+            for symbol in leading:
+                _flights.pop(_key(symbol, light), None)
+        flight.done.set()
+
+    for symbol, other in following.items():
+        if other.done.wait(_single_flight_wait()) and symbol in other.quotes:
+            quotes[symbol] = other.quotes[symbol]
+            collapsed += 1
+
+    _bump(COLLAPSED_STAT, collapsed)
+    return quotes
+
+
+def get_cached_quotes(symbols, fetch, allow_stale=True, light=False, fetched_at=None):
+    """Return ``{symbol: quote}`` for ``symbols``, fetching only what is missing.
+
+    ``fetch`` receives the list of symbols that need an upstream call and
+    returns a mapping of the quotes it managed to load; exceptions propagate to
+    the caller. Symbols already being fetched elsewhere are waited for rather
+    than fetched again. Expired entries within the stale window are returned as-is when
+    ``allow_stale`` is true and refreshed in the background; otherwise they are
+    fetched synchronously like a miss. With ``light`` the light namespace is
+    used and a fresh full quote is accepted in place of a light one. A dict
+    passed as ``fetched_at`` is filled with the time (epoch seconds) each
+    returned quote was fetched upstream.
+    """
+
+    cache = get_cache()
+    now = time.time()
+    stale_seconds = _stale_seconds()
+    keys = [_key(symbol, light) for symbol in symbols]
+    if light:
+        keys += [_key(symbol) for symbol in symbols]
+    entries = cache.get_many(keys)
+
+    quotes = {}
+    times = {}
+    missing = []
+    stale = []
+    for symbol in symbols:
+        entry = entries.get(_key(symbol, light))
+        if light:
+            full = entries.get(_key(symbol))
+            if full is not None and now - full["fetched_at"] <= full["ttl"]:
+                entry = full
+        if entry is None:
+            missing.append(symbol)
+            continue
+        age = now - entry["fetched_at"]
+        if age <= entry["ttl"]:
+            quotes[symbol] = entry["quote"]
+            times[symbol] = entry["fetched_at"]
+        elif allow_stale and age <= entry["ttl"] + stale_seconds:
+            quotes[symbol] = entry["quote"]
+            times[symbol] = entry["fetched_at"]
+            stale.append(symbol)
+        else:
+            missing.append(symbol)
+
+    _bump("hits", len(quotes) - len(stale))
+    _bump("stale", len(stale))
+    _bump("misses", len(missing))
+
+    if stale:
+        _refresh_in_background(stale, fetch, light)
+
+    if missing:
+        fetched = _fetch_single_flight(missing, fetch, light)
+        quotes.update(fetched)
+        # Waited-on fetches finished no earlier than they were requested
+        times.update(dict.fromkeys(fetched, now))
+
+    if fetched_at is not None:
+        fetched_at.update({symbol: times[symbol] for symbol in symbols if symbol in quotes})
+    return {symbol: quotes[symbol] for symbol in symbols if symbol in quotes}
@@ -0,0 +1,46 @@
+"""Signed, short-lived quote locks.
+
+The order form's ticker lookup already fetched a live quote; ``issue`` signs
+the fields an order executes on into a token returned with that preview, and
+``redeem`` hands them back when the order is placed so execution does not go
+upstream a second time. Tokens are bound to the user and symbol and expire
+after ``QUOTE_LOCK_SECONDS``; anything else (tampered, expired, another
+symbol) redeems to ``None`` and the caller fetches a fresh quote as before.
+"""
+from django.conf import settings
+from django.core import signing
+
+DEFAULT_LOCK_SECONDS = 30
+SALT = "portfolios.quote-lock"
+LOCKED_FIELDS = ("price", "bid", "ask", "traded_today", "currency", "fx_rate", "market_state")
+
+
+def _lock_seconds():
+    return getattr(settings, "QUOTE_LOCK_SECONDS", DEFAULT_LOCK_SECONDS)
+
+
+def issue(user_id, symbol, quote):
+    """Return a token locking ``quote`` for ``symbol``, or ``None`` if it may not be locked."""
+
+    # Stale (breaker fallback) or incomplete quotes must not be executed on
+    if quote.get("stale") or quote.get("price") is None or quote.get("fx_rate") is None:
+        return None
+    payload = {field: quote.get(field) for field in LOCKED_FIELDS}
+    payload["symbol"] = symbol.strip().upper()
+    payload["user"] = user_id
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+def redeem(token, user_id, symbol):
+    """Return the quote locked in ``token`` if it is valid for this user and symbol."""
+
+    if not token or _lock_seconds() <= 0:
+        return None
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=_lock_seconds())
+    except signing.BadSignature:
+        # SignatureExpired is a BadSignature too
+        return None
+    if payload.get("user") != user_id or payload.get("symbol") != symbol.strip().upper():
+        return None
+    return {field: payload.get(field) for field in LOCKED_FIELDS}
@@ -0,0 +1,201 @@
+"""Token-bucket rate limits on upstream market-data calls.
+
+Every call ``GuardedProvider`` makes to Yahoo first takes a token from the
+global bucket and, inside a web request, from the caller's own bucket (the
+signed-in user, or the client address for anonymous visitors; see
+``core.middleware.UpstreamBudgetMiddleware``). A call is charged once, not
+once per retry, and a caller pays once per symbol per request even when a
+quote takes several upstream calls. Buckets refill at a steady rate up to a
+burst size, so one user or scraper cannot drain the host's shared Yahoo
+allowance and get every worker throttled.
+
+Bucket state lives in the shared ``market_data`` cache so all workers draw
+from the same buckets. Each bucket is a single "theoretical arrival time"
+(GCRA, the timestamp form of a token bucket) read and updated under the
+bucket's host-wide lock (see ``core.cache_locks``). A rejected call raises ``RateLimitedError`` before anything is sent
+upstream and marks the caller as limited, so quote lookups fall back to the
+last known cached quotes exactly as they do while the breaker is open.
+"""
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import cache_locks
+from .circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "market_data"
+BUCKET_KEY = "rate-limit:{name}"
+
+DEFAULT_GLOBAL_RATE = 10.0
+DEFAULT_GLOBAL_BURST = 100
+DEFAULT_USER_RATE = 1.0
+DEFAULT_USER_BURST = 60
+DEFAULT_TRUSTED_PROXY_COUNT = 0
+
+
+class RateLimitedError(CircuitOpenError):
+    """Raised instead of calling upstream when a rate limit is exhausted."""
+
+
+class TokenBucket:
+    """``burst`` tokens refilled at ``rate`` per second, shared by every worker.
+
+    A rate of zero or less disables the bucket.
+    """
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+
+    @property
+    def _cache(self):
+        return caches[CACHE_ALIAS]
+
+    def take(self, now=None):
+        """Take one token; return False if the bucket is empty."""
+
+        if self.rate <= 0:
+            return True
+        now = time.time() if now is None else now
+        interval = 1.0 / self.rate
+        cache = self._cache
+        key = BUCKET_KEY.format(name=self.name)
+        with cache_locks.held(key):
+            # The bucket is full when the arrival time is not in the future
+            arrival = max(cache.get(key) or now, now) + interval
+            if arrival - now > self.burst * interval:
+                return False
+            cache.set(key, arrival, timeout=int(arrival - now) + 1)
+            return True
+
+    def refund(self, now=None):
+        """Give back a token taken for a call that was not made."""
+
+        if self.rate <= 0:
+            return
+        now = time.time() if now is None else now
+        cache = self._cache
+        key = BUCKET_KEY.format(name=self.name)
+        with cache_locks.held(key):
+            arrival = cache.get(key)
+            if arrival is None or arrival <= now:
+                return
+            arrival -= 1.0 / self.rate
+            if arrival <= now:
+                cache.delete(key)
+            else:
+                cache.set(key, arrival, timeout=int(arrival - now) + 1)
+
+    def reset(self):
+        self._cache.delete(BUCKET_KEY.format(name=self.name))
+
+
+def get_global_bucket():
+    return TokenBucket(
+        "global",
+        rate=getattr(settings, "UPSTREAM_RATE_LIMIT_GLOBAL", DEFAULT_GLOBAL_RATE),
+        burst=getattr(settings, "UPSTREAM_RATE_LIMIT_GLOBAL_BURST", DEFAULT_GLOBAL_BURST),
+    )
+
+
+def get_caller_bucket(caller):
+    return TokenBucket(
+        f"caller:{caller}",
+        rate=getattr(settings, "UPSTREAM_RATE_LIMIT_USER", DEFAULT_USER_RATE),
+        burst=getattr(settings, "UPSTREAM_RATE_LIMIT_USER_BURST", DEFAULT_USER_BURST),
+    )
+
+
+class _Caller:
+    def __init__(self, key):
+        self.key = key
+        self.limited = False
+        # What this caller has already paid for, see ``acquire``
+        self.charged = set()
+
+
+_caller = contextvars.ContextVar("upstream_caller", default=None)
+
+
+def client_address(request):
+    """The client's address, read from ``X-Forwarded-For`` behind proxies.
+
+    With ``TRUSTED_PROXY_COUNT`` reverse proxies in front of the app, each
+    appending the address it saw, the entry that many from the right is the
+    one the outermost proxy recorded; anything further left is client-supplied
+    and ignored.
+    """
+
+    proxies = getattr(settings, "TRUSTED_PROXY_COUNT", DEFAULT_TRUSTED_PROXY_COUNT)
+    if proxies > 0:
+        forwarded = [
+            address.strip()
+            for address in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if address.strip()
+        ]
+        if forwarded:
+            return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def request_caller(request):
+    """Bucket key for a web request: the user, or the client address."""
+
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{client_address(request)}"
+
+
+@contextmanager
+def for_caller(key):
+    """Charge upstream calls made inside the block (including worker threads
+    started with a copied context) to ``key``'s bucket as well as the global one."""
+
+    token = _caller.set(_Caller(key))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def acquire(method="", key=None):
+    """Take the tokens for one upstream call or raise ``RateLimitedError``.
+
+    ``key`` names what the call fetches (a symbol, or a tuple of them); the
+    current caller is charged for each key once. The caller's token is given
+    back when the global bucket turns the call down.
+    """
+
+    caller = _caller.get()
+    caller_bucket = None
+    if caller is not None and caller.key and (key is None or key not in caller.charged):
+        caller_bucket = get_caller_bucket(caller.key)
+    if caller_bucket is not None and not caller_bucket.take():
+        scope = caller.key
+    elif not get_global_bucket().take():
+        if caller_bucket is not None:
+            caller_bucket.refund()
+        scope = "global"
+    else:
+        if caller_bucket is not None and key is not None:
+            caller.charged.add(key)
+        return
+    if caller is not None:
+        caller.limited = True
+    logger.info("Upstream rate limit (%s) reached; rejecting %s", scope, method)
+    raise RateLimitedError(f"Upstream rate limit reached ({method})")
+
+
+def was_limited():
+    """Whether an upstream call for the current caller has been rejected."""
+
+    caller = _caller.get()
+    return caller is not None and caller.limited
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import dj_database_url
 import os
+import tempfile
 from django.core.exceptions import ImproperlyConfigured
 
 from dotenv import load_dotenv
@@ -72,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.UpstreamBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -131,6 +133,145 @@ DATABASES = {
 }
 
 
+# Caches
+# The market_data cache is shared by every gunicorn worker on the host, so
+# quotes fetched by one worker are served by all of them.
+
+MARKET_DATA_CACHE_DIR = os.getenv(
+    "MARKET_DATA_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "trackstack-market-data"),
+)
+# Lock files that make claims and counters on that cache atomic across
+# workers (core/cache_locks.py).
+MARKET_DATA_LOCK_DIR = os.getenv(
+    "MARKET_DATA_LOCK_DIR",
+    os.path.join(tempfile.gettempdir(), "trackstack-market-data-locks"),
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "market_data": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": MARKET_DATA_CACHE_DIR,
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Seconds a cached quote stays fresh, keyed by Yahoo's marketState.
+QUOTE_CACHE_TTLS = {
+    "REGULAR": int(os.getenv("QUOTE_CACHE_TTL_REGULAR", "60")),
+    "PRE": 300,
+    "POST": 300,
+    "PREPRE": 900,
+    "POSTPOST": 900,
+    "CLOSED": int(os.getenv("QUOTE_CACHE_TTL_CLOSED", "1800")),
+}
+QUOTE_CACHE_DEFAULT_TTL = 300
+# Per-symbol overrides, e.g. {"^GSPC": 30}
+QUOTE_CACHE_SYMBOL_TTLS = {}
+# How long past its TTL a quote may still be served while it is refreshed.
+QUOTE_CACHE_STALE_SECONDS = int(os.getenv("QUOTE_CACHE_STALE_SECONDS", "600"))
+
+# Concurrent upstream fetching in get_quotes: pool size, per-symbol timeout
+# and overall deadline (seconds) for one batch.
+QUOTE_FETCH_WORKERS = int(os.getenv("QUOTE_FETCH_WORKERS", "8"))
+QUOTE_FETCH_SYMBOL_TIMEOUT = float(os.getenv("QUOTE_FETCH_SYMBOL_TIMEOUT", "10"))
+QUOTE_FETCH_DEADLINE = float(os.getenv("QUOTE_FETCH_DEADLINE", "60"))
+# Most tickers one request to the batch quote endpoint may ask for.
+QUOTE_BATCH_MAX_SYMBOLS = int(os.getenv("QUOTE_BATCH_MAX_SYMBOLS", "50"))
+# Longest a request waits on an identical in-flight fetch (in this or another
+# worker) before going upstream itself.
+QUOTE_SINGLE_FLIGHT_WAIT = float(os.getenv("QUOTE_SINGLE_FLIGHT_WAIT", "30"))
+# Seconds an order may execute on the quote shown by the ticker lookup
+# (0 always fetches a fresh quote).
+QUOTE_LOCK_SECONDS = int(os.getenv("QUOTE_LOCK_SECONDS", "30"))
+
+# Cached quotes are kept this long past the stale window so they can be served
+# (flagged stale) while the upstream circuit breaker is open.
+QUOTE_CACHE_RETAIN_SECONDS = int(os.getenv("QUOTE_CACHE_RETAIN_SECONDS", str(60 * 60 * 24)))
+
+# Upstream circuit breaker: open after this many failures within the window,
+# then stop calling Yahoo for the cooldown (seconds).
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_WINDOW = int(os.getenv("UPSTREAM_BREAKER_WINDOW", "60"))
+UPSTREAM_BREAKER_COOLDOWN = int(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))
+# Retries per upstream call, and retries allowed across one web request.
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "1"))
+UPSTREAM_REQUEST_RETRY_BUDGET = int(os.getenv("UPSTREAM_REQUEST_RETRY_BUDGET", "2"))
+
+# Token-bucket limits on upstream calls (calls per second and burst size),
+# for the whole host and for each user or anonymous client address. A rate
+# of 0 disables that limit.
+UPSTREAM_RATE_LIMIT_GLOBAL = float(os.getenv("UPSTREAM_RATE_LIMIT_GLOBAL", "10"))
+UPSTREAM_RATE_LIMIT_GLOBAL_BURST = int(os.getenv("UPSTREAM_RATE_LIMIT_GLOBAL_BURST", "100"))
+UPSTREAM_RATE_LIMIT_USER = float(os.getenv("UPSTREAM_RATE_LIMIT_USER", "1"))
+UPSTREAM_RATE_LIMIT_USER_BURST = int(os.getenv("UPSTREAM_RATE_LIMIT_USER_BURST", "60"))
+# Reverse proxies in front of the app that append to X-Forwarded-For; anonymous
+# clients are rate limited by the address the outermost one saw (0 = REMOTE_ADDR).
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+
+# refresh_quotes polling intervals (seconds) for open and closed markets, and
+# how old a LatestQuote row may be before valuation falls back to upstream.
+REFRESH_QUOTES_OPEN_INTERVAL = int(os.getenv("REFRESH_QUOTES_OPEN_INTERVAL", "60"))
+REFRESH_QUOTES_CLOSED_INTERVAL = int(os.getenv("REFRESH_QUOTES_CLOSED_INTERVAL", "900"))
+LATEST_QUOTE_OPEN_MAX_AGE = int(os.getenv("LATEST_QUOTE_OPEN_MAX_AGE", "300"))
+LATEST_QUOTE_CLOSED_MAX_AGE = int(os.getenv("LATEST_QUOTE_CLOSED_MAX_AGE", str(12 * 60 * 60)))
+
+# Seconds before stored instrument metadata (currency, names, exchange) is
+# looked up again.
+INSTRUMENT_REFRESH_SECONDS = int(os.getenv("INSTRUMENT_REFRESH_SECONDS", str(60 * 60 * 24 * 30)))
+
+# Seconds a symbol-registry verdict is trusted before Yahoo is asked again.
+SYMBOL_INVALID_TTL = int(os.getenv("SYMBOL_INVALID_TTL", str(60 * 60 * 24)))
+SYMBOL_VALID_TTL = int(os.getenv("SYMBOL_VALID_TTL", str(60 * 60 * 24 * 7)))
+
+# Seconds a latest FX rate is reused before the next batched download.
+FX_RATE_TTL = int(os.getenv("FX_RATE_TTL", "300"))
+
+# Market data backend: "yfinance" (live), "record" (live, saving every
+# response) or "replay" (offline from recordings). See core/market_data.py.
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+MARKET_DATA_RECORDINGS_DIR = os.getenv(
+    "MARKET_DATA_RECORDINGS_DIR", str(BASE_DIR / "market_data_recordings")
+)
+# Local columnar store of daily closes (core/price_history.py).
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", str(BASE_DIR / "price_history"))
+
+# Seconds between refreshes of a symbol's shared intraday minute bars.
+INTRADAY_REFRESH_SECONDS = int(os.getenv("INTRADAY_REFRESH_SECONDS", "60"))
+
+# Seconds browsers and shared caches may reuse a portfolio's chart data.
+CHART_MAX_AGE = int(os.getenv("CHART_MAX_AGE", "300"))
+
+# Seconds anonymous viewers of a public portfolio page share one rendered copy.
+PUBLIC_PAGE_CACHE_SECONDS = int(os.getenv("PUBLIC_PAGE_CACHE_SECONDS", "60"))
+
+# Live value streams: off by default, since every open stream holds a worker
+# for LIVE_STREAM_SECONDS; only enable them with threaded or async workers
+# (e.g. gunicorn --worker-class gthread --threads N). Then seconds between
+# shared live-quote refreshes in each worker, and how long one stream stays
+# open before the browser reconnects.
+LIVE_STREAM_ENABLED = os.getenv("LIVE_STREAM_ENABLED", "0").lower() in ("1", "true", "yes")
+LIVE_QUOTE_INTERVAL = int(os.getenv("LIVE_QUOTE_INTERVAL", "15"))
+LIVE_STREAM_SECONDS = int(os.getenv("LIVE_STREAM_SECONDS", "300"))
+
+# Offline listings behind type-ahead ticker search (refresh_symbol_listings),
+# and how often each worker rebuilds its in-memory index.
+SYMBOL_LISTINGS_FILE = os.getenv("SYMBOL_LISTINGS_FILE", str(BASE_DIR / "symbol_listings.csv"))
+SYMBOL_INDEX_REFRESH_SECONDS = int(os.getenv("SYMBOL_INDEX_REFRESH_SECONDS", "3600"))
+
+# Browser fingerprint for the pooled upstream session, and whether each web
+# worker opens its connection and fetches Yahoo's crumb at start-up.
+MARKET_DATA_IMPERSONATE = os.getenv("MARKET_DATA_IMPERSONATE", "chrome")
+MARKET_DATA_WARM_SESSION = os.getenv("MARKET_DATA_WARM_SESSION", "1").lower() in ("1", "true", "yes")
+# Injected per-call latency (seconds) when replaying, plus random jitter.
+MARKET_DATA_REPLAY_LATENCY = float(os.getenv("MARKET_DATA_REPLAY_LATENCY", "0"))
+MARKET_DATA_REPLAY_JITTER = float(os.getenv("MARKET_DATA_REPLAY_JITTER", "0"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
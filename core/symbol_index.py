@@ -0,0 +1,233 @@
+"""In-memory prefix index for type-ahead ticker search.
+
+Each process builds the index from the offline listings file
+(``SYMBOL_LISTINGS_FILE``, written by ``manage.py refresh_symbol_listings``),
+the names stored in the ``Instrument`` table and every symbol ever traded in
+``Order``. Searches are a ``bisect`` into two sorted key lists (symbols, and
+the words of each name) plus a short scan, so they never touch the database
+or upstream. The index is rebuilt when the listings file changes or after
+``SYMBOL_INDEX_REFRESH_SECONDS``; symbols traded or watched in this process
+are added straight away.
+"""
+import csv
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from portfolios.models import Instrument, Order
+
+DEFAULT_LISTINGS_FILE = "symbol_listings.csv"
+DEFAULT_REFRESH_SECONDS = 60 * 60
+DEFAULT_LIMIT = 10
+# Candidates examined per key list before ranking, whatever the limit
+SCAN_LIMIT = 200
+LISTING_FIELDS = ("symbol", "name", "exchange")
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@dataclass
+class _Index:
+    listings: dict = field(default_factory=dict)  # symbol -> (name, exchange)
+    traded: set = field(default_factory=set)
+    symbols: list = field(default_factory=list)  # sorted symbols
+    words: list = field(default_factory=list)  # sorted (word, symbol)
+    built_at: float = 0.0
+    listings_mtime: float = None
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _listings_file():
+    return getattr(settings, "SYMBOL_LISTINGS_FILE", DEFAULT_LISTINGS_FILE)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def parse_listings_csv(lines):
+    """Return ``{symbol: (name, exchange)}`` from ``symbol,name,exchange`` CSV lines."""
+
+    listings = {}
+    for row in csv.DictReader(lines):
+        symbol = (row.get("symbol") or "").strip().upper()
+        if symbol:
+            listings[symbol] = (
+                (row.get("name") or "").strip(),
+                (row.get("exchange") or "").strip(),
+            )
+    return listings
+
+
+def read_listings(path):
+    """Return the listings in the CSV at ``path`` (empty if it does not exist)."""
+
+    try:
+        with open(path, newline="", encoding="utf-8") as fh:
+            return parse_listings_csv(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def write_listings(path, listings):
+    """Atomically write ``{symbol: (name, exchange)}`` as a listings CSV."""
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(LISTING_FIELDS)
+        for symbol in sorted(listings):
+            name, exchange = listings[symbol]
+            writer.writerow((symbol, name, exchange))
+    os.replace(tmp_path, path)
+
+
+def _words(name):
+    return set(_WORD.findall(name.lower()))
+
+
+def _sort_keys(index):
+    index.symbols = sorted(index.listings)
+    index.words = sorted(
+        (word, symbol)
+        for symbol, (name, _) in index.listings.items()
+        for word in _words(name)
+    )
+
+
+def _build():
+    path = _listings_file()
+    index = _Index(listings_mtime=_mtime(path), built_at=time.monotonic())
+    index.listings = read_listings(path)
+    try:
+        for symbol, short_name, long_name, exchange in Instrument.objects.values_list(
+            "symbol", "short_name", "long_name", "exchange"
+        ):
+            name, listed_exchange = index.listings.get(symbol, ("", ""))
+            index.listings[symbol] = (
+                name or long_name or short_name or "",
+                listed_exchange or exchange or "",
+            )
+        index.traded = set(Order.objects.values_list("symbol", flat=True).distinct())
+    except DatabaseError:
+        pass
+    for symbol in index.traded:
+        index.listings.setdefault(symbol, ("", ""))
+    _sort_keys(index)
+    return index
+
+
+def _refresh_seconds():
+    return getattr(settings, "SYMBOL_INDEX_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)
+
+
+def get_index():
+    """Return this process's index, rebuilding it when it has gone stale."""
+
+    global _index
+    index = _index
+    if (
+        index is None
+        or time.monotonic() - index.built_at > _refresh_seconds()
+        or _mtime(_listings_file()) != index.listings_mtime
+    ):
+        with _lock:
+            if _index is index:
+                _index = _build()
+            index = _index
+    return index
+
+
+def clear():
+    global _index
+    with _lock:
+        _index = None
+
+
+def add(symbol, name="", exchange="", traded=True):
+    """Make a new symbol searchable in this process immediately.
+
+    ``traded`` marks it as traded, which ranks it higher in searches; pass
+    ``False`` for symbols that are only being watched.
+    """
+
+    global _index
+    symbol = symbol.strip().upper()
+    with _lock:
+        index = _index
+        if index is None:
+            return
+        new_listing = symbol not in index.listings
+        newly_traded = traded and symbol not in index.traded
+        if not (new_listing or newly_traded):
+            return
+        # Copy-on-write so concurrent searches keep a consistent view
+        updated = _Index(
+            listings={**index.listings, symbol: (name, exchange)} if new_listing else index.listings,
+            traded=index.traded | {symbol} if newly_traded else index.traded,
+            symbols=index.symbols,
+            words=index.words,
+            built_at=index.built_at,
+            listings_mtime=index.listings_mtime,
+        )
+        if new_listing:
+            _sort_keys(updated)
+        _index = updated
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    """Return up to ``limit`` ``{"symbol", "name", "exchange"}`` matches.
+
+    Exact and prefix symbol matches rank first, then names with a word
+    starting with each query word; symbols already traded rank higher.
+    """
+
+    query = query.strip()
+    if not query:
+        return []
+    index = get_index()
+
+    ranked = {}
+    prefix = query.upper()
+    start = bisect_left(index.symbols, prefix)
+    for symbol in index.symbols[start:start + SCAN_LIMIT]:
+        if not symbol.startswith(prefix):
+            break
+        ranked[symbol] = (0 if symbol == prefix else 1, len(symbol))
+
+    terms = _WORD.findall(query.lower())
+    if terms:
+        first, rest = terms[0], terms[1:]
+        start = bisect_left(index.words, (first,))
+        for word, symbol in index.words[start:start + SCAN_LIMIT]:
+            if not word.startswith(first):
+                break
+            if symbol in ranked:
+                continue
+            words = _words(index.listings[symbol][0])
+            if all(any(w.startswith(term) for w in words) for term in rest):
+                ranked[symbol] = (2, len(symbol))
+
+    best = sorted(
+        ranked,
+        key=lambda symbol: (ranked[symbol][0], symbol not in index.traded, ranked[symbol][1], symbol),
+    )[:limit]
+    return [
+        {"symbol": symbol, "name": index.listings[symbol][0], "exchange": index.listings[symbol][1]}
+        for symbol in best
+    ]
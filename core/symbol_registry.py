@@ -0,0 +1,138 @@
+"""Persistent registry of known-good and known-bad ticker symbols.
+
+Verdicts live in the ``SymbolStatus`` table with an expiry and are memoised in
+each process, so a ticker Yahoo has already rejected is answered without a
+query or an upstream call until its verdict expires. Only definitive "no such
+ticker" answers are recorded as invalid; timeouts and transport errors are not.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from portfolios.models import SymbolStatus
+
+DEFAULT_INVALID_TTL = 60 * 60 * 24
+DEFAULT_VALID_TTL = 60 * 60 * 24 * 7
+# How long a "not in the registry" answer is memoised before re-querying.
+UNKNOWN_MEMO_SECONDS = 60
+
+_memo = {}  # symbol -> (is_valid or None when unknown, reason, expires_at epoch)
+_lock = threading.Lock()
+
+
+def clear():
+    with _lock:
+        _memo.clear()
+
+
+def _normalise(symbol):
+    return symbol.strip().upper()
+
+
+def _lookup(symbols):
+    """Return ``{symbol: (is_valid, reason)}`` for symbols with a live verdict."""
+
+    now = time.time()
+    known = {}
+    unknown = []
+    with _lock:
+        for symbol in symbols:
+            entry = _memo.get(_normalise(symbol))
+            if entry is None or entry[2] <= now:
+                unknown.append(symbol)
+            elif entry[0] is not None:
+                known[symbol] = entry[:2]
+
+    if unknown:
+        try:
+            rows = {
+                row.symbol: row
+                for row in SymbolStatus.objects.filter(
+                    symbol__in={_normalise(symbol) for symbol in unknown},
+                    expires_at__gt=timezone.now(),
+                )
+            }
+        except DatabaseError:
+            rows = {}
+        with _lock:
+            for symbol in unknown:
+                row = rows.get(_normalise(symbol))
+                if row is None:
+                    _memo[_normalise(symbol)] = (None, "", now + UNKNOWN_MEMO_SECONDS)
+                    continue
+                _memo[row.symbol] = (row.is_valid, row.reason, row.expires_at.timestamp())
+                known[symbol] = (row.is_valid, row.reason)
+
+    return known
+
+
+def invalid_symbols(symbols):
+    """Return ``{symbol: reason}`` for symbols currently known to be invalid."""
+
+    return {
+        symbol: reason
+        for symbol, (is_valid, reason) in _lookup(symbols).items()
+        if not is_valid
+    }
+
+
+def _record(verdicts):
+    if not verdicts:
+        return
+    now = timezone.now()
+    ttls = {
+        True: getattr(settings, "SYMBOL_VALID_TTL", DEFAULT_VALID_TTL),
+        False: getattr(settings, "SYMBOL_INVALID_TTL", DEFAULT_INVALID_TTL),
+    }
+    for symbol, (is_valid, reason) in verdicts.items():
+        symbol = _normalise(symbol)
+        expires_at = now + timedelta(seconds=ttls[is_valid])
+        try:
+            SymbolStatus.objects.update_or_create(
+                symbol=symbol,
+                defaults={
+                    "is_valid": is_valid,
+                    "reason": reason[:255],
+                    "checked_at": now,
+                    "expires_at": expires_at,
+                },
+            )
+        except DatabaseError:
+            continue
+        with _lock:
+            _memo[symbol] = (is_valid, reason, expires_at.timestamp())
+
+
+def mark_invalid(reasons):
+    """Record ``{symbol: reason}`` as tickers Yahoo does not recognise.
+
+    Symbols with a live "valid" verdict are left alone: one empty response
+    is not enough to overturn a ticker that has priced before. Returns the
+    symbols actually recorded as invalid.
+    """
+
+    known = _lookup(list(reasons))
+    verdicts = {
+        symbol: (False, reason)
+        for symbol, reason in reasons.items()
+        if not known.get(symbol, (False,))[0]
+    }
+    _record(verdicts)
+    return set(verdicts)
+
+
+def mark_valid(symbols):
+    """Record ``symbols`` as priced successfully, skipping ones already known good."""
+
+    known = _lookup(symbols)
+    _record(
+        {
+            symbol: (True, "")
+            for symbol in symbols
+            if not known.get(symbol, (False,))[0]
+        }
+    )
@@ -1,15 +1,104 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from unittest.mock import Mock, patch
 
-from django.test import SimpleTestCase
+import pandas as pd
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 
-from core.yfinance_client import get_quote
+from core import (
+    cache_locks,
+    fx,
+    http_session,
+    instruments,
+    intraday,
+    live_quotes,
+    market_hours,
+    price_history,
+    quote_cache,
+    rate_limit,
+    symbol_index,
+    symbol_registry,
+)
+from core.circuit_breaker import CircuitOpenError, get_breaker, retry_budget
+from core.market_data import (
+    GuardedProvider,
+    MarketDataProvider,
+    RecordingProvider,
+    ReplayMissError,
+    ReplayProvider,
+    YFinanceProvider,
+    set_provider,
+)
+from core.yfinance_client import InvalidSymbolError, get_quote, get_quotes, iter_quotes
+from portfolios.models import Instrument, Order, Portfolio, SymbolStatus
 
 
-class YFinanceClientTests(SimpleTestCase):
-    @patch("core.yfinance_client.yf.Ticker")
-    def test_get_quote_prefers_intraday_price(self, mock_ticker):
-        ticker = Mock()
-        ticker.info = {
+class FakeProvider(MarketDataProvider):
+    """In-memory provider that records every call it receives."""
+
+    name = "fake"
+
+    def __init__(self, info=None, fast_info=None, history=None, splits=None):
+        self.info = info or {}
+        self.fast_info = fast_info or {}
+        self.history = history
+        self.splits = splits or {}
+        self.calls = []
+
+    def get_info(self, symbol):
+        self.calls.append(("get_info", symbol))
+        return self.info[symbol]
+
+    def get_fast_info(self, symbol):
+        self.calls.append(("get_fast_info", symbol))
+        return self.fast_info.get(symbol, {})
+
+    def get_history(self, symbol, **kwargs):
+        self.calls.append(("get_history", symbol))
+        return self.history
+
+    def download(self, symbols, **kwargs):
+        self.calls.append(("download", list(symbols)))
+        return self.history
+
+    def get_splits(self, symbol):
+        self.calls.append(("get_splits", symbol))
+        if symbol not in self.splits:
+            raise LookupError(symbol)
+        return self.splits[symbol]
+
+    def get_dividends(self, symbol):
+        self.calls.append(("get_dividends", symbol))
+        raise LookupError(symbol)
+
+    def calls_to(self, method):
+        return [args for name, args in self.calls if name == method]
+
+
+class ProviderTestCase(TestCase):
+    def setUp(self):
+        quote_cache.get_cache().clear()
+        fx.clear()
+        symbol_registry.clear()
+        instruments.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(PRICE_HISTORY_DIR=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.provider = FakeProvider()
+        set_provider(self.provider)
+        self.addCleanup(set_provider, None)
+
+
+class YFinanceClientTests(ProviderTestCase):
+    def test_get_quote_prefers_intraday_price(self):
+        self.provider.info["AAPL"] = {
             "currentPrice": 100,
             "currency": "USD",
             "open": 1,
@@ -17,8 +106,7 @@ class YFinanceClientTests(SimpleTestCase):
             "ask": 1.5,
             "symbol": "AAPL",
         }
-        ticker.fast_info = {"last_price": 105, "currency": "USD"}
-        mock_ticker.return_value = ticker
+        self.provider.fast_info["AAPL"] = {"last_price": 105, "currency": "USD"}
 
         quote = get_quote("AAPL")
 
@@ -26,14 +114,893 @@ class YFinanceClientTests(SimpleTestCase):
         self.assertEqual(quote["currency"], "USD")
         self.assertEqual(quote["fx_rate"], 1.0)
 
-    @patch("core.yfinance_client.yf.Ticker")
-    def test_get_quote_falls_back_to_previous_close(self, mock_ticker):
-        ticker = Mock()
-        ticker.info = {"regularMarketPreviousClose": 90, "currency": "USD", "open": 0}
-        ticker.fast_info = {}
-        mock_ticker.return_value = ticker
+    def test_get_quote_falls_back_to_previous_close(self):
+        self.provider.info["MSFT"] = {
+            "regularMarketPreviousClose": 90,
+            "currency": "USD",
+            "open": 0,
+        }
 
         quote = get_quote("MSFT")
 
         self.assertEqual(quote["price"], 90)
         self.assertFalse(quote["traded_today"])
+
+    def test_get_quotes_reports_failed_symbols(self):
+        self.provider.info["AAPL"] = {"currency": "USD", "open": 1}
+        self.provider.fast_info["AAPL"] = {"last_price": 105, "currency": "USD"}
+
+        quotes = get_quotes(["AAPL", "NOPE"])
+
+        self.assertEqual(list(quotes), ["AAPL"])
+        self.assertIn("NOPE", quotes.failed)
+        self.assertEqual(quotes.timed_out, [])
+
+    @override_settings(QUOTE_FETCH_SYMBOL_TIMEOUT=0.05, QUOTE_FETCH_DEADLINE=5)
+    def test_get_quotes_abandons_slow_symbols(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        get_info = self.provider.get_info
+
+        def slow_get_info(symbol):
+            if symbol == "SLOW":
+                release.wait(5)
+            return get_info(symbol)
+
+        self.provider.get_info = slow_get_info
+        self.provider.info["AAPL"] = {"currency": "USD", "open": 1}
+        self.provider.fast_info["AAPL"] = {"last_price": 105, "currency": "USD"}
+
+        started = time.monotonic()
+        quotes = get_quotes(["SLOW", "AAPL"])
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(list(quotes), ["AAPL"])
+        self.assertEqual(quotes.timed_out, ["SLOW"])
+
+
+class LightQuoteTests(ProviderTestCase):
+    def test_light_quote_never_reads_info(self):
+        self.provider.history = _fx_history({"GBPUSD=X": 1.25})
+        self.provider.fast_info["VOD.L"] = {"last_price": 250, "currency": "GBp"}
+
+        quote = get_quote("VOD.L", light=True)
+
+        self.assertEqual(quote["price"], 2.5)
+        self.assertEqual(quote["native_currency"], "GBp")
+        self.assertEqual(quote["fx_rate"], 1.25)
+        self.assertEqual(self.provider.calls_to("get_info"), [])
+
+    def test_light_lookup_reuses_fresh_full_quote(self):
+        quote_cache.store_quotes({"AAPL": {"price": 100, "market_state": "REGULAR"}})
+
+        quotes = get_quotes(["AAPL"], light=True)
+
+        self.assertEqual(quotes["AAPL"]["price"], 100)
+        self.assertEqual(self.provider.calls, [])
+
+    def test_light_quote_without_price_is_reported(self):
+        self.provider.fast_info["DEAD"] = {"currency": "USD"}
+
+        quotes = get_quotes(["DEAD"], light=True)
+
+        self.assertEqual(dict(quotes), {})
+        self.assertIn("DEAD", quotes.failed)
+        with self.assertRaises(LookupError):
+            get_quote("DEAD", light=True)
+
+
+class InstrumentTests(ProviderTestCase):
+    def test_currencies_are_looked_up_once_and_stored(self):
+        self.provider.fast_info["VOD.L"] = {"currency": "GBp", "exchange": "LSE"}
+
+        first = instruments.get_currencies(["VOD.L", "NOPE"])
+        instruments.clear()  # a fresh worker reads the table instead
+        second = instruments.get_currencies(["VOD.L"])
+
+        self.assertEqual(first, {"VOD.L": "GBp", "NOPE": "USD"})
+        self.assertEqual(second, {"VOD.L": "GBp"})
+        self.assertEqual(self.provider.calls_to("get_fast_info"), ["VOD.L", "NOPE"])
+        self.assertTrue(Instrument.objects.get(symbol="VOD.L").is_pence)
+
+    def test_full_quotes_record_display_names(self):
+        self.provider.info["AAPL"] = {
+            "currency": "USD",
+            "open": 1,
+            "shortName": "Apple",
+            "longName": "Apple Inc.",
+            "exchange": "NMS",
+        }
+        self.provider.fast_info["AAPL"] = {"last_price": 105, "currency": "USD"}
+
+        get_quote("AAPL")
+
+        instrument = Instrument.objects.get(symbol="AAPL")
+        self.assertEqual(instrument.display_name, "Apple Inc.")
+        self.assertEqual(instrument.exchange, "NMS")
+
+
+class SymbolRegistryTests(ProviderTestCase):
+    def test_invalid_ticker_is_answered_locally_after_first_lookup(self):
+        self.provider.info["NOPE"] = {"trailingPegRatio": None}
+
+        with self.assertRaises(InvalidSymbolError):
+            get_quote("NOPE")
+        symbol_registry.clear()  # a fresh worker still has the persisted verdict
+        with self.assertRaises(InvalidSymbolError):
+            get_quote("NOPE")
+
+        self.assertEqual(self.provider.calls_to("get_info"), ["NOPE"])
+        self.assertFalse(SymbolStatus.objects.get(symbol="NOPE").is_valid)
+
+    def test_expired_verdict_is_rechecked(self):
+        SymbolStatus.objects.create(
+            symbol="AAPL",
+            is_valid=False,
+            checked_at=timezone.now(),
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.provider.info["AAPL"] = {"currency": "USD", "open": 1}
+        self.provider.fast_info["AAPL"] = {"last_price": 105, "currency": "USD"}
+
+        quotes = get_quotes(["AAPL"])
+
+        self.assertEqual(quotes["AAPL"]["price"], 105)
+        self.assertTrue(SymbolStatus.objects.get(symbol="AAPL").is_valid)
+
+    def test_transient_failures_are_not_recorded_as_invalid(self):
+        quotes = get_quotes(["DOWN"])  # FakeProvider raises KeyError
+
+        self.assertIn("DOWN", quotes.failed)
+        self.assertEqual(quotes.invalid, {})
+        self.assertFalse(SymbolStatus.objects.exists())
+
+    def test_known_valid_symbol_is_not_flipped_by_one_empty_response(self):
+        symbol_registry.mark_valid(["AAPL"])
+        self.provider.fast_info["AAPL"] = {}
+
+        quotes = get_quotes(["AAPL"], light=True)
+
+        self.assertIn("AAPL", quotes.failed)
+        self.assertEqual(quotes.invalid, {})
+        self.assertTrue(SymbolStatus.objects.get(symbol="AAPL").is_valid)
+
+    def test_fast_info_transport_errors_are_upstream_failures(self):
+        class FailingFastInfo:
+            def __getattr__(self, name):
+                raise ConnectionError("reset by peer")
+
+        ticker = Mock(fast_info=FailingFastInfo())
+        with patch("core.market_data.yf.Ticker", return_value=ticker):
+            with self.assertRaises(ConnectionError):
+                YFinanceProvider().get_fast_info("AAPL")
+
+
+class QuoteCacheTests(ProviderTestCase):
+    def _listing(self, symbol, price):
+        self.provider.info[symbol] = {"currency": "USD", "open": 1, "marketState": "REGULAR"}
+        self.provider.fast_info[symbol] = {"last_price": price, "currency": "USD"}
+
+    def test_repeat_lookups_are_served_from_cache(self):
+        self._listing("AAPL", 105)
+
+        get_quote("AAPL")
+        quote = get_quote("aapl")
+
+        self.assertEqual(quote["price"], 105)
+        self.assertEqual(self.provider.calls_to("get_info"), ["AAPL"])
+        stats = quote_cache.get_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_refresh_claims_and_counters_are_atomic_across_threads(self):
+        cache = quote_cache.get_cache()
+        wins = []
+
+        def worker():
+            wins.append(cache_locks.add(cache, quote_cache._lock_key("AAPL"), True, 60))
+            for _ in range(20):
+                quote_cache._bump("hits")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(wins.count(True), 1)
+        self.assertEqual(quote_cache.get_stats()["hits"], 160)
+
+    def test_get_quotes_reports_when_cached_quotes_were_fetched(self):
+        fetched_at = time.time() - 30
+        quote_cache.store_quotes(
+            {"AAPL": {"price": 100, "market_state": "REGULAR"}}, fetched_at=fetched_at
+        )
+        self._listing("MSFT", 50)
+
+        before = time.time()
+        quotes = get_quotes(["AAPL", "MSFT"])
+
+        self.assertEqual(quotes.fetched_at["AAPL"], fetched_at)
+        self.assertGreaterEqual(quotes.fetched_at["MSFT"], before)
+
+    def test_get_quotes_only_fetches_missing_symbols(self):
+        quote_cache.store_quotes({"AAPL": {"price": 100, "market_state": "REGULAR"}})
+        self._listing("MSFT", 50)
+
+        quotes = get_quotes(["AAPL", "MSFT"])
+
+        self.assertEqual(self.provider.calls_to("get_info"), ["MSFT"])
+        self.assertEqual(quotes["AAPL"]["price"], 100)
+        self.assertEqual(quotes["MSFT"]["price"], 50)
+
+    @patch("core.quote_cache._refresh_in_background")
+    def test_expired_quote_is_served_stale_and_revalidated(self, mock_refresh):
+        quote_cache.store_quotes(
+            {"AAPL": {"price": 100, "market_state": "REGULAR"}},
+            fetched_at=time.time() - 120,
+        )
+        fetch = Mock()
+
+        quotes = quote_cache.get_cached_quotes(["AAPL"], fetch)
+
+        self.assertEqual(quotes["AAPL"]["price"], 100)
+        fetch.assert_not_called()
+        mock_refresh.assert_called_once_with(["AAPL"], fetch, False)
+        self.assertEqual(quote_cache.get_stats()["stale"], 1)
+
+    def test_stale_quote_refetched_when_stale_not_allowed(self):
+        quote_cache.store_quotes(
+            {"AAPL": {"price": 100, "market_state": "REGULAR"}},
+            fetched_at=time.time() - 120,
+        )
+        fetch = Mock(return_value={"AAPL": {"price": 101, "market_state": "REGULAR"}})
+
+        quotes = quote_cache.get_cached_quotes(["AAPL"], fetch, allow_stale=False)
+
+        self.assertEqual(quotes["AAPL"]["price"], 101)
+        fetch.assert_called_once_with(["AAPL"])
+
+    def test_background_refresh_runs_once_per_symbol(self):
+        fetch = Mock(return_value={"AAPL": {"price": 102, "market_state": "REGULAR"}})
+        quote_cache.get_cache().add("quote-refresh:MSFT", True)
+
+        thread = quote_cache._refresh_in_background(["AAPL", "MSFT"], fetch)
+        thread.join()
+
+        fetch.assert_called_once_with(["AAPL"])
+        quotes = quote_cache.get_cached_quotes(["AAPL"], Mock())
+        self.assertEqual(quotes["AAPL"]["price"], 102)
+
+
+def _fx_history(closes, dates=None):
+    dates = dates or [pd.Timestamp("2024-05-01")]
+    frames = {
+        (symbol, "Close"): [close] * len(dates) for symbol, close in closes.items()
+    }
+    return pd.DataFrame(frames, index=pd.DatetimeIndex(dates))
+
+
+class SingleFlightTests(ProviderTestCase):
+    def setUp(self):
+        super().setUp()
+        quote_cache.reset_stats()
+
+    def test_concurrent_misses_share_one_fetch(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch(symbols):
+            calls.append(list(symbols))
+            started.set()
+            release.wait(5)
+            return {"AAPL": {"price": 100}}
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(quote_cache.get_cached_quotes(["AAPL"], fetch))
+        )
+        leader.start()
+        self.assertTrue(started.wait(5))
+        follower = threading.Thread(
+            target=lambda: results.append(quote_cache.get_cached_quotes(["AAPL"], fetch))
+        )
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(calls, [["AAPL"]])
+        self.assertEqual(results, [{"AAPL": {"price": 100}}] * 2)
+        self.assertEqual(quote_cache.get_stats()["collapsed"], 1)
+
+    def test_waits_for_fetch_in_another_worker(self):
+        cache = quote_cache.get_cache()
+        cache.add(quote_cache._lock_key("AAPL"), True, 60)
+
+        def other_worker():
+            time.sleep(0.05)
+            quote_cache.store_quotes({"AAPL": {"price": 101}})
+            cache.delete(quote_cache._lock_key("AAPL"))
+
+        threading.Thread(target=other_worker).start()
+        fetch = Mock()
+
+        quotes = quote_cache.get_cached_quotes(["AAPL"], fetch)
+
+        self.assertEqual(quotes, {"AAPL": {"price": 101}})
+        fetch.assert_not_called()
+        self.assertEqual(quote_cache.get_stats()["collapsed"], 1)
+
+
+@override_settings(UPSTREAM_BREAKER_FAILURES=2)
+class CircuitBreakerTests(ProviderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.guarded = GuardedProvider(self.provider, max_retries=1, backoff=0)
+        set_provider(self.guarded)
+
+    def test_breaker_opens_and_short_circuits_upstream(self):
+        self.provider.history = None
+        self.provider.download = Mock(side_effect=ConnectionError("down"))
+
+        with self.assertRaises(ConnectionError):
+            self.guarded.download(["GBPUSD=X"])
+        with self.assertRaises(CircuitOpenError):
+            self.guarded.download(["GBPUSD=X"])
+
+        self.assertEqual(self.provider.download.call_count, 2)  # first call + one retry
+        self.assertTrue(get_breaker().is_open())
+
+    def test_unknown_symbols_do_not_trip_the_breaker(self):
+        for _ in range(3):
+            with self.assertRaises(KeyError):
+                self.guarded.get_info("NOPE")
+
+        self.assertFalse(get_breaker().is_open())
+
+    def test_request_budget_caps_retries(self):
+        self.provider.get_splits = Mock(side_effect=ConnectionError("down"))
+
+        with override_settings(UPSTREAM_BREAKER_FAILURES=10), retry_budget(0):
+            with self.assertRaises(ConnectionError):
+                self.guarded.get_splits("AAPL")
+
+        self.provider.get_splits.assert_called_once_with("AAPL")
+
+    def test_failures_count_within_the_window_despite_successes(self):
+        breaker = get_breaker()
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertTrue(breaker.is_open())
+
+    @override_settings(UPSTREAM_BREAKER_COOLDOWN=0)
+    def test_half_open_breaker_lets_one_trial_through(self):
+        breaker = get_breaker()
+        for _ in range(2):
+            breaker.record_failure()
+
+        self.assertTrue(breaker.allow_call())
+        self.assertFalse(breaker.allow_call())
+        self.assertTrue(breaker.is_open())
+
+        breaker.record_success()
+
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow_call())
+
+    def test_failed_trial_reopens_the_breaker(self):
+        breaker = get_breaker()
+        with override_settings(UPSTREAM_BREAKER_COOLDOWN=0):
+            for _ in range(2):
+                get_breaker().record_failure()
+            self.assertTrue(get_breaker().allow_call())
+
+        breaker.record_failure()
+
+        self.assertFalse(breaker.allow_call())
+
+    def test_open_breaker_serves_last_known_quote_as_stale(self):
+        quote_cache.store_quotes(
+            {"AAPL": {"price": 100, "market_state": "CLOSED"}},
+            fetched_at=time.time() - 60 * 60 * 6,
+        )
+        for _ in range(2):
+            get_breaker().record_failure()
+
+        quotes = get_quotes(["AAPL"])
+
+        self.assertEqual(quotes["AAPL"], {"price": 100, "market_state": "CLOSED", "stale": True})
+        self.assertEqual(quotes.failed, {})
+        self.assertEqual(self.provider.calls, [])
+
+
+class RateLimitTests(ProviderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.guarded = GuardedProvider(self.provider, max_retries=0, backoff=0)
+        set_provider(self.guarded)
+
+    def test_bucket_allows_burst_then_refills(self):
+        bucket = rate_limit.TokenBucket("test", rate=1, burst=2)
+
+        self.assertTrue(bucket.take(now=1000))
+        self.assertTrue(bucket.take(now=1000))
+        self.assertFalse(bucket.take(now=1000))
+        self.assertTrue(bucket.take(now=1001))
+        self.assertFalse(bucket.take(now=1001))
+
+    def test_concurrent_takes_never_exceed_the_burst(self):
+        bucket = rate_limit.TokenBucket("test", rate=0.001, burst=5)
+        taken = []
+        threads = [
+            threading.Thread(target=lambda: taken.append(bucket.take(now=1000)))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(taken.count(True), 5)
+
+    @override_settings(UPSTREAM_RATE_LIMIT_USER=0.001, UPSTREAM_RATE_LIMIT_USER_BURST=1)
+    def test_each_caller_has_its_own_bucket(self):
+        with rate_limit.for_caller("user:1"):
+            self.guarded.get_fast_info("AAPL")
+            with self.assertRaises(rate_limit.RateLimitedError):
+                self.guarded.get_fast_info("MSFT")
+        with rate_limit.for_caller("user:2"):
+            self.guarded.get_fast_info("AAPL")
+
+        self.assertEqual(self.provider.calls_to("get_fast_info"), ["AAPL", "AAPL"])
+        self.assertFalse(get_breaker().is_open())
+
+    @override_settings(UPSTREAM_RATE_LIMIT_USER=0.001, UPSTREAM_RATE_LIMIT_USER_BURST=1)
+    def test_caller_pays_once_per_symbol_not_per_retry(self):
+        self.guarded.max_retries = 1
+        self.provider.info["AAPL"] = {"longName": "Apple Inc."}
+        self.provider.get_fast_info = Mock(side_effect=[ConnectionError("down"), {"lastPrice": 100}])
+
+        with rate_limit.for_caller("user:1"):
+            self.guarded.get_fast_info("AAPL")
+            self.guarded.get_info("AAPL")
+            with self.assertRaises(rate_limit.RateLimitedError):
+                self.guarded.get_info("MSFT")
+
+        self.assertEqual(self.provider.get_fast_info.call_count, 2)
+
+    @override_settings(
+        UPSTREAM_RATE_LIMIT_GLOBAL=0.001,
+        UPSTREAM_RATE_LIMIT_GLOBAL_BURST=1,
+        UPSTREAM_RATE_LIMIT_USER=0.001,
+        UPSTREAM_RATE_LIMIT_USER_BURST=1,
+    )
+    def test_global_rejection_refunds_the_caller(self):
+        self.guarded.get_fast_info("MSFT")  # drains the global bucket
+
+        with rate_limit.for_caller("user:1"):
+            with self.assertRaises(rate_limit.RateLimitedError):
+                self.guarded.get_fast_info("AAPL")
+
+        self.assertTrue(rate_limit.get_caller_bucket("user:1").take())
+
+    def test_anonymous_callers_are_keyed_on_the_forwarded_address(self):
+        request = RequestFactory().get(
+            "/", HTTP_X_FORWARDED_FOR="10.0.0.9, 203.0.113.7", REMOTE_ADDR="10.0.0.1"
+        )
+
+        self.assertEqual(rate_limit.request_caller(request), "ip:10.0.0.1")
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(rate_limit.request_caller(request), "ip:203.0.113.7")
+
+    @override_settings(UPSTREAM_RATE_LIMIT_GLOBAL=0.001, UPSTREAM_RATE_LIMIT_GLOBAL_BURST=1)
+    def test_limited_caller_gets_last_known_quote(self):
+        quote_cache.store_quotes(
+            {"AAPL": {"price": 100, "market_state": "CLOSED"}},
+            fetched_at=time.time() - 60 * 60 * 6,
+        )
+        self.guarded.get_fast_info("MSFT")  # drains the global bucket
+
+        with rate_limit.for_caller("ip:127.0.0.1"):
+            quotes = get_quotes(["AAPL"])
+
+        self.assertEqual(quotes["AAPL"], {"price": 100, "market_state": "CLOSED", "stale": True})
+        self.assertEqual(quotes.failed, {})
+
+
+class FxRateTests(ProviderTestCase):
+    def test_rates_fetched_in_one_batch_and_reused(self):
+        self.provider.history = _fx_history({"GBPUSD=X": 1.25, "EURUSD=X": 1.1})
+
+        rates = fx.get_fx_rates(["GBP", "EUR", "USD"])
+        again = fx.get_fx_rates(["EUR"])
+
+        self.assertEqual(rates, {"USD": 1.0, "GBP": 1.25, "EUR": 1.1})
+        self.assertEqual(again, {"EUR": 1.1})
+        self.assertEqual(self.provider.calls_to("download"), [["EURUSD=X", "GBPUSD=X"]])
+
+    def test_pence_quote_uses_cached_gbp_rate(self):
+        self.provider.history = _fx_history({"GBPUSD=X": 1.25})
+        for symbol in ("VOD.L", "BARC.L"):
+            self.provider.info[symbol] = {"currency": "GBp", "open": 1}
+            self.provider.fast_info[symbol] = {"last_price": 250, "currency": "GBp"}
+
+        quote = get_quote("VOD.L")
+        get_quote("BARC.L")
+
+        self.assertEqual(quote["price"], 2.5)
+        self.assertEqual(quote["currency"], "GBP")
+        self.assertEqual(quote["fx_rate"], 1.25)
+        # The quote itself is the only per-symbol scrape; FX is one shared download
+        self.assertEqual(len(self.provider.calls_to("download")), 1)
+
+    def test_historical_rate_uses_last_close_on_or_before_date(self):
+        self.provider.history = pd.DataFrame(
+            {("EURUSD=X", "Close"): [1.05, 1.07, 1.2]},
+            index=pd.DatetimeIndex(["2024-04-29", "2024-04-30", "2024-05-02"]),
+        )
+
+        rates = fx.get_fx_rates_on(date(2024, 4, 30), ["EUR"])
+        fx.get_fx_rates_on(date(2024, 4, 30), ["EUR"])
+
+        self.assertEqual(rates, {"EUR": 1.07})
+        self.assertEqual(len(self.provider.calls_to("download")), 1)
+
+
+class RecordReplayProviderTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.live = FakeProvider(
+            info={"AAPL": {"currency": "USD", "currentPrice": 100}},
+            history=_fx_history({"EURUSD=X": 1.1}),
+        )
+        self.recorder = RecordingProvider(self.live, self.directory)
+
+    def test_replay_returns_recorded_responses_offline(self):
+        self.recorder.get_info("AAPL")
+        self.recorder.download(["EURUSD=X"], period="5d")
+
+        replay = ReplayProvider(self.directory)
+
+        self.assertEqual(replay.get_info("AAPL"), {"currency": "USD", "currentPrice": 100})
+        pd.testing.assert_frame_equal(
+            replay.download(["EURUSD=X"], period="5d"), self.live.history
+        )
+        with self.assertRaises(ReplayMissError):
+            replay.download(["EURUSD=X"], period="1mo")
+
+    def test_upstream_errors_are_replayed(self):
+        with self.assertRaises(LookupError):
+            self.recorder.get_splits("NOPE")
+
+        with self.assertRaises(LookupError):
+            ReplayProvider(self.directory).get_splits("NOPE")
+
+    def test_incomplete_provider_fails_when_created(self):
+        class InfoOnlyProvider(MarketDataProvider):
+            def get_info(self, symbol):
+                return {}
+
+        with self.assertRaises(TypeError):
+            InfoOnlyProvider()
+
+    @patch("core.market_data.time.sleep")
+    def test_replay_injects_configured_latency(self, mock_sleep):
+        self.recorder.get_info("AAPL")
+
+        ReplayProvider(self.directory, latency=0.25).get_info("AAPL")
+
+        mock_sleep.assert_called_once_with(0.25)
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class MarketHoursTests(SimpleTestCase):
+    def test_symbols_map_to_their_exchange(self):
+        self.assertEqual(market_hours.exchange_for("AAPL").code, "US")
+        self.assertEqual(market_hours.exchange_for("vod.l").code, "LSE")
+        self.assertEqual(market_hours.exchange_for("7203.T").code, "TSE")
+        self.assertEqual(market_hours.exchange_for("^STOXXE").code, "XETRA")
+
+    def test_holidays_follow_exchange_rules(self):
+        self.assertFalse(market_hours.is_trading_day("AAPL", date(2025, 7, 4)))
+        self.assertFalse(market_hours.is_trading_day("AAPL", date(2025, 11, 27)))
+        self.assertTrue(market_hours.is_trading_day("VOD.L", date(2025, 11, 27)))
+        self.assertFalse(market_hours.is_trading_day("VOD.L", date(2025, 8, 25)))
+        self.assertFalse(market_hours.is_trading_day("SAP.DE", date(2025, 12, 24)))
+
+    def test_lunch_break_counts_as_closed(self):
+        self.assertTrue(market_hours.is_open("7203.T", _utc(2025, 3, 3, 1, 0)))
+        self.assertFalse(market_hours.is_open("7203.T", _utc(2025, 3, 3, 3, 0)))
+        self.assertTrue(market_hours.is_open("7203.T", _utc(2025, 3, 3, 4, 0)))
+
+    def test_prices_unchanged_over_a_holiday_weekend(self):
+        friday_close = _utc(2025, 7, 3, 21, 0)
+
+        self.assertFalse(
+            market_hours.prices_changed_since("AAPL", friday_close, _utc(2025, 7, 7, 13, 0))
+        )
+        self.assertTrue(
+            market_hours.prices_changed_since("AAPL", friday_close, _utc(2025, 7, 7, 14, 0))
+        )
+        self.assertEqual(
+            market_hours.next_open("AAPL", friday_close), _utc(2025, 7, 7, 13, 30)
+        )
+
+    def test_unmapped_exchanges_are_unknown(self):
+        self.assertEqual(market_hours.exchange_for("^GSPC").code, "US")
+        self.assertEqual(market_hours.exchange_for("BRK-B").code, "US")
+        for symbol in ("MC.PA", "SHOP.TO", "0700.HK", "^990100-USD-STRD", "GBPUSD=X"):
+            self.assertIsNone(market_hours.exchange_for(symbol))
+
+        at = _utc(2025, 7, 7, 14, 0)
+        self.assertIsNone(market_hours.is_open("MC.PA", at))
+        self.assertIsNone(market_hours.market_state("MC.PA", at))
+        self.assertIsNone(market_hours.seconds_until_change("MC.PA", at))
+        self.assertTrue(market_hours.prices_changed_since("MC.PA", _utc(2025, 7, 5, 12, 0), at))
+
+    def test_half_days_close_early(self):
+        # Day after Thanksgiving: NYSE closes at 13:00 New York time
+        self.assertTrue(market_hours.is_open("AAPL", _utc(2025, 11, 28, 17, 30)))
+        self.assertFalse(market_hours.is_open("AAPL", _utc(2025, 11, 28, 18, 30)))
+        self.assertFalse(market_hours.is_open("AAPL", _utc(2025, 7, 3, 18, 30)))
+        # London closes at 12:30 on Christmas Eve
+        self.assertTrue(market_hours.is_open("VOD.L", _utc(2025, 12, 24, 12, 0)))
+        self.assertFalse(market_hours.is_open("VOD.L", _utc(2025, 12, 24, 13, 0)))
+        self.assertEqual(
+            market_hours.current_session("AAPL", _utc(2025, 11, 28, 20, 0)),
+            (_utc(2025, 11, 28, 14, 30), _utc(2025, 11, 28, 18, 0)),
+        )
+
+    def test_light_quote_ttl_follows_the_local_calendar(self):
+        with patch("core.market_hours.timezone.now", return_value=_utc(2025, 7, 5, 12, 0)):
+            ttl = quote_cache.quote_ttl("AAPL", {"price": 100})
+
+        self.assertEqual(ttl, quote_cache.quote_ttl("AAPL", {"market_state": "CLOSED"}))
+
+
+class HttpSessionTests(SimpleTestCase):
+    def setUp(self):
+        http_session.reset_stats()
+        self.addCleanup(http_session.reset_stats)
+
+    def _response(self, connects, connect_time=0.0, appconnect_time=0.0):
+        return Mock(
+            infos={
+                http_session.CurlInfo.NUM_CONNECTS: connects,
+                http_session.CurlInfo.CONNECT_TIME: connect_time,
+                http_session.CurlInfo.APPCONNECT_TIME: appconnect_time,
+            }
+        )
+
+    def test_handles_are_reused_across_threads(self):
+        session = http_session.PooledSession()
+        seen = []
+
+        def fake_request(self, *args, **kwargs):
+            seen.append(self.curl)
+            return Mock(infos={})
+
+        with patch.object(http_session.curl_requests.Session, "request", fake_request):
+            session.get("https://example.com")
+            thread = threading.Thread(target=session.get, args=("https://example.com",))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(seen), 2)
+        self.assertIs(seen[0], seen[1])
+
+    def test_stats_count_reuse_and_handshake_time(self):
+        http_session._record(self._response(1, connect_time=0.02, appconnect_time=0.07))
+        http_session._record(self._response(0))
+        http_session._record(self._response(0))
+
+        stats = http_session.get_stats()
+
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["reused"], 2)
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["avg_handshake_ms"], 50)
+
+    def test_session_is_rebuilt_after_fork(self):
+        first = http_session.get_session()
+        self.assertIs(http_session.get_session(), first)
+
+        with patch("core.http_session.os.getpid", return_value=-1):
+            self.assertIsNot(http_session.get_session(), first)
+
+
+class PriceHistoryTests(ProviderTestCase):
+    def _closes(self, closes):
+        self.provider.history = pd.DataFrame(
+            {("AAPL", "Close"): list(closes.values())},
+            index=pd.DatetimeIndex(list(closes)),
+        )
+
+    def test_only_missing_days_are_downloaded(self):
+        self._closes({"2024-04-29": 100.0, "2024-04-30": 101.0})
+        first = price_history.get_closes(["AAPL"], date(2024, 4, 29), date(2024, 4, 30))
+
+        self._closes({"2024-05-01": 102.0, "2024-05-02": 103.0})
+        second = price_history.get_closes(["AAPL"], date(2024, 4, 29), date(2024, 5, 2))
+        price_history.get_closes(["AAPL"], date(2024, 4, 30), date(2024, 5, 1))
+
+        self.assertEqual(first["AAPL"].tolist(), [100.0, 101.0])
+        self.assertEqual(second["AAPL"].tolist(), [100.0, 101.0, 102.0, 103.0])
+        self.assertEqual(second["AAPL"].index[-1], date(2024, 5, 2))
+        self.assertEqual(len(self.provider.calls_to("download")), 2)
+
+    def test_earlier_days_are_filled_in_place(self):
+        self._closes({"2024-05-01": 102.0})
+        price_history.get_closes(["AAPL"], date(2024, 5, 1), date(2024, 5, 1))
+
+        self._closes({"2024-04-26": 99.0})
+        closes = price_history.get_closes(["AAPL"], date(2024, 4, 26), date(2024, 5, 1))
+
+        self.assertEqual(closes["AAPL"].tolist(), [99.0, 102.0])
+
+    def test_unfinished_session_is_not_stored(self):
+        with patch("core.price_history.timezone.now", return_value=_utc(2024, 5, 1, 15, 0)):
+            self.assertEqual(price_history.final_day("AAPL"), date(2024, 4, 30))
+            self._closes({"2024-04-30": 101.0, "2024-05-01": 150.0})
+            closes = price_history.get_closes(["AAPL"], date(2024, 4, 30), date(2024, 5, 1))
+
+        self.assertEqual(closes["AAPL"].tolist(), [101.0])
+
+
+class IntradayBarTests(ProviderTestCase):
+    # A Wednesday, 11:00 in New York
+    now = datetime(2024, 5, 1, 15, 0, tzinfo=dt_timezone.utc)
+
+    def _bars(self, start, closes):
+        index = pd.date_range(start, periods=len(closes), freq="min", tz="UTC")
+        return pd.DataFrame({("AAPL", "Close"): closes}, index=index)
+
+    def test_bars_are_shared_and_extended_incrementally(self):
+        self.provider.download = Mock(return_value=self._bars("2024-05-01 13:30", [1.0, 2.0, 3.0]))
+        first = intraday.get_bars(["AAPL"], now=self.now)
+        intraday.get_bars(["aapl"], now=self.now + timedelta(seconds=30))
+
+        self.provider.download.return_value = self._bars("2024-05-01 13:32", [3.5, 4.0])
+        later = intraday.get_bars(["AAPL"], now=self.now + timedelta(minutes=2))
+
+        self.assertEqual(first["AAPL"].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(later["AAPL"].tolist(), [1.0, 2.0, 3.5, 4.0])
+        self.assertEqual(self.provider.download.call_count, 2)
+        self.assertEqual(
+            self.provider.download.call_args.kwargs["start"],
+            datetime(2024, 5, 1, 13, 32, tzinfo=dt_timezone.utc),
+        )
+
+    def test_closed_market_is_not_refetched(self):
+        self.provider.download = Mock(return_value=self._bars("2024-05-01 19:58", [1.0, 2.0]))
+        after_close = datetime(2024, 5, 1, 21, 0, tzinfo=dt_timezone.utc)
+        intraday.get_bars(["AAPL"], now=after_close)
+
+        bars = intraday.get_bars(["AAPL"], now=after_close + timedelta(hours=2))
+
+        self.assertEqual(bars["AAPL"].tolist(), [1.0, 2.0])
+        self.provider.download.assert_called_once()
+
+
+class LiveQuoteHubTests(SimpleTestCase):
+    def test_one_refresh_fans_out_to_every_viewer(self):
+        fetch = Mock(return_value={"AAPL": {"price": 100}})
+        hub = live_quotes.Hub(fetch=fetch, interval=3600)
+        first = hub.subscribe(["aapl"])
+        second = hub.subscribe(["AAPL"])
+
+        self.assertEqual(first.wait(5), {"AAPL": {"price": 100}})
+        self.assertEqual(second.wait(5), {"AAPL": {"price": 100}})
+        self.assertIsNone(first.wait(0.05))  # nothing new yet
+        fetch.assert_called_once_with(["AAPL"])
+
+        fetch.return_value = {"AAPL": {"price": 101}}
+        hub.refresh()
+        self.assertEqual(second.wait(5), {"AAPL": {"price": 101}})
+
+        first.close()
+        second.close()
+        hub.refresh()
+        self.assertEqual(fetch.call_count, 2)
+
+
+class IterQuotesTests(ProviderTestCase):
+    def test_ready_quotes_stream_first_and_fx_is_shared(self):
+        self.provider.history = _fx_history({"GBPUSD=X": 1.25})
+        for symbol in ("VOD.L", "BARC.L"):
+            Instrument.objects.create(symbol=symbol, currency="GBp", refreshed_at=timezone.now())
+            self.provider.info[symbol] = {"currency": "GBp", "open": 1}
+            self.provider.fast_info[symbol] = {"last_price": 250, "currency": "GBp"}
+        quote_cache.store_quotes({"AAPL": {"price": 100, "market_state": "REGULAR"}})
+        symbol_registry.mark_invalid({"NOPE": "No listing"})
+        get_info = self.provider.get_info
+        self.provider.get_info = lambda symbol: time.sleep(0.2) or get_info(symbol)
+
+        streamed = list(iter_quotes(["VOD.L", "NOPE", "AAPL", "BARC.L"]))
+
+        order = [symbol for symbol, _ in streamed]
+        results = dict(streamed)
+        self.assertEqual(order[:2], ["NOPE", "AAPL"])
+        self.assertIn("NOPE", results["NOPE"].invalid)
+        self.assertEqual(results["VOD.L"]["VOD.L"]["fx_rate"], 1.25)
+        self.assertEqual(results["BARC.L"]["BARC.L"]["price"], 2.5)
+        self.assertEqual(len(self.provider.calls_to("download")), 1)
+
+
+class SymbolIndexTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = f"{tmp.name}/listings.csv"
+        symbol_index.write_listings(
+            self.path,
+            {
+                "AAPL": ("Apple Inc.", "Nasdaq"),
+                "AAP": ("Advance Auto Parts Inc.", "NYSE"),
+                "APLE": ("Apple Hospitality REIT Inc.", "NYSE"),
+                "MSFT": ("Microsoft Corporation", "Nasdaq"),
+            },
+        )
+        overrides = override_settings(SYMBOL_LISTINGS_FILE=self.path)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        symbol_index.clear()
+        self.addCleanup(symbol_index.clear)
+
+    def _symbols(self, query):
+        return [result["symbol"] for result in symbol_index.search(query)]
+
+    def test_symbol_prefixes_rank_before_name_matches(self):
+        self.assertEqual(self._symbols("aap"), ["AAP", "AAPL"])
+        self.assertEqual(self._symbols("apple"), ["AAPL", "APLE"])
+        self.assertEqual(self._symbols("apple hosp"), ["APLE"])
+        self.assertEqual(symbol_index.search("micro")[0]["name"], "Microsoft Corporation")
+
+    def test_traded_and_stored_symbols_are_indexed(self):
+        user = User.objects.create_user("idx", password="pass")
+        portfolio = Portfolio.objects.create(user=user, name="Idx", substack_url="https://idx.substack.com")
+        Order.objects.create(
+            portfolio=portfolio, symbol="VOD.L", side="BUY", quantity=1, price_executed=1, currency="GBP"
+        )
+        Instrument.objects.create(
+            symbol="VOD.L", currency="GBp", long_name="Vodafone Group Plc", refreshed_at=timezone.now()
+        )
+
+        self.assertEqual(self._symbols("vodafone"), ["VOD.L"])
+
+        symbol_index.add("SAP.DE", "SAP SE")
+        self.assertEqual(self._symbols("sap"), ["SAP.DE"])
+
+    def test_watched_symbols_are_searchable_without_counting_as_traded(self):
+        before = symbol_index.get_index()
+
+        symbol_index.add("NVDA", "NVIDIA Corporation", traded=False)
+        self.assertEqual(self._symbols("nvidia"), ["NVDA"])
+        self.assertNotIn("NVDA", symbol_index.get_index().traded)
+
+        symbol_index.add("MSFT")
+        self.assertIn("MSFT", symbol_index.get_index().traded)
+        # Earlier snapshots are never changed in place
+        self.assertNotIn("MSFT", before.traded)
+        self.assertNotIn("NVDA", before.listings)
+
+    def test_index_rebuilt_when_listings_file_changes(self):
+        self.assertEqual(self._symbols("nvda"), [])
+
+        listings = symbol_index.read_listings(self.path)
+        listings["NVDA"] = ("NVIDIA Corporation", "Nasdaq")
+        symbol_index.write_listings(self.path, listings)
+        os.utime(self.path, (time.time() + 5, time.time() + 5))
+
+        self.assertEqual(self._symbols("nvda"), ["NVDA"])
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Each gunicorn worker imports this module, so warm its upstream session now
+if settings.MARKET_DATA_WARM_SESSION:
+    from core.http_session import warm_in_background
+
+    warm_in_background()
@@ -1,4 +1,53 @@
-import yfinance as yf
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from . import fx, instruments, quote_cache, rate_limit, symbol_registry
+from .circuit_breaker import get_breaker
+from .market_data import get_provider
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_SYMBOL_TIMEOUT = 10
+DEFAULT_FETCH_DEADLINE = 60
+
+
+class InvalidSymbolError(LookupError):
+    """Raised when Yahoo has no listing for a symbol."""
+
+
+class QuoteResults(dict):
+    """``{symbol: quote}`` plus a report of the symbols that could not be priced.
+
+    ``failed`` maps symbol -> error message; ``timed_out`` lists symbols whose
+    fetch exceeded the per-symbol timeout or was still pending at the overall
+    deadline; ``invalid`` maps symbol -> reason for tickers Yahoo does not know.
+    ``fetched_at`` maps symbol -> when (epoch seconds) a quote served from the
+    quote cache was fetched upstream.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed = {}
+        self.timed_out = []
+        self.invalid = {}
+        self.fetched_at = {}
+
+    def absorb(self, other):
+        """Merge the failure report (and fetch times) of another ``QuoteResults``."""
+
+        self.failed.update(getattr(other, "failed", {}))
+        self.invalid.update(getattr(other, "invalid", {}))
+        self.fetched_at.update(getattr(other, "fetched_at", {}))
+        for symbol in getattr(other, "timed_out", []):
+            if symbol not in self.timed_out:
+                self.timed_out.append(symbol)
+
 
 def _safe_get(container, key):
     """Fetch a value from a mapping-like or attribute-bearing object."""
@@ -38,23 +87,40 @@ def _choose_price(info, fast_info):
     return intraday_price
 
 
+def _currencies(info, fast_info, symbol=None):
+    """Return (native_currency, fx_currency); GBp-quoted tickers settle in GBP.
+
+    A known ``Instrument`` currency for ``symbol`` wins over the upstream data.
+    """
+
+    instrument = instruments.cached_instrument(symbol) if symbol else None
+    currency = (
+        (instrument.currency if instrument is not None else None)
+        or _safe_get(fast_info, "currency")
+        or info.get("currency")
+    )
+    fx_currency = "GBP" if currency == "GBp" else currency
+    return currency, fx_currency
+
+
 def _quote_from_info(symbol, info, fx_rate_cache=None, fast_info=None):
     fx_rate_cache = fx_rate_cache if fx_rate_cache is not None else {}
 
-    currency = _safe_get(fast_info, "currency") or info.get("currency")
+    currency, fx_currency = _currencies(info, fast_info, symbol)
     price = _choose_price(info, fast_info)
+    if price is None and currency is None:
+        raise InvalidSymbolError(f"No listing found for {symbol}")
 
     # UK tickers report in pence (GBp); convert to pounds for display and FX
-    fx_currency = currency
-    if currency == "GBp":
-        fx_currency = "GBP"
-        if price is not None:
-            price = price / 100
+    if currency == "GBp" and price is not None:
+        price = price / 100
 
     if fx_currency and fx_currency != "USD":
         if fx_currency not in fx_rate_cache:
-            fx_rate_cache[fx_currency] = yf.Ticker(f"{fx_currency}USD=X").fast_info["last_price"]
-        fx_rate = fx_rate_cache[fx_currency]
+            fx_rate_cache.update(fx.get_fx_rates([fx_currency]))
+        fx_rate = fx_rate_cache.get(fx_currency)
+        if fx_rate is None:
+            raise LookupError(f"No FX rate available for {fx_currency}")
     elif fx_currency == "USD":
         fx_rate = 1.0
     else:
@@ -73,45 +139,338 @@ def _quote_from_info(symbol, info, fx_rate_cache=None, fast_info=None):
         "market_state": info.get("marketState", None) or _safe_get(fast_info, "market_state"),
         "shortName": info.get("shortName"),
         "longName": info.get("longName"),
+        "exchange": info.get("exchange") or _safe_get(fast_info, "exchange"),
         "symbol": info.get("symbol") or symbol,
     }
 
 
-def get_quote(symbol):
+def _light_quote(symbol, fast_info, fx_rate_cache):
+    """Build a price/currency/FX-only quote from ``fast_info`` alone."""
+
+    currency, fx_currency = _currencies({}, fast_info, symbol)
+    price = _safe_get(fast_info, "last_price")
+    if price is None:
+        price = _safe_get(fast_info, "regular_market_previous_close")
+    if price is None and currency is None:
+        raise InvalidSymbolError(f"No listing found for {symbol}")
+    if price is None:
+        raise LookupError(f"No price available for {symbol}")
+    if currency == "GBp":
+        price = price / 100
+
+    fx_rate = 1.0 if fx_currency == "USD" else fx_rate_cache.get(fx_currency)
+    if fx_rate is None:
+        raise LookupError(f"No FX rate available for {fx_currency}")
+
+    return {
+        "price": price,
+        "currency": fx_currency,
+        "native_currency": currency,
+        "fx_rate": fx_rate,
+        "symbol": symbol,
+        "light": True,
+    }
+
+
+def _load_concurrently(symbols, load, report):
+    """Run ``load(symbol)`` for each symbol on a bounded thread pool.
+
+    Returns ``{symbol: result}`` for the loads that finished in time and records
+    the rest on ``report``. Slow upstream calls cannot be interrupted, so they
+    are abandoned on their worker thread instead of being waited for.
+    """
+
+    workers = getattr(settings, "QUOTE_FETCH_WORKERS", DEFAULT_FETCH_WORKERS)
+    symbol_timeout = getattr(settings, "QUOTE_FETCH_SYMBOL_TIMEOUT", DEFAULT_SYMBOL_TIMEOUT)
+    deadline = time.monotonic() + getattr(
+        settings, "QUOTE_FETCH_DEADLINE", DEFAULT_FETCH_DEADLINE
+    )
+
+    started = {}
+    started_lock = threading.Lock()
+
+    def run(symbol):
+        with started_lock:
+            started[symbol] = time.monotonic()
+        return load(symbol)
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(symbols))), thread_name_prefix="quote-fetch"
+    )
+    # Each task gets a copy of the caller's context so it spends the same
+    # request retry budget
+    pending = {
+        executor.submit(contextvars.copy_context().run, run, symbol): symbol
+        for symbol in symbols
+    }
+    loaded = {}
+    try:
+        while pending:
+            now = time.monotonic()
+            with started_lock:
+                expiries = {
+                    future: started[symbol] + symbol_timeout
+                    for future, symbol in pending.items()
+                    if symbol in started
+                }
+            for future, expires in expiries.items():
+                if expires <= now and not future.done():
+                    report.timed_out.append(pending.pop(future))
+            if now >= deadline:
+                break
+
+            wake = min([deadline, *expiries.values()])
+            done, _ = wait(
+                list(pending), timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                symbol = pending.pop(future)
+                try:
+                    loaded[symbol] = future.result()
+                except Exception as exc:
+                    report.failed[symbol] = str(exc) or exc.__class__.__name__
+    finally:
+        for future, symbol in pending.items():
+            future.cancel()
+            report.timed_out.append(symbol)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return loaded
+
+
+def _log_report(quotes):
+    if quotes.failed or quotes.timed_out or quotes.invalid:
+        logger.warning(
+            "Quote fetch incomplete: %d failed %s, %d timed out %s, %d invalid %s",
+            len(quotes.failed),
+            sorted(quotes.failed),
+            len(quotes.timed_out),
+            quotes.timed_out,
+            len(quotes.invalid),
+            sorted(quotes.invalid),
+        )
+
+
+def _fetch_quotes(symbols):
+    provider = get_provider()
+    quotes = QuoteResults()
+
+    loaded = _load_concurrently(
+        symbols,
+        lambda symbol: (provider.get_info(symbol), provider.get_fast_info(symbol)),
+        quotes,
+    )
+
+    # One batched FX download covers every currency in the batch
+    fx_rate_cache = fx.get_fx_rates(
+        {
+            _currencies(info, fast_info, symbol)[1]
+            for symbol, (info, fast_info) in loaded.items()
+        }
+    )
+
+    for symbol in symbols:
+        if symbol not in loaded:
+            continue
+        info, fast_info = loaded[symbol]
+        try:
+            quotes[symbol] = _quote_from_info(symbol, info, fx_rate_cache, fast_info=fast_info)
+        except InvalidSymbolError as exc:
+            quotes.invalid[symbol] = str(exc)
+        except Exception as exc:
+            quotes.failed[symbol] = str(exc) or exc.__class__.__name__
+
+    _log_report(quotes)
+    return quotes
+
+
+def _fetch_light_quotes(symbols):
+    """Like ``_fetch_quotes`` but from ``fast_info`` only, never ``.info``."""
+
+    provider = get_provider()
+    quotes = QuoteResults()
+
+    loaded = _load_concurrently(symbols, provider.get_fast_info, quotes)
+    fx_rate_cache = fx.get_fx_rates(
+        {_currencies({}, fast_info, symbol)[1] for symbol, fast_info in loaded.items()}
+    )
+
+    for symbol in symbols:
+        if symbol not in loaded:
+            continue
+        try:
+            quotes[symbol] = _light_quote(symbol, loaded[symbol], fx_rate_cache)
+        except InvalidSymbolError as exc:
+            quotes.invalid[symbol] = str(exc)
+        except Exception as exc:
+            quotes.failed[symbol] = str(exc) or exc.__class__.__name__
+
+    _log_report(quotes)
+    return quotes
+
+
+def get_quote(symbol, allow_stale=True, light=False):
     """
     Returns a dict: { "bid": <Decimal or float>, "ask": <Decimal or float> }
+
+    Served from the shared quote cache when possible. Pass
+    ``allow_stale=False`` where an expired quote is not acceptable (e.g. order
+    execution); the quote is then re-fetched instead of revalidated later.
+    Pass ``light=True`` when only price, currency and FX are needed; the quote
+    is then built from ``fast_info`` without the full ``.info`` scrape.
     """
-    ticker = yf.Ticker(symbol)
-    info = ticker.info
-    fast_info = getattr(ticker, "fast_info", None)
+    quotes = get_quotes([symbol], allow_stale=allow_stale, light=light)
+    if symbol in quotes.invalid:
+        raise InvalidSymbolError(quotes.invalid[symbol])
+    if symbol not in quotes:
+        raise LookupError(quotes.failed.get(symbol) or f"No quote for {symbol}")
+    return quotes[symbol]
 
-    return _quote_from_info(symbol, info, fast_info=fast_info)
 
+def get_quotes(symbols, allow_stale=True, light=False):
+    """Fetch quotes for multiple symbols, going upstream only for cache misses.
 
-def get_quotes(symbols):
-    """Fetch quotes for multiple symbols in a single batch call when possible."""
+    Misses are fetched concurrently (see ``_load_concurrently``). The returned
+    ``QuoteResults`` reports symbols that failed or timed out instead of
+    silently dropping them. ``light`` selects price/currency/FX-only quotes.
+    Symbols the registry already knows to be invalid are reported in
+    ``invalid`` without going upstream. While the upstream circuit breaker is
+    open, or the caller has hit an upstream rate limit, unpriced symbols get
+    their last known quote with ``stale`` set.
+    """
 
     unique_symbols = [s for s in dict.fromkeys(symbols)]  # dedupe while preserving order
+    results = QuoteResults()
+    if not unique_symbols:
+        return results
+
+    known_invalid = symbol_registry.invalid_symbols(unique_symbols)
+    results.invalid.update(known_invalid)
+    unique_symbols = [s for s in unique_symbols if s not in known_invalid]
     if not unique_symbols:
-        return {}
+        return results
+
+    cached = _cached_quotes(unique_symbols, allow_stale, light)
+    results.update(cached)
+    results.absorb(cached)
+    _settle(results, unique_symbols, known_invalid, light)
+    return results
+
 
-    fx_rate_cache = {}
-    tickers = yf.Tickers(" ".join(unique_symbols))
-    quotes = {}
+def _cached_quotes(symbols, allow_stale, light):
+    """``QuoteResults`` for ``symbols`` from the quote cache, fetching misses."""
+
+    results = QuoteResults()
+    fetch_quotes = _fetch_light_quotes if light else _fetch_quotes
+
+    def fetch(missing):
+        fetched = fetch_quotes(missing)
+        results.absorb(fetched)
+        return fetched
+
+    results.update(
+        quote_cache.get_cached_quotes(
+            symbols, fetch, allow_stale=allow_stale, light=light, fetched_at=results.fetched_at
+        )
+    )
+    return results
+
+
+def _settle(results, unique_symbols, known_invalid, light):
+    """Report unpriced symbols, apply the breaker fallback and update the registry.
+
+    Runs on the calling thread because it writes to the database.
+    """
 
     for symbol in unique_symbols:
-        try:
-            ticker_obj = tickers.tickers.get(symbol)
-            if ticker_obj is None:
-                continue
-            quotes[symbol] = _quote_from_info(
-                symbol,
-                ticker_obj.info,
-                fx_rate_cache,
-                fast_info=getattr(ticker_obj, "fast_info", None),
+        # e.g. a coalesced fetch led by another request that came back empty
+        if (
+            symbol not in results
+            and symbol not in results.timed_out
+            and symbol not in results.invalid
+        ):
+            results.failed.setdefault(symbol, f"No quote for {symbol}")
+
+    if get_breaker().is_open() or rate_limit.was_limited():
+        # Upstream is down or over its rate limit: fall back to the last known
+        # quotes, flagged stale
+        unpriced = [
+            s for s in unique_symbols if s not in results and s not in results.invalid
+        ]
+        for symbol, quote in quote_cache.get_last_known(unpriced, light=light).items():
+            results[symbol] = {**quote, "stale": True}
+            results.failed.pop(symbol, None)
+            if symbol in results.timed_out:
+                results.timed_out.remove(symbol)
+
+    recorded = symbol_registry.mark_invalid(
+        {s: reason for s, reason in results.invalid.items() if s not in known_invalid}
+    )
+    for symbol in [s for s in results.invalid if s not in known_invalid and s not in recorded]:
+        # Known good until now: report an ordinary failure, not a bad ticker
+        results.failed[symbol] = results.invalid.pop(symbol)
+    symbol_registry.mark_valid([s for s in unique_symbols if s in results])
+    instruments.remember_quotes(results)
+
+
+def iter_quotes(symbols, allow_stale=True):
+    """Yield ``(symbol, QuoteResults)`` for each symbol as soon as it is priced.
+
+    Cached symbols come out first and a slow upstream symbol holds up only
+    itself. FX for every currency already known from the ``Instrument`` table
+    is fetched up front in one batch, so per-symbol fetches reuse it. Symbols
+    still pending at ``QUOTE_FETCH_DEADLINE`` are yielded as timed out.
+    """
+
+    unique_symbols = list(dict.fromkeys(symbols))
+    known_invalid = symbol_registry.invalid_symbols(unique_symbols)
+    for symbol in unique_symbols:
+        if symbol in known_invalid:
+            results = QuoteResults()
+            results.invalid[symbol] = known_invalid[symbol]
+            yield symbol, results
+    pending_symbols = [s for s in unique_symbols if s not in known_invalid]
+    if not pending_symbols:
+        return
+
+    known = instruments.get_instruments(pending_symbols, lookup=False)
+    fx.get_fx_rates({instrument.settlement_currency for instrument in known.values()})
+
+    workers = getattr(settings, "QUOTE_FETCH_WORKERS", DEFAULT_FETCH_WORKERS)
+    deadline = time.monotonic() + getattr(
+        settings, "QUOTE_FETCH_DEADLINE", DEFAULT_FETCH_DEADLINE
+    )
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(pending_symbols))), thread_name_prefix="quote-stream"
+    )
+    pending = {
+        executor.submit(
+            contextvars.copy_context().run, _cached_quotes, [symbol], allow_stale, False
+        ): symbol
+        for symbol in pending_symbols
+    }
+    try:
+        while pending:
+            done, _ = wait(
+                list(pending),
+                timeout=max(0.0, deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED,
             )
-        except Exception:
-            # Skip symbols that fail to fetch; they can be retried individually
-            continue
+            if not done:
+                break
+            for future in done:
+                symbol = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as exc:
+                    results = QuoteResults()
+                    results.failed[symbol] = str(exc) or exc.__class__.__name__
+                _settle(results, [symbol], {}, False)
+                yield symbol, results
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    return quotes
+    for symbol in pending.values():
+        results = QuoteResults()
+        results.timed_out.append(symbol)
+        yield symbol, results
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Portfolio, Order
+from .models import Instrument, Portfolio, Order, SymbolStatus, Watchlist
 
 @admin.register(Portfolio)
 class PortfolioAdmin(admin.ModelAdmin):
@@ -13,3 +13,23 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "portfolio", "symbol", "side", "quantity", "price_executed", "executed_at")
     list_filter = ("symbol", "side")
     search_fields = ("portfolio__name", "symbol")
+
+
+@admin.register(SymbolStatus)
+class SymbolStatusAdmin(admin.ModelAdmin):
+    list_display = ("symbol", "is_valid", "reason", "checked_at", "expires_at")
+    list_filter = ("is_valid",)
+    search_fields = ("symbol",)
+
+
+@admin.register(Instrument)
+class InstrumentAdmin(admin.ModelAdmin):
+    list_display = ("symbol", "currency", "short_name", "exchange", "quote_type", "refreshed_at")
+    list_filter = ("currency", "exchange")
+    search_fields = ("symbol", "short_name", "long_name")
+
+
+@admin.register(Watchlist)
+class WatchlistAdmin(admin.ModelAdmin):
+    list_display = ("user", "symbols", "updated_at")
+    search_fields = ("user__username",)
@@ -1,15 +1,56 @@
 from datetime import timedelta
-import yfinance as yf
+
+from core import price_history
+from core.circuit_breaker import CircuitOpenError
+from core.fx import get_fx_rates_on
+from core.instruments import get_currencies
+from core.market_data import get_provider
+from core.quote_cache import get_cache
 
 from .constants import BENCHMARK_CHOICES
 
+LAST_CLOSE_KEY = "benchmark-close:{ticker}"
+LAST_CLOSE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def _last_known_close(ticker, date):
+    """Return the cached (close, currency) for ``ticker`` if it is not after ``date``."""
+
+    entry = get_cache().get(LAST_CLOSE_KEY.format(ticker=ticker))
+    if entry is None or entry["date"] > date.isoformat():
+        return None
+    return entry["close"], entry["currency"]
+
+
 def get_benchmark_prices_usd(date):
-    """Return mapping of benchmark ticker -> USD price for given date."""
-    prices = {}
-    for ticker, _ in BENCHMARK_CHOICES:
+    """Return mapping of benchmark ticker -> USD price for given date.
+
+    Final closes come from the local price-history store; only a day still
+    trading goes upstream.
+    """
+    provider = get_provider()
+    cache = get_cache()
+    closes = {}
+    currencies = {}
+    tickers = [ticker for ticker, _ in BENCHMARK_CHOICES]
+    # Benchmark currencies come from the Instrument table, not a per-ticker
+    # lookup. A ticker whose currency is unknown cannot be converted to USD.
+    known_currencies = get_currencies(tickers, provider=provider, default=None)
+    tickers = [ticker for ticker in tickers if known_currencies[ticker]]
+    stored = price_history.get_closes(
+        [ticker for ticker in tickers if date <= price_history.final_day(ticker)],
+        date - timedelta(days=7),
+        date,
+        provider=provider,
+    )
+    for ticker in tickers:
+        if ticker in stored:
+            closes[ticker] = float(stored[ticker].iloc[-1])
+            currencies[ticker] = known_currencies[ticker]
+            continue
         try:
-            tkr = yf.Ticker(ticker)
-            hist = tkr.history(
+            hist = provider.get_history(
+                ticker,
                 start=(date - timedelta(days=7)).isoformat(),
                 end=(date + timedelta(days=1)).isoformat(),
                 interval="1d",
@@ -17,20 +58,34 @@ def get_benchmark_prices_usd(date):
             hist = hist[hist.index.date <= date]
             if hist.empty:
                 continue
-            last_close = float(hist["Close"].iloc[-1])
-            currency = tkr.fast_info.get("currency", "USD")
-            if currency not in ("USD", None):
-                fx_tkr = yf.Ticker(f"{currency}USD=X")
-                fx_hist = fx_tkr.history(
-                    start=(date - timedelta(days=7)).isoformat(),
-                    end=(date + timedelta(days=1)).isoformat(),
-                    interval="1d",
-                )
-                fx_hist = fx_hist[fx_hist.index.date <= date]
-                fx_rate = float(fx_hist["Close"].iloc[-1]) if not fx_hist.empty else 1.0
-            else:
-                fx_rate = 1.0
-            prices[ticker] = last_close * fx_rate
+            closes[ticker] = float(hist["Close"].iloc[-1])
+            currencies[ticker] = known_currencies[ticker]
+            cache.set(
+                LAST_CLOSE_KEY.format(ticker=ticker),
+                {
+                    "date": hist.index[-1].date().isoformat(),
+                    "close": closes[ticker],
+                    "currency": currencies[ticker],
+                },
+                timeout=LAST_CLOSE_TIMEOUT,
+            )
+        except CircuitOpenError:
+            # Upstream is down; reuse the last close we saw, if any
+            last_known = _last_known_close(ticker, date)
+            if last_known is not None:
+                closes[ticker], currencies[ticker] = last_known
         except Exception:
             continue
+
+    # One batched FX download for every non-USD benchmark currency
+    fx_rates = get_fx_rates_on(date, {c for c in currencies.values() if c != "USD"})
+
+    prices = {}
+    for ticker, last_close in closes.items():
+        currency = currencies[ticker]
+        fx_rate = 1.0 if currency == "USD" else fx_rates.get(currency)
+        if fx_rate is None:
+            # Saving a local-currency close as USD would corrupt the history
+            continue
+        prices[ticker] = last_close * fx_rate
     return prices
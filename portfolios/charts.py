@@ -0,0 +1,147 @@
+"""Value-history data derived from a portfolio's snapshots.
+
+The detail page fetches its chart after first paint instead of embedding
+it. The payload is one shared date axis plus a float array per series
+(``null`` where a snapshot has no price), built from a single scan of the
+snapshot rows that reads only the columns it needs.
+
+Snapshots only change when ``take_snapshots`` or a backfill runs, so
+everything serialised here is cached in the default cache under the
+portfolio's snapshot version (see ``snapshot_version``). A new, deleted
+or rewritten snapshot changes the version, which retires the old entries
+without any explicit invalidation; repeat requests for unchanged history
+cost one aggregate query.
+"""
+import gzip
+import hashlib
+import json
+
+import numpy as np
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.db.models.fields.json import KeyTransform
+
+from .constants import BENCHMARK_CHOICES
+
+PAYLOAD_KEY = "portfolio-chart:{etag}"
+HISTORY_KEY = "portfolio-history:{version}"
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+# Benchmarks are shown as the value of this many dollars invested at the start
+REBASE_TO = 100_000
+
+
+def snapshot_series(portfolio, tickers):
+    """Return (dates, total values, {ticker: prices}) in one pass over snapshots.
+
+    Only the timestamp, total and the requested tickers' benchmark prices
+    are read; a snapshot missing a ticker's price contributes ``None``.
+    """
+
+    rows = portfolio.snapshots.order_by("timestamp").values_list(
+        "timestamp",
+        "total_value",
+        *(KeyTransform(ticker, "benchmark_values") for ticker in tickers),
+    )
+    dates, values = [], []
+    prices = {ticker: [] for ticker in tickers}
+    for timestamp, total, *benchmark_prices in rows:
+        dates.append(timestamp.date().isoformat())
+        values.append(total)
+        for ticker, price in zip(tickers, benchmark_prices):
+            prices[ticker].append(price)
+    return dates, values, prices
+
+
+def rebase(prices):
+    """Rebase a benchmark's prices to ``REBASE_TO`` at its first known price.
+
+    Returns floats aligned with ``prices``, ``None`` where a price is missing.
+    """
+
+    prices = np.array(prices, dtype=float)
+    known = ~np.isnan(prices)
+    if not known.any():
+        return [None] * len(prices)
+    rebased = prices / prices[known][0] * REBASE_TO
+    return [float(price) if has_price else None for price, has_price in zip(rebased, known)]
+
+
+def benchmark_tickers(raw):
+    """Parse a comma-separated ``benchmarks`` parameter, keeping known tickers
+    in ``BENCHMARK_CHOICES`` order."""
+
+    wanted = {ticker.strip() for ticker in raw.split(",")}
+    return [ticker for ticker, _ in BENCHMARK_CHOICES if ticker in wanted]
+
+
+def snapshot_version(portfolio):
+    """Return a digest identifying the portfolio's current snapshot history.
+
+    Built from the snapshot count, the latest id, the latest timestamp and
+    the latest ``updated_at``, so it changes whenever a snapshot is added,
+    removed, or rewritten in place (a backfill updates existing rows).
+    The version lives in the database rather than the per-process default
+    cache, so changes made by ``take_snapshots``, ``delete_snapshots`` or a
+    backfill script are seen by every web worker.
+    """
+
+    summary = portfolio.snapshots.aggregate(
+        count=Count("id"),
+        last_id=Max("id"),
+        latest=Max("timestamp"),
+        updated=Max("updated_at"),
+    )
+    latest = summary["latest"].isoformat() if summary["latest"] else ""
+    updated = summary["updated"].isoformat() if summary["updated"] else ""
+    key = f"{portfolio.pk}:{summary['count']}:{summary['last_id']}:{latest}:{updated}"
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def chart_etag(portfolio, tickers, include_portfolio=True):
+    """ETag for the chart data, changing with the snapshot version."""
+
+    key = f"{snapshot_version(portfolio)}:{int(include_portfolio)}:{','.join(tickers)}"
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def chart_payload(portfolio, tickers, include_portfolio=True):
+    """Return the chart data as a JSON-serialisable dict."""
+
+    dates, values, prices = snapshot_series(portfolio, tickers)
+    payload = {"dates": dates}
+    if include_portfolio:
+        payload["portfolio"] = [float(value) for value in values]
+    payload["benchmarks"] = {ticker: rebase(prices[ticker]) for ticker in tickers}
+    return payload
+
+
+def compressed_payload(portfolio, tickers, etag, include_portfolio=True):
+    """Return the gzipped JSON payload for ``etag``, building it on a cache miss."""
+
+    key = PAYLOAD_KEY.format(etag=etag)
+    body = cache.get(key)
+    if body is None:
+        payload = chart_payload(portfolio, tickers, include_portfolio)
+        body = gzip.compress(json.dumps(payload, separators=(",", ":")).encode())
+        cache.set(key, body, PAYLOAD_TIMEOUT)
+    return body
+
+
+def history_json(portfolio):
+    """Return the ``[{"timestamp", "value"}]`` history serialised as JSON, or
+    ``None`` when the portfolio has no snapshots yet."""
+
+    version = snapshot_version(portfolio)
+    key = HISTORY_KEY.format(version=version)
+    body = cache.get(key)
+    if body is None:
+        rows = portfolio.snapshots.order_by("timestamp").values_list("timestamp", "total_value")
+        history = [
+            {"timestamp": timestamp.isoformat(), "value": value} for timestamp, value in rows
+        ]
+        if not history:
+            return None
+        body = json.dumps(history, cls=DjangoJSONEncoder)
+        cache.set(key, body, PAYLOAD_TIMEOUT)
+    return body
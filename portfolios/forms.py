@@ -29,6 +29,9 @@ class PortfolioForm(forms.ModelForm):
 
 
 class OrderForm(forms.ModelForm):
+    # Signed quote from the ticker lookup (see core/quote_lock.py)
+    quote_token = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Order
         fields = ["symbol", "side", "quantity"]
@@ -37,6 +40,16 @@ class OrderForm(forms.ModelForm):
         }
 
 
+class WatchlistSymbolForm(forms.Form):
+    symbol = forms.CharField(
+        max_length=32,
+        widget=forms.TextInput(attrs={"class": "input", "placeholder": "Add ticker..."}),
+    )
+
+    def clean_symbol(self):
+        return self.cleaned_data["symbol"].strip().upper()
+
+
 class AllowedEmailForm(forms.Form):
     email = forms.EmailField(widget=forms.EmailInput(attrs={"class": "input"}))
 
@@ -0,0 +1,69 @@
+"""Intraday value curve for a portfolio's "today" chart.
+
+Built entirely from the shared minute-bar cache (``core.intraday``): the
+holdings' bars are aligned on one time axis, carried forward between bars and
+valued in one matrix product. Before a holding's session opens it counts at
+its previous close from the local price-history store. Current holdings and
+the latest FX rates are used throughout the session.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from core import fx, intraday, price_history
+from core.instruments import get_instruments
+
+# Previous closes are looked for this far back (covers long holiday weekends)
+PREVIOUS_CLOSE_LOOKBACK = timedelta(days=10)
+
+
+def _previous_closes(symbols, first_bar):
+    day = first_bar.date()
+    closes = price_history.get_closes(
+        symbols, day - PREVIOUS_CLOSE_LOOKBACK, day - timedelta(days=1)
+    )
+    return {symbol: float(series.iloc[-1]) for symbol, series in closes.items()}
+
+
+def intraday_values(portfolio, now=None):
+    """Return ``[{"timestamp", "value"}]`` in USD for the current session."""
+
+    holdings = {symbol.upper(): float(qty) for symbol, qty in portfolio.holdings.items() if qty}
+    if not holdings:
+        return []
+    symbols = list(holdings)
+    bars = intraday.get_bars(symbols, now=now)
+    if not bars:
+        return []
+
+    frame = pd.DataFrame(bars).reindex(columns=symbols).sort_index().ffill()
+    previous = _previous_closes(symbols, frame.index[0])
+    frame = frame.fillna(pd.Series(previous, dtype=float)).bfill()
+    # A holding with no price at all today is left out rather than zeroed
+    frame = frame.loc[:, frame.notna().all()]
+    if frame.empty:
+        return []
+
+    instruments = get_instruments(frame.columns)
+    # Without a known currency a holding cannot be converted, so it is left out
+    frame = frame.loc[
+        :, [symbol in instruments and bool(instruments[symbol].currency) for symbol in frame.columns]
+    ]
+    if frame.empty:
+        return []
+    currencies = {symbol: instruments[symbol].settlement_currency for symbol in frame.columns}
+    rates = fx.get_fx_rates(set(currencies.values()))
+    weights = np.array([
+        holdings[symbol]
+        * rates.get(currencies[symbol], np.nan)
+        * (0.01 if symbol in instruments and instruments[symbol].is_pence else 1.0)
+        for symbol in frame.columns
+    ])
+    priced = ~np.isnan(weights)
+    values = frame.to_numpy()[:, priced] @ weights[priced] + float(portfolio.cash_balance)
+
+    return [
+        {"timestamp": timestamp.isoformat(), "value": round(float(value), 2)}
+        for timestamp, value in zip(frame.index, values)
+    ]
@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from portfolios.constants import BENCHMARK_CHOICES
+from portfolios.models import Portfolio
+from portfolios.pricing import latest_quotes
+from portfolios.views import build_portfolio_context
+
+
+class Command(BaseCommand):
+    help = (
+        "Report portfolio page valuation latency against holding count, using "
+        "throwaway portfolios that are rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "symbols",
+            nargs="*",
+            help="Symbols to hold (defaults to every held symbol plus the benchmarks)",
+        )
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1, 5, 10, 25, 50],
+            help="Holding counts to measure",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Builds per size; the median is reported",
+        )
+
+    def _measure(self, portfolio, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            context = build_portfolio_context(portfolio)
+            timings.append(time.perf_counter() - started)
+        priced = sum(1 for pos in context["positions"] if pos["value_usd"] is not None)
+        return statistics.median(timings), max(timings), priced
+
+    def handle(self, *args, **options):
+        symbols = [symbol.upper() for symbol in options["symbols"]]
+        if not symbols:
+            held = set()
+            for holdings in Portfolio.objects.filter(is_deleted=False).values_list(
+                "holdings", flat=True
+            ):
+                held.update(symbol.upper() for symbol in holdings)
+            symbols = sorted(held) + [ticker for ticker, _ in BENCHMARK_CHOICES]
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            raise CommandError("No symbols to hold")
+        sizes = sorted({min(max(1, size), len(symbols)) for size in options["sizes"]})
+        repeat = max(1, options["repeat"])
+
+        self.stdout.write(
+            f"{'holdings':>8}{'stored':>8}{'median ms':>12}{'max ms':>10}{'priced':>8}"
+        )
+        with transaction.atomic():
+            for size in sizes:
+                held = symbols[:size]
+                portfolio = Portfolio.objects.create(
+                    user=User.objects.create_user(f"benchmark-portfolio-context-{size}"),
+                    name=f"Benchmark {size}",
+                    holdings={symbol: 1 for symbol in held},
+                )
+                stored = len(latest_quotes(held))
+                median, worst, priced = self._measure(portfolio, repeat)
+                self.stdout.write(
+                    f"{size:>8}{stored:>8}{median * 1000:>12.1f}{worst * 1000:>10.1f}"
+                    f"{priced:>8}"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,79 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from core import yfinance_client
+from portfolios.constants import BENCHMARK_CHOICES
+from portfolios.models import Portfolio
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-symbol latency and peak memory of full and light quote "
+        "fetches, bypassing the quote cache"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "symbols",
+            nargs="*",
+            help="Symbols to fetch (defaults to every held symbol plus the benchmarks)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Fetches per symbol and mode; the median is reported",
+        )
+
+    def _measure(self, fetch, symbol, repeat):
+        timings = []
+        peaks = []
+        for _ in range(repeat):
+            tracemalloc.start()
+            started = time.perf_counter()
+            quotes = fetch([symbol])
+            timings.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return statistics.median(timings), statistics.median(peaks), symbol in quotes
+
+    def handle(self, *args, **options):
+        symbols = options["symbols"]
+        if not symbols:
+            held = set()
+            for holdings in Portfolio.objects.filter(is_deleted=False).values_list(
+                "holdings", flat=True
+            ):
+                held.update(holdings)
+            symbols = sorted(held) + [ticker for ticker, _ in BENCHMARK_CHOICES]
+        repeat = max(1, options["repeat"])
+
+        modes = {
+            "full": yfinance_client._fetch_quotes,
+            "light": yfinance_client._fetch_light_quotes,
+        }
+        totals = {mode: [0.0, 0, 0] for mode in modes}
+
+        self.stdout.write(f"{'symbol':<12}{'mode':<7}{'latency ms':>12}{'peak KiB':>12}")
+        for symbol in symbols:
+            for mode, fetch in modes.items():
+                latency, peak, ok = self._measure(fetch, symbol, repeat)
+                totals[mode][0] += latency
+                totals[mode][1] += peak
+                totals[mode][2] += ok
+                self.stdout.write(
+                    f"{symbol:<12}{mode:<7}{latency * 1000:>12.1f}{peak / 1024:>12.1f}"
+                    + ("" if ok else "  (failed)")
+                )
+
+        count = len(symbols)
+        if not count:
+            return
+        for mode, (latency, peak, ok) in totals.items():
+            self.stdout.write(
+                f"{mode}: {latency / count * 1000:.1f} ms and {peak / count / 1024:.1f} KiB "
+                f"per symbol ({ok}/{count} priced)"
+            )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from core import http_session, quote_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Show hit/miss/staleness and coalescing counters for the shared quote cache, "
+        "plus upstream connection reuse"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after printing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = quote_cache.get_stats()
+        for name in quote_cache.STAT_NAMES:
+            self.stdout.write(f"{name}: {stats[name]}")
+        self.stdout.write(f"collapsed: {stats[quote_cache.COLLAPSED_STAT]}")
+        hit_ratio = stats["hit_ratio"]
+        self.stdout.write(
+            f"hit ratio: {hit_ratio:.1%}" if hit_ratio is not None else "hit ratio: n/a"
+        )
+
+        session = http_session.get_stats()
+        reuse_ratio = session["reuse_ratio"]
+        avg_handshake = session["avg_handshake_ms"]
+        self.stdout.write(f"upstream requests: {session['requests']}")
+        self.stdout.write(
+            f"connection reuse: {reuse_ratio:.1%}" if reuse_ratio is not None
+            else "connection reuse: n/a"
+        )
+        self.stdout.write(f"new connections: {session['connects']}")
+        self.stdout.write(
+            f"avg TLS handshake: {avg_handshake:.0f} ms" if avg_handshake is not None
+            else "avg TLS handshake: n/a"
+        )
+
+        if options.get("reset"):
+            quote_cache.reset_stats()
+            http_session.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Quote cache counters reset"))
@@ -0,0 +1,119 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import market_hours
+from core.yfinance_client import get_quotes
+from portfolios.constants import BENCHMARK_CHOICES
+from portfolios.models import LatestQuote, Portfolio
+from portfolios.pricing import store_latest_quotes
+
+DEFAULT_OPEN_INTERVAL = 60
+DEFAULT_CLOSED_INTERVAL = 15 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep the LatestQuote table fresh for every held symbol and benchmark, "
+        "refreshing open markets more often than closed ones"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Refresh whatever is due once and exit",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Symbols fetched per upstream batch",
+        )
+
+    def _symbols(self):
+        symbols = set()
+        for holdings in Portfolio.objects.filter(is_deleted=False).values_list(
+            "holdings", flat=True
+        ):
+            symbols.update(symbol.upper() for symbol in holdings)
+        symbols.update(ticker for ticker, _ in BENCHMARK_CHOICES)
+        return symbols
+
+    def _interval(self, is_open):
+        if is_open:
+            return getattr(settings, "REFRESH_QUOTES_OPEN_INTERVAL", DEFAULT_OPEN_INTERVAL)
+        return getattr(settings, "REFRESH_QUOTES_CLOSED_INTERVAL", DEFAULT_CLOSED_INTERVAL)
+
+    def _schedule(self):
+        """Return (symbols due now, seconds until the next one is due)."""
+
+        now = timezone.now()
+        stored = {
+            symbol: (fetched_at, market_state)
+            for symbol, fetched_at, market_state in LatestQuote.objects.values_list(
+                "symbol", "fetched_at", "market_state"
+            )
+        }
+        due = []
+        next_due = self._interval(False)
+        for symbol in sorted(self._symbols()):
+            retry_at = self._retry_at.get(symbol)
+            if retry_at is not None and retry_at > time.monotonic():
+                next_due = min(next_due, retry_at - time.monotonic())
+                continue
+            if symbol not in stored:
+                due.append(symbol)
+                continue
+            fetched_at, market_state = stored[symbol]
+            is_open = market_hours.is_open(symbol, now)
+            known = is_open is not None
+            if not known:
+                # No calendar for this exchange: go by the state stored with the quote
+                is_open = market_state in ("REGULAR", "")
+            wait = self._interval(is_open) - (now - fetched_at).total_seconds()
+            # A session that ended since the last fetch means a new close to pick up
+            if wait <= 0 or (
+                known
+                and not is_open
+                and market_hours.prices_changed_since(symbol, fetched_at, now)
+            ):
+                due.append(symbol)
+            else:
+                until_open = market_hours.seconds_until_change(symbol, now)
+                next_due = min(next_due, wait, until_open or wait)
+        return due, next_due
+
+    def _refresh(self, symbols, batch_size):
+        for start in range(0, len(symbols), batch_size):
+            batch = symbols[start:start + batch_size]
+            quotes = get_quotes(batch, allow_stale=False)
+            stored = store_latest_quotes(quotes)
+            self.stdout.write(f"↻ Refreshed {stored}/{len(batch)} quotes")
+
+            # Back off symbols that could not be priced instead of retrying every pass
+            retry_at = time.monotonic() + self._interval(False)
+            for symbol in batch:
+                if symbol in quotes and not quotes[symbol].get("stale"):
+                    self._retry_at.pop(symbol, None)
+                else:
+                    self._retry_at[symbol] = retry_at
+            for symbol, reason in sorted(quotes.invalid.items()):
+                self.stderr.write(f"⚠ Invalid symbol {symbol}: {reason}")
+            for symbol, error in sorted(quotes.failed.items()):
+                self.stderr.write(f"✖ Quote failed for {symbol}: {error}")
+            for symbol in quotes.timed_out:
+                self.stderr.write(f"⏱ Quote timed out for {symbol}")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        self._retry_at = {}
+        while True:
+            due, next_due = self._schedule()
+            if due:
+                self._refresh(due, batch_size)
+            if options["once"]:
+                return
+            time.sleep(min(max(next_due, 1), 60))
@@ -0,0 +1,83 @@
+import csv
+import io
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import symbol_index
+from portfolios.models import Instrument, Order
+
+# Nasdaq Trader's daily symbol directory covers every US-listed security
+DEFAULT_SOURCES = (
+    "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt",
+    "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt",
+)
+NASDAQ_EXCHANGES = {"A": "NYSE American", "N": "NYSE", "P": "NYSE Arca", "Z": "Cboe BZX", "V": "IEX"}
+
+
+def _read(source):
+    if source.startswith(("http://", "https://")):
+        with urlopen(source, timeout=30) as response:
+            return response.read().decode("utf-8", errors="replace")
+    with open(source, encoding="utf-8") as fh:
+        return fh.read()
+
+
+def parse_listings(text):
+    """Parse a Nasdaq Trader pipe file or a ``symbol,name[,exchange]`` CSV."""
+
+    first_line = text.split("\n", 1)[0]
+    listings = {}
+    if "|" in first_line:
+        for row in csv.DictReader(io.StringIO(text), delimiter="|"):
+            symbol = (row.get("Symbol") or row.get("ACT Symbol") or "").strip()
+            # The last line is a "File Creation Time" footer
+            if not symbol or symbol.startswith("File Creation Time") or row.get("Test Issue") == "Y":
+                continue
+            exchange = NASDAQ_EXCHANGES.get(row.get("Exchange"), "Nasdaq")
+            # Share classes are BRK.B there but BRK-B on Yahoo
+            listings[symbol.replace(".", "-").upper()] = (
+                (row.get("Security Name") or "").strip(),
+                exchange,
+            )
+    else:
+        listings = symbol_index.parse_listings_csv(io.StringIO(text))
+    return listings
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the offline listings file behind type-ahead ticker search from "
+        "exchange symbol directories, stored instruments and traded symbols"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            action="append",
+            help="Listings URL or file to merge (repeatable; defaults to Nasdaq Trader)",
+        )
+
+    def handle(self, *args, **options):
+        listings = {}
+        for source in options.get("source") or DEFAULT_SOURCES:
+            try:
+                parsed = parse_listings(_read(source))
+            except OSError as exc:
+                raise CommandError(f"Could not read {source}: {exc}")
+            listings.update(parsed)
+            self.stdout.write(f"Read {len(parsed)} listings from {source}")
+
+        # Non-US holdings are only known from instruments and orders
+        for symbol, short_name, long_name, exchange in Instrument.objects.values_list(
+            "symbol", "short_name", "long_name", "exchange"
+        ):
+            if symbol not in listings or not listings[symbol][0]:
+                listings[symbol] = (long_name or short_name or "", exchange or "")
+        for symbol in Order.objects.values_list("symbol", flat=True).distinct():
+            listings.setdefault(symbol, ("", ""))
+
+        path = getattr(settings, "SYMBOL_LISTINGS_FILE", symbol_index.DEFAULT_LISTINGS_FILE)
+        symbol_index.write_listings(path, listings)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(listings)} listings to {path}"))
@@ -2,7 +2,6 @@ import sys
 from datetime import timedelta
 
 import pytz
-import yfinance as yf
 
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
@@ -12,7 +11,9 @@ from decimal import Decimal
 
 from portfolios.models import Portfolio, PortfolioSnapshot
 from portfolios.benchmarks import get_benchmark_prices_usd
-from core.yfinance_client import get_quote, get_quotes
+from portfolios.pricing import latest_quotes, store_latest_quotes
+from core.market_data import get_provider
+from core.yfinance_client import InvalidSymbolError, get_quote, get_quotes
 
 
 class Command(BaseCommand):
@@ -35,14 +36,37 @@ class Command(BaseCommand):
         for p in portfolios:
             all_symbols.update(p.holdings.keys())
 
-        quote_map = get_quotes(all_symbols)
+        # Symbols the refresher keeps warm are valued from the LatestQuote table
+        stored = latest_quotes(all_symbols)
+        quote_map = get_quotes([s for s in all_symbols if s not in stored], light=True)
+        store_latest_quotes(quote_map)
+        quote_map.update(stored)
+        timed_out = set(getattr(quote_map, "timed_out", []))
+        invalid = getattr(quote_map, "invalid", {})
+        for symbol, error in sorted(getattr(quote_map, "failed", {}).items()):
+            self.stderr.write(f"✖ Quote failed for {symbol}: {error}")
+        for symbol in sorted(timed_out):
+            self.stderr.write(f"⏱ Quote timed out for {symbol}")
+        for symbol, reason in sorted(invalid.items()):
+            self.stderr.write(f"⚠ Invalid holding {symbol}: {reason}")
+
+        def quote_for(symbol):
+            if symbol in quote_map:
+                return quote_map[symbol]
+            if symbol in invalid:
+                raise InvalidSymbolError(invalid[symbol])
+            if symbol in timed_out:
+                # Retrying serially would blow the batch deadline
+                raise TimeoutError("quote timed out")
+            return get_quote(symbol, light=True)
+
+        provider = get_provider()
 
         for p in portfolios:
             # 1) Adjust holdings for any splits in the last 24 hours
             for symbol, qty in list(p.holdings.items()):
                 try:
-                    ticker = yf.Ticker(symbol)
-                    splits = ticker.splits  # pandas Series indexed by ex-date
+                    splits = provider.get_splits(symbol)  # pandas Series indexed by ex-date
                     if splits is not None and not splits.empty:
                         new_qty = qty
                         for ex_date, ratio in splits.items():
@@ -61,12 +85,11 @@ class Command(BaseCommand):
             total_dividend_credit = Decimal("0")
             for symbol, qty in p.holdings.items():
                 try:
-                    ticker = yf.Ticker(symbol)
-                    div_series = ticker.dividends
+                    div_series = provider.get_dividends(symbol)
                     if div_series is not None and not div_series.empty:
                         for ex_date, div_amount in div_series.items():
                             if ex_date.date() >= since_date:
-                                quote = quote_map.get(symbol) or get_quote(symbol)
+                                quote = quote_for(symbol)
                                 fx_rate = Decimal(str(quote["fx_rate"]))
 
                                 # Dividends for GBp tickers are also reported in pence
@@ -94,7 +117,7 @@ class Command(BaseCommand):
             total_value = p.cash_balance
             for symbol, qty in p.holdings.items():
                 try:
-                    quote = quote_map.get(symbol) or get_quote(symbol)
+                    quote = quote_for(symbol)
                     fx_rate = Decimal(str(quote["fx_rate"]))
                     mid_local = Decimal(str(quote["price"]))
                     total_value += mid_local * fx_rate * Decimal(str(qty))
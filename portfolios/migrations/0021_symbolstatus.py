@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0020_portfolio_deleted_at_portfolio_is_deleted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SymbolStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=32, unique=True)),
+                ('is_valid', models.BooleanField()),
+                ('reason', models.CharField(blank=True, default='', max_length=255)),
+                ('checked_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'symbol statuses',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-17 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0021_symbolstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestQuote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=32, unique=True)),
+                ('price', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('currency', models.CharField(max_length=10)),
+                ('native_currency', models.CharField(blank=True, default='', max_length=10)),
+                ('fx_rate', models.DecimalField(decimal_places=10, max_digits=20)),
+                ('market_state', models.CharField(blank=True, default='', max_length=20)),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
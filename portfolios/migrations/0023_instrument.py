@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0022_latestquote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=32, unique=True)),
+                ('currency', models.CharField(blank=True, default='', max_length=10)),
+                ('short_name', models.CharField(blank=True, default='', max_length=200)),
+                ('long_name', models.CharField(blank=True, default='', max_length=255)),
+                ('exchange', models.CharField(blank=True, default='', max_length=20)),
+                ('timezone', models.CharField(blank=True, default='', max_length=64)),
+                ('quote_type', models.CharField(blank=True, default='', max_length=20)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -117,7 +117,83 @@ class PortfolioSnapshot(models.Model):
     )
     total_value  = models.DecimalField(max_digits=20, decimal_places=2)  # USD value at this moment
     benchmark_values = JSONField(default=dict)
+    updated_at   = models.DateTimeField(auto_now=True)  # moves when a backfill rewrites the row
 
     class Meta:
         ordering = ["timestamp"]
         get_latest_by = "timestamp"
+
+
+class SymbolStatus(models.Model):
+    """Last verdict on whether a ticker exists upstream, valid until expires_at."""
+    symbol     = models.CharField(max_length=32, unique=True)
+    is_valid   = models.BooleanField()
+    reason     = models.CharField(max_length=255, blank=True, default="")
+    checked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = "symbol statuses"
+
+    def __str__(self):
+        return f"{self.symbol}: {'valid' if self.is_valid else 'invalid'} until {self.expires_at}"
+
+
+class LatestQuote(models.Model):
+    """Most recent quote per symbol, kept warm by the refresh_quotes command."""
+    symbol          = models.CharField(max_length=32, unique=True)
+    price           = models.DecimalField(max_digits=20, decimal_places=6)      # local-currency price
+    currency        = models.CharField(max_length=10)                          # settlement currency (GBP for GBp)
+    native_currency = models.CharField(max_length=10, blank=True, default="")  # as quoted, e.g. GBp
+    fx_rate         = models.DecimalField(max_digits=20, decimal_places=10)    # USD per unit of currency
+    market_state    = models.CharField(max_length=20, blank=True, default="")
+    fetched_at      = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.symbol} {self.price} {self.currency} @ {self.fetched_at}"
+
+
+class Instrument(models.Model):
+    """Static facts about a listing, looked up once and refreshed rarely."""
+    symbol       = models.CharField(max_length=32, unique=True)
+    currency     = models.CharField(max_length=10, blank=True, default="")   # as quoted, e.g. GBp
+    short_name   = models.CharField(max_length=200, blank=True, default="")
+    long_name    = models.CharField(max_length=255, blank=True, default="")
+    exchange     = models.CharField(max_length=20, blank=True, default="")
+    timezone     = models.CharField(max_length=64, blank=True, default="")
+    quote_type   = models.CharField(max_length=20, blank=True, default="")
+    refreshed_at = models.DateTimeField()
+
+    @property
+    def is_pence(self):
+        """True for UK listings quoted in pence (GBp)."""
+        return self.currency == "GBp"
+
+    @property
+    def settlement_currency(self):
+        return "GBP" if self.is_pence else (self.currency or "USD")
+
+    @property
+    def display_name(self):
+        return self.long_name or self.short_name or self.symbol
+
+    def __str__(self):
+        return f"{self.symbol} ({self.currency or '?'})"
+
+
+class Watchlist(models.Model):
+    """Tickers a user follows without holding them."""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="watchlist"
+    )
+    symbols = JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Watchlist for {self.user}: {', '.join(self.symbols)}"
+
+    @classmethod
+    def for_user(cls, user):
+        watchlist, _ = cls.objects.get_or_create(user=user)
+        return watchlist
@@ -0,0 +1,114 @@
+"""Valuation quotes backed by the ``LatestQuote`` table.
+
+``refresh_quotes`` keeps the table warm, so pages and snapshots value a
+portfolio with one indexed query and only go upstream for symbols the
+refresher has not covered yet. A stored quote stays usable past its max age
+when the local exchange calendar shows no trading since it was fetched.
+"""
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import market_hours
+
+from .models import LatestQuote
+
+DEFAULT_OPEN_MAX_AGE = 5 * 60
+DEFAULT_CLOSED_MAX_AGE = 12 * 60 * 60
+
+
+def max_age(market_state):
+    """Seconds a stored quote may be used for valuation.
+
+    An unknown state gets the open-market allowance: a quote without one may
+    well have been fetched mid-session.
+    """
+
+    if market_state in ("REGULAR", None):
+        return getattr(settings, "LATEST_QUOTE_OPEN_MAX_AGE", DEFAULT_OPEN_MAX_AGE)
+    return getattr(settings, "LATEST_QUOTE_CLOSED_MAX_AGE", DEFAULT_CLOSED_MAX_AGE)
+
+
+def _as_quote(row):
+    return {
+        "price": float(row.price),
+        "currency": row.currency,
+        "native_currency": row.native_currency or row.currency,
+        "fx_rate": float(row.fx_rate),
+        "market_state": row.market_state or None,
+        "symbol": row.symbol,
+        "fetched_at": row.fetched_at,
+    }
+
+
+def latest_quotes(symbols):
+    """Return ``{symbol: quote}`` for symbols with a usable stored quote."""
+
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    now = timezone.now()
+    rows = LatestQuote.objects.filter(symbol__in={symbol.upper() for symbol in symbols})
+    fresh = {
+        row.symbol: _as_quote(row)
+        for row in rows
+        if (now - row.fetched_at).total_seconds() <= max_age(row.market_state or None)
+        or not market_hours.prices_changed_since(row.symbol, row.fetched_at, now)
+    }
+    return {symbol: fresh[symbol.upper()] for symbol in symbols if symbol.upper() in fresh}
+
+
+def _fetched_at(quotes, symbol, default):
+    """When ``symbol``'s quote was fetched upstream, as reported by ``get_quotes``."""
+
+    fetched = getattr(quotes, "fetched_at", {}).get(symbol)
+    if fetched is None:
+        return default
+    return datetime.fromtimestamp(fetched, dt_timezone.utc)
+
+
+def store_latest_quotes(quotes, fetched_at=None):
+    """Upsert freshly fetched quotes; stale or incomplete ones are skipped.
+
+    Each row keeps the time its quote was fetched upstream when ``quotes``
+    (a ``QuoteResults``) reports it, so a quote served from the quote cache is
+    not recorded as fresher than it is; otherwise ``fetched_at`` or now.
+    """
+
+    fetched_at = fetched_at or timezone.now()
+    rows = []
+    for symbol, quote in quotes.items():
+        if quote.get("stale") or quote.get("price") is None or quote.get("fx_rate") is None:
+            continue
+        quote_fetched_at = _fetched_at(quotes, symbol, fetched_at)
+        rows.append(LatestQuote(
+            symbol=symbol.upper(),
+            price=Decimal(str(quote["price"])),
+            currency=quote.get("currency") or "",
+            native_currency=quote.get("native_currency") or "",
+            fx_rate=Decimal(str(quote["fx_rate"])),
+            # Light quotes carry no state; take it from the exchange calendar
+            market_state=(
+                quote.get("market_state")
+                or market_hours.market_state(symbol, quote_fetched_at)
+                or ""
+            ),
+            fetched_at=quote_fetched_at,
+        ))
+    if rows:
+        LatestQuote.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["symbol"],
+            update_fields=[
+                "price",
+                "currency",
+                "native_currency",
+                "fx_rate",
+                "market_state",
+                "fetched_at",
+            ],
+        )
+    return len(rows)
@@ -1,20 +1,30 @@
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.core.cache import cache
 from unittest.mock import Mock, patch
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command, CommandError
-from io import BytesIO
+from io import BytesIO, StringIO
 import importlib
+import tempfile
+import time
 from unittest import skipUnless
 
-from .models import Portfolio, Order, PortfolioSnapshot, PortfolioAllowedEmail, NotificationSetting
+from .models import Portfolio, Order, PortfolioSnapshot, PortfolioAllowedEmail, NotificationSetting, SymbolStatus, LatestQuote, Instrument, Watchlist
 from decimal import Decimal
 from .constants import BENCHMARK_CHOICES
 from .views import build_portfolio_context
+from .benchmarks import get_benchmark_prices_usd
+from .pricing import latest_quotes, store_latest_quotes
 import pandas as pd
 import pytz
+from datetime import timedelta
+from core import instruments, quote_cache, symbol_registry
+from core.yfinance_client import InvalidSymbolError, QuoteResults, get_quote
+import gzip
+import json
 
 
 class RegistrationTests(TestCase):
@@ -286,6 +296,73 @@ class PublicPortfolioTests(TestCase):
         response = self.client.get(reverse('portfolios:portfolio-detail'))
         self.assertContains(response, 'Owner Name')
 
+    def test_anonymous_public_page_is_conditional_and_shared(self):
+        cache.clear()
+        # Keep every request inside one page-cache interval
+        clock = patch('portfolios.views.timezone.now', return_value=timezone.now())
+        clock.start()
+        self.addCleanup(clock.stop)
+        url = reverse('portfolios:portfolio-public-detail', kwargs={'tag': self.portfolio.url_tag})
+        first = self.client.get(url)
+        self.assertIn('public', first['Cache-Control'])
+        self.assertTrue(first.has_header('Last-Modified'))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        # A second anonymous viewer is served the cached render
+        with patch('portfolios.views.build_portfolio_context') as mock_context:
+            repeat = self.client.get(url)
+        mock_context.assert_not_called()
+        self.assertEqual(repeat.content, first.content)
+
+        Order.objects.create(
+            portfolio=self.portfolio,
+            symbol='AAPL',
+            side='BUY',
+            quantity=1,
+            price_executed=100,
+            currency='USD',
+            fx_rate=1.0,
+        )
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    @override_settings(PUBLIC_PAGE_CACHE_SECONDS=60)
+    @patch('portfolios.views.get_quotes', return_value=QuoteResults())
+    def test_public_page_validators_follow_prices(self, mock_quotes):
+        cache.clear()
+        self.portfolio.holdings = {'AAPL': 1}
+        self.portfolio.save()
+        url = reverse('portfolios:portfolio-public-detail', kwargs={'tag': self.portfolio.url_tag})
+        now = timezone.now().replace(second=5, microsecond=0)
+        with patch('portfolios.views.timezone.now', return_value=now):
+            first = self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+            store_latest_quotes({'AAPL': {'price': 101, 'fx_rate': 1.0}}, fetched_at=now)
+            repriced = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repriced.status_code, 200)
+
+        later = now + timedelta(seconds=60)
+        with patch('portfolios.views.timezone.now', return_value=later):
+            expired = self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=repriced['ETag'],
+                HTTP_IF_MODIFIED_SINCE=repriced['Last-Modified'],
+            )
+        self.assertEqual(expired.status_code, 200)
+        self.assertNotEqual(expired['ETag'], repriced['ETag'])
+
+    def test_owner_always_gets_a_fresh_page(self):
+        cache.clear()
+        self.client.login(username='owner', password='pass')
+        url = reverse('portfolios:portfolio-public-detail', kwargs={'tag': self.portfolio.url_tag})
+        first = self.client.get(url)
+        self.assertFalse(first.has_header('ETag'))
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 200)
+
 
 class PortfolioExploreTests(TestCase):
     def setUp(self):
@@ -547,14 +624,331 @@ class BenchmarkContextTests(TestCase):
         ctx = build_portfolio_context(portfolio)
         self.assertEqual(ctx['default_benchmarks'], portfolio.benchmarks)
         self.assertEqual(len(ctx['benchmark_data']), len(BENCHMARK_CHOICES))
-        for bm in ctx['benchmark_data']:
-            if bm['data']:
-                self.assertEqual(bm['data'][0]['price_usd'], 100000.0)
+        self.assertEqual(
+            [bm['ticker'] for bm in ctx['benchmark_data'][:2]], portfolio.benchmarks
+        )
+
+
+class PortfolioChartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('chart', password='pass')
+        self.portfolio = Portfolio.objects.create(
+            user=user,
+            name='Chart',
+            substack_url='https://chart.substack.com',
+            benchmarks=['^IXIC'],
+            is_private=False,
+        )
+        now = timezone.now()
+        for days, price in ((2, 50.0), (1, None), (0, 75.0)):
+            PortfolioSnapshot.objects.create(
+                portfolio=self.portfolio,
+                timestamp=now - timedelta(days=days),
+                total_value=1000 + days,
+                benchmark_values={'^IXIC': price, '^GSPC': 10.0} if price else {'^GSPC': 20.0},
+            )
+        self.url = reverse('portfolios:portfolio-chart', kwargs={'tag': self.portfolio.url_tag})
+
+    def test_columnar_payload_with_selected_benchmarks(self):
+        response = self.client.get(self.url)
+
+        data = response.json()
+        self.assertEqual(len(data['dates']), 3)
+        self.assertEqual(data['portfolio'], [1002.0, 1001.0, 1000.0])
+        self.assertEqual(data['benchmarks'], {'^IXIC': [100000.0, None, 150000.0]})
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_benchmark_on_demand_without_portfolio_values(self):
+        data = self.client.get(self.url, {'benchmarks': '^GSPC,AAPL', 'portfolio': '0'}).json()
+
+        self.assertNotIn('portfolio', data)
+        self.assertEqual(data['benchmarks'], {'^GSPC': [100000.0, 200000.0, 100000.0]})
+
+    def test_unchanged_history_is_not_modified_and_precompressed(self):
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            json.loads(gzip.decompress(first.content))['portfolio'], [1002.0, 1001.0, 1000.0]
+        )
+
+        repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        PortfolioSnapshot.objects.create(
+            portfolio=self.portfolio, timestamp=timezone.now(), total_value=1
+        )
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['dates']), 4)
+
+    def test_history_is_cached_until_a_snapshot_lands(self):
+        self.client.login(username='chart', password='pass')
+        url = reverse('portfolios:portfolio-history')
+        self.assertEqual(
+            [pt['value'] for pt in self.client.get(url).json()], ['1002.00', '1001.00', '1000.00']
+        )
+
+        # Edited in place: same snapshot version, so the cached history is served
+        self.portfolio.snapshots.update(total_value=5)
+        with self.assertNumQueries(4):  # session, user, portfolio, snapshot version
+            cached = self.client.get(url).json()
+        self.assertEqual(cached[0]['value'], '1002.00')
+
+        PortfolioSnapshot.objects.create(
+            portfolio=self.portfolio, timestamp=timezone.now(), total_value=7
+        )
+        self.assertEqual([pt['value'] for pt in self.client.get(url).json()], ['5.00'] * 3 + ['7.00'])
+
+    def test_backfilled_snapshot_rewritten_in_place_changes_the_version(self):
+        first = self.client.get(self.url)
+        latest = self.portfolio.snapshots.latest()
+
+        # As backfill_snapshots does for a day that already has a snapshot
+        PortfolioSnapshot.objects.update_or_create(
+            portfolio=self.portfolio,
+            timestamp=latest.timestamp,
+            defaults={'total_value': 900, 'benchmark_values': latest.benchmark_values},
+        )
+
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['portfolio'], [1002.0, 1001.0, 900.0])
+
+
+class BenchmarkPriceTests(TestCase):
+    def setUp(self):
+        instruments.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(PRICE_HISTORY_DIR=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    @patch('portfolios.benchmarks.get_fx_rates_on')
+    @patch('portfolios.benchmarks.get_provider')
+    def test_past_closes_come_from_local_store(self, mock_provider, mock_fx):
+        day = timezone.datetime(2024, 5, 1).date()
+        tickers = [ticker for ticker, _ in BENCHMARK_CHOICES]
+        hist = pd.DataFrame(
+            {(ticker, 'Close'): [190.0, 200.0] for ticker in tickers},
+            index=pd.DatetimeIndex(['2024-04-30', '2024-05-01']),
+        )
+        provider = Mock(
+            download=Mock(return_value=hist),
+            get_fast_info=Mock(return_value={'currency': 'USD'}),
+        )
+        mock_provider.return_value = provider
+        mock_fx.return_value = {}
+
+        first = get_benchmark_prices_usd(day)
+        second = get_benchmark_prices_usd(day)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['^GSPC'], 200.0)
+        provider.download.assert_called_once()
+        provider.get_history.assert_not_called()
+
+    @patch('portfolios.benchmarks.get_fx_rates_on')
+    @patch('portfolios.benchmarks.get_provider')
+    def test_fx_rates_fetched_once_for_all_benchmarks(self, mock_provider, mock_fx):
+        day = timezone.datetime(2024, 5, 1).date()
+        hist = pd.DataFrame({'Close': [200.0]}, index=pd.DatetimeIndex(['2024-05-01']))
+        currencies = {'^FTLC': 'GBP', '^STOXXE': 'EUR'}
+
+        mock_provider.return_value = Mock(
+            get_history=Mock(return_value=hist),
+            get_fast_info=Mock(
+                side_effect=lambda symbol: {'currency': currencies.get(symbol, 'USD')}
+            ),
+        )
+        mock_fx.return_value = {'GBP': 1.25, 'EUR': 1.1}
+
+        prices = get_benchmark_prices_usd(day)
+
+        mock_fx.assert_called_once_with(day, {'GBP', 'EUR'})
+        self.assertEqual(prices['^GSPC'], 200.0)
+        self.assertEqual(prices['^FTLC'], 250.0)
+        self.assertAlmostEqual(prices['^STOXXE'], 220.0)
+
+    @patch('portfolios.benchmarks.get_fx_rates_on', return_value={})
+    @patch('portfolios.benchmarks.get_provider')
+    def test_benchmark_without_fx_rate_is_left_out(self, mock_provider, mock_fx):
+        day = timezone.datetime(2024, 5, 1).date()
+        hist = pd.DataFrame({'Close': [200.0]}, index=pd.DatetimeIndex(['2024-05-01']))
+        mock_provider.return_value = Mock(
+            get_history=Mock(return_value=hist),
+            get_fast_info=Mock(
+                side_effect=lambda symbol: {'currency': 'JPY' if symbol == '1308.T' else 'USD'}
+            ),
+        )
+
+        prices = get_benchmark_prices_usd(day)
+
+        self.assertNotIn('1308.T', prices)
+        self.assertEqual(prices['^GSPC'], 200.0)
+
+    @patch('portfolios.benchmarks.get_fx_rates_on', return_value={})
+    @patch('portfolios.benchmarks.get_provider')
+    def test_benchmark_with_unknown_currency_is_left_out(self, mock_provider, mock_fx):
+        day = timezone.datetime(2024, 5, 1).date()
+        hist = pd.DataFrame({'Close': [200.0]}, index=pd.DatetimeIndex(['2024-05-01']))
+
+        def fast_info(symbol):
+            if symbol == '000300.SS':
+                raise ConnectionError('lookup failed')
+            return {'currency': 'USD'}
+
+        mock_provider.return_value = Mock(
+            get_history=Mock(return_value=hist),
+            get_fast_info=Mock(side_effect=fast_info),
+            get_info=Mock(side_effect=ConnectionError('lookup failed')),
+        )
+
+        prices = get_benchmark_prices_usd(day)
+
+        self.assertNotIn('000300.SS', prices)
+        self.assertEqual(prices['^GSPC'], 200.0)
+
+
+class LatestQuoteTests(TestCase):
+    def _store(self, symbol, market_state, age):
+        LatestQuote.objects.create(
+            symbol=symbol,
+            price=Decimal('100'),
+            currency='USD',
+            fx_rate=Decimal('1'),
+            market_state=market_state,
+            fetched_at=timezone.now() - timedelta(seconds=age),
+        )
+
+    @patch('portfolios.pricing.market_hours.prices_changed_since', return_value=True)
+    def test_open_markets_need_fresher_quotes_than_closed(self, mock_changed):
+        self._store('AAPL', 'REGULAR', 60 * 30)
+        self._store('VOD.L', 'CLOSED', 60 * 30)
+
+        self.assertEqual(list(latest_quotes(['AAPL', 'VOD.L'])), ['VOD.L'])
+
+    @patch('portfolios.pricing.market_hours.prices_changed_since', return_value=False)
+    def test_old_quote_is_usable_when_market_has_not_traded_since(self, mock_changed):
+        self._store('AAPL', 'CLOSED', 60 * 60 * 24 * 3)
+
+        self.assertEqual(list(latest_quotes(['AAPL'])), ['AAPL'])
+
+    def test_store_upserts_and_skips_stale_quotes(self):
+        store_latest_quotes({'AAPL': {'price': 1, 'currency': 'USD', 'fx_rate': 1}})
+        store_latest_quotes({
+            'AAPL': {'price': 2, 'currency': 'USD', 'fx_rate': 1, 'market_state': 'REGULAR'},
+            'MSFT': {'price': 3, 'currency': 'USD', 'fx_rate': 1, 'stale': True},
+        })
+
+        self.assertEqual(LatestQuote.objects.get().price, Decimal('2'))
+
+    def test_cached_quotes_keep_their_upstream_fetch_time(self):
+        quotes = QuoteResults({
+            'AAPL': {'price': 1, 'currency': 'USD', 'fx_rate': 1, 'market_state': 'REGULAR'},
+        })
+        fetched = timezone.now() - timedelta(minutes=5)
+        quotes.fetched_at['AAPL'] = fetched.timestamp()
+
+        store_latest_quotes(quotes)
+
+        self.assertEqual(LatestQuote.objects.get().fetched_at, fetched)
+
+    def test_light_quotes_are_stored_with_the_calendar_state(self):
+        with patch('portfolios.pricing.market_hours.market_state', return_value='REGULAR'):
+            store_latest_quotes({'AAPL': {'price': 1, 'currency': 'USD', 'fx_rate': 1}})
+
+        self.assertEqual(LatestQuote.objects.get().market_state, 'REGULAR')
+
+    @patch('portfolios.pricing.market_hours.prices_changed_since', return_value=True)
+    def test_unknown_state_gets_the_open_market_max_age(self, mock_changed):
+        self._store('AAPL', '', 60 * 30)
+
+        self.assertEqual(latest_quotes(['AAPL']), {})
+
+    @patch('portfolios.views.get_quotes')
+    def test_portfolio_context_values_from_stored_quotes(self, mock_quotes):
+        user = User.objects.create_user('stored', password='pass')
+        portfolio = Portfolio.objects.create(
+            user=user,
+            name='Stored',
+            substack_url='https://stored.substack.com',
+            holdings={'AAPL': 2},
+            cash_balance=0,
+        )
+        self._store('AAPL', 'CLOSED', 60)
+
+        ctx = build_portfolio_context(portfolio)
+
+        mock_quotes.assert_not_called()
+        self.assertEqual(ctx['total_value'], Decimal('200'))
+
+    @patch('portfolios.pricing.market_hours.prices_changed_since', return_value=False)
+    @patch('portfolios.views.get_quotes')
+    def test_portfolio_context_batches_missing_quotes(self, mock_quotes, mock_changed):
+        user = User.objects.create_user('batched', password='pass')
+        portfolio = Portfolio.objects.create(
+            user=user,
+            name='Batched',
+            substack_url='https://batched.substack.com',
+            holdings={'AAPL': 2, 'SAP.DE': 1, 'ASML.AS': 1, 'GONE': 1},
+            cash_balance=0,
+        )
+        self._store('AAPL', 'CLOSED', 60)
+        LatestQuote.objects.create(
+            symbol='SAP.DE',
+            price=Decimal('50'),
+            currency='EUR',
+            fx_rate=Decimal('1.05'),
+            market_state='CLOSED',
+            fetched_at=timezone.now() - timedelta(hours=1),
+        )
+        results = QuoteResults({
+            'ASML.AS': {'price': 10, 'currency': 'EUR', 'fx_rate': 1.1},
+        })
+        results.failed['GONE'] = 'No data'
+        mock_quotes.return_value = results
+
+        ctx = build_portfolio_context(portfolio)
+
+        mock_quotes.assert_called_once_with(['ASML.AS', 'GONE'], light=True)
+        positions = {pos['symbol']: pos for pos in ctx['positions']}
+        self.assertIsNone(positions['GONE']['value_usd'])
+        # Both EUR holdings use the rate from the freshest EUR quote
+        self.assertEqual(positions['SAP.DE']['fx_rate'], Decimal('1.1'))
+        self.assertEqual(ctx['total_value'], Decimal('266'))
+
+    @patch('portfolios.management.commands.refresh_quotes.get_quotes')
+    def test_refresh_command_covers_holdings_and_benchmarks(self, mock_quotes):
+        user = User.objects.create_user('refresh', password='pass')
+        Portfolio.objects.create(
+            user=user,
+            name='Refresh',
+            substack_url='https://refresh.substack.com',
+            holdings={'aapl': 1},
+        )
+        self._store('^GSPC', 'CLOSED', 60)
+
+        def fake_quotes(symbols, allow_stale=True):
+            return QuoteResults(
+                {s: {'price': 10, 'currency': 'USD', 'fx_rate': 1} for s in symbols}
+            )
+
+        mock_quotes.side_effect = fake_quotes
+        call_command('refresh_quotes', '--once', stdout=StringIO())
+
+        requested = {s for call in mock_quotes.call_args_list for s in call.args[0]}
+        self.assertIn('AAPL', requested)
+        self.assertNotIn('^GSPC', requested)  # still fresh
+        self.assertEqual(
+            LatestQuote.objects.count(), len(BENCHMARK_CHOICES) + 1
+        )
 
 
 class AllocationContextTests(TestCase):
-    @patch('portfolios.views.get_quote')
-    def test_allocations_include_cash(self, mock_quote):
+    @patch('portfolios.views.get_quotes')
+    def test_allocations_include_cash(self, mock_quotes):
         user = User.objects.create_user('alloc', password='pass')
         portfolio = Portfolio.objects.create(
             user=user,
@@ -563,11 +957,9 @@ class AllocationContextTests(TestCase):
             holdings={'AAPL': 1},
             cash_balance=1000,
         )
-        mock_quote.return_value = {
-            'price': 100,
-            'currency': 'USD',
-            'fx_rate': 1,
-        }
+        mock_quotes.return_value = QuoteResults({
+            'AAPL': {'price': 100, 'currency': 'USD', 'fx_rate': 1},
+        })
         ctx = build_portfolio_context(portfolio)
         pos = ctx['positions'][0]
         expected_pos = Decimal('100') / Decimal('1100') * 100
@@ -575,6 +967,32 @@ class AllocationContextTests(TestCase):
         self.assertEqual(pos['allocation'], expected_pos)
         self.assertEqual(ctx['cash_allocation'], expected_cash)
 
+    @patch('portfolios.views.get_quotes')
+    def test_invalid_holdings_are_flagged(self, mock_quotes):
+        user = User.objects.create_user('invalid', password='pass')
+        portfolio = Portfolio.objects.create(
+            user=user,
+            name='Invalid Portfolio',
+            substack_url='https://invalid.substack.com',
+            holdings={'AAPL': 1, 'GONE': 2},
+        )
+        SymbolStatus.objects.create(
+            symbol='GONE',
+            is_valid=False,
+            reason='No listing found for GONE',
+            checked_at=timezone.now(),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        mock_quotes.return_value = QuoteResults(
+            {'AAPL': {'price': 100, 'currency': 'USD', 'fx_rate': 1}}
+        )
+        symbol_registry.clear()
+
+        ctx = build_portfolio_context(portfolio)
+
+        flags = {pos['symbol']: pos['invalid'] for pos in ctx['positions']}
+        self.assertEqual(flags, {'AAPL': False, 'GONE': True})
+
 
 class ExplorePageTests(TestCase):
     def setUp(self):
@@ -620,14 +1038,12 @@ class ExplorePageTests(TestCase):
             name='Gamma Stack',
             holdings={'AAPL': 5},
         )
-        with patch('portfolios.views.get_quote') as mock_get_quote:
-            mock_get_quote.return_value = {
-                'price': 100,
-                'currency': 'USD',
-                'fx_rate': 1,
-            }
+        with patch('portfolios.views.get_quotes') as mock_get_quotes:
+            mock_get_quotes.return_value = QuoteResults({
+                'AAPL': {'price': 100, 'currency': 'USD', 'fx_rate': 1},
+            })
             response = self.client.get(reverse('portfolios:portfolio-explore'))
-        mock_get_quote.assert_called_once_with('AAPL')
+        mock_get_quotes.assert_called_once_with(['AAPL'], light=True)
         self.assertContains(response, '$500.00')
 
 
@@ -658,9 +1074,10 @@ class FollowPortfolioTests(TestCase):
             self.portfolio.followers.filter(follower=self.viewer).exists()
         )
 
+    @patch('portfolios.views.market_hours.is_open', return_value=True)
     @patch('portfolios.views.get_quote')
     @patch('portfolios.views.send_email')
-    def test_follower_notified_on_trade(self, mock_send, mock_quote):
+    def test_follower_notified_on_trade(self, mock_send, mock_quote, mock_open):
         mock_quote.return_value = {
             'price': 100,
             'bid': 100,
@@ -884,9 +1301,10 @@ class NotificationPreferenceTests(TestCase):
         self.portfolio.followers.create(follower=self.weekly_follower)
         self.portfolio.followers.create(follower=self.none_follower)
 
+    @patch('portfolios.views.market_hours.is_open', return_value=True)
     @patch('portfolios.views.get_quote')
     @patch('portfolios.views.send_email')
-    def test_only_immediate_followers_receive_trade_emails(self, mock_send, mock_quote):
+    def test_only_immediate_followers_receive_trade_emails(self, mock_send, mock_quote, mock_open):
         mock_quote.return_value = {
             "price": 10,
             "currency": "USD",
@@ -1011,9 +1429,9 @@ class SnapshotAdjustmentTests(TestCase):
             cash_balance=Decimal('0'),
         )
 
-    def _run_command(self, ticker, quote, now):
+    def _run_command(self, provider, quote, now):
         with patch('portfolios.management.commands.take_snapshots.sys.exit'), \
-             patch('portfolios.management.commands.take_snapshots.yf.Ticker', return_value=ticker), \
+             patch('portfolios.management.commands.take_snapshots.get_provider', return_value=provider), \
              patch('portfolios.management.commands.take_snapshots.get_quotes', return_value={'AAPL': quote}), \
              patch('portfolios.management.commands.take_snapshots.get_quote', return_value=quote), \
              patch('portfolios.management.commands.take_snapshots.get_benchmark_prices_usd', return_value={}), \
@@ -1024,9 +1442,12 @@ class SnapshotAdjustmentTests(TestCase):
         now = timezone.datetime(2024, 5, 1, tzinfo=pytz.UTC)
         splits = pd.Series({pd.Timestamp(now.date()): 2})
         dividends = pd.Series({pd.Timestamp(now.date()): 1})
-        ticker = Mock(splits=splits, dividends=dividends)
+        provider = Mock(
+            get_splits=Mock(return_value=splits),
+            get_dividends=Mock(return_value=dividends),
+        )
         quote = {'price': 10, 'fx_rate': 1}
-        self._run_command(ticker, quote, now)
+        self._run_command(provider, quote, now)
         self.portfolio.refresh_from_db()
         self.assertEqual(self.portfolio.holdings['AAPL'], 4)
         snapshot = PortfolioSnapshot.objects.get(portfolio=self.portfolio)
@@ -1036,9 +1457,12 @@ class SnapshotAdjustmentTests(TestCase):
         now = timezone.datetime(2024, 5, 1, tzinfo=pytz.UTC)
         splits = pd.Series(dtype=float)
         dividends = pd.Series({pd.Timestamp(now.date()): 1.5})
-        ticker = Mock(splits=splits, dividends=dividends)
+        provider = Mock(
+            get_splits=Mock(return_value=splits),
+            get_dividends=Mock(return_value=dividends),
+        )
         quote = {'price': 10, 'fx_rate': 1}
-        self._run_command(ticker, quote, now)
+        self._run_command(provider, quote, now)
         self.portfolio.refresh_from_db()
         self.assertEqual(self.portfolio.cash_balance, Decimal('3'))
         snapshot = PortfolioSnapshot.objects.get(portfolio=self.portfolio)
@@ -1048,10 +1472,13 @@ class SnapshotAdjustmentTests(TestCase):
         now = timezone.datetime(2024, 5, 1, tzinfo=pytz.UTC)
         splits = pd.Series(dtype=float)
         dividends = pd.Series({pd.Timestamp(now.date()): 150})
-        ticker = Mock(splits=splits, dividends=dividends)
+        provider = Mock(
+            get_splits=Mock(return_value=splits),
+            get_dividends=Mock(return_value=dividends),
+        )
         quote = {'price': 10, 'fx_rate': 1, 'native_currency': 'GBp'}
 
-        self._run_command(ticker, quote, now)
+        self._run_command(provider, quote, now)
 
         self.portfolio.refresh_from_db()
         # 150 pence dividend = £1.50 per share; holdings of 2 → £3.00 credited
@@ -1107,3 +1534,336 @@ class DeleteSnapshotsCommandTests(TestCase):
 
         self.assertFalse(PortfolioSnapshot.objects.filter(portfolio=self.portfolio).exists())
         self.assertTrue(PortfolioSnapshot.objects.filter(portfolio=other_portfolio).exists())
+
+
+class BatchQuoteViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('batch', password='pass')
+        self.client.login(username='batch', password='pass')
+
+    def _results(self, symbol, quote=None, invalid=None):
+        results = QuoteResults()
+        if quote is not None:
+            results[symbol] = quote
+        if invalid is not None:
+            results.invalid[symbol] = invalid
+        return results
+
+    @patch('portfolios.views.iter_quotes')
+    def test_quotes_stream_as_ndjson(self, mock_iter):
+        mock_iter.return_value = iter([
+            ('AAPL', self._results('AAPL', {
+                'price': 100, 'currency': 'USD', 'fx_rate': 1,
+                'longName': 'Apple Inc.', 'market_state': 'REGULAR',
+            })),
+            ('NOPE', self._results('NOPE', invalid='No listing')),
+        ])
+
+        response = self.client.get(reverse('portfolios:quotes-lookup'), {'symbols': 'aapl, nope,AAPL'})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        mock_iter.assert_called_once_with(['AAPL', 'NOPE'])
+        self.assertEqual(lines[0]['name'], 'Apple Inc.')
+        self.assertEqual(lines[1], {'symbol': 'NOPE', 'error': 'Ticker not found.'})
+
+    @patch('portfolios.views.iter_quotes')
+    def test_unknown_exchange_falls_back_to_quote_market_state(self, mock_iter):
+        mock_iter.return_value = iter([
+            ('MC.PA', self._results('MC.PA', {
+                'price': 600, 'currency': 'EUR', 'fx_rate': 1.1,
+                'longName': 'LVMH', 'market_state': 'REGULAR',
+            })),
+        ])
+
+        response = self.client.get(reverse('portfolios:quotes-lookup'), {'symbols': 'MC.PA'})
+
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertTrue(lines[0]['market_open'])
+
+    @override_settings(QUOTE_BATCH_MAX_SYMBOLS=2)
+    def test_too_many_symbols_rejected(self):
+        response = self.client.get(reverse('portfolios:quotes-lookup'), {'symbols': 'A,B,C'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class SymbolSearchTests(TestCase):
+    def test_nasdaq_directory_parsed_for_yahoo_symbols(self):
+        from portfolios.management.commands.refresh_symbol_listings import parse_listings
+
+        listings = parse_listings(
+            "ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol\n"
+            "BRK.B|Berkshire Hathaway Inc. Class B|N|BRK.B|N|100|N|BRK.B\n"
+            "ZXZZT|Test Issue|N|ZXZZT|N|100|Y|ZXZZT\n"
+            "File Creation Time: 0101202500:00|||||||\n"
+        )
+
+        self.assertEqual(listings, {'BRK-B': ('Berkshire Hathaway Inc. Class B', 'NYSE')})
+
+    @patch('portfolios.views.symbol_index.search')
+    def test_search_endpoint_returns_suggestions(self, mock_search):
+        User.objects.create_user('search', password='pass')
+        self.client.login(username='search', password='pass')
+        mock_search.return_value = [{'symbol': 'AAPL', 'name': 'Apple Inc.', 'exchange': 'Nasdaq'}]
+
+        response = self.client.get(reverse('portfolios:symbol-search'), {'q': 'app'})
+
+        mock_search.assert_called_once_with('app')
+        self.assertEqual(response.json()['results'][0]['symbol'], 'AAPL')
+
+
+@patch('portfolios.views.market_hours.is_open', return_value=True)
+@patch('portfolios.views.get_quote')
+class QuoteLockTests(TestCase):
+    quote = {
+        'price': 100.0,
+        'bid': 99.5,
+        'ask': 100.5,
+        'traded_today': True,
+        'currency': 'USD',
+        'fx_rate': 1.0,
+        'market_state': 'REGULAR',
+        'longName': 'Apple Inc.',
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user('locker', password='pass')
+        self.portfolio = Portfolio.objects.create(
+            user=self.user,
+            name='Lock Portfolio',
+            substack_url='https://lock.substack.com',
+        )
+        self.client.login(username='locker', password='pass')
+
+    def _token(self, mock_quote):
+        mock_quote.return_value = self.quote
+        response = self.client.get(reverse('portfolios:quote-lookup'), {'symbol': 'AAPL'})
+        mock_quote.reset_mock()
+        return response.json()['quote_token']
+
+    def _order(self, token, symbol='AAPL'):
+        return self.client.post(
+            reverse('portfolios:order-create'),
+            {'symbol': symbol, 'side': 'BUY', 'quantity': 2, 'quote_token': token},
+        )
+
+    def test_order_executes_on_previewed_quote(self, mock_quote, mock_open):
+        token = self._token(mock_quote)
+
+        self._order(token)
+
+        mock_quote.assert_not_called()
+        order = self.portfolio.orders.get()
+        self.assertEqual(order.price_executed, Decimal('100'))
+
+    def test_token_for_other_symbol_or_user_is_ignored(self, mock_quote, mock_open):
+        token = self._token(mock_quote)
+        mock_quote.return_value = {**self.quote, 'price': 50.0}
+
+        self._order(token, symbol='MSFT')
+        mock_quote.assert_called_once_with('MSFT', allow_stale=False)
+
+        other = User.objects.create_user('other', password='pass')
+        Portfolio.objects.create(user=other, name='Other', substack_url='https://other.substack.com')
+        self.client.login(username='other', password='pass')
+        mock_quote.reset_mock()
+        self._order(token)
+        mock_quote.assert_called_once_with('AAPL', allow_stale=False)
+
+    def test_expired_or_tampered_token_fetches_again(self, mock_quote, mock_open):
+        token = self._token(mock_quote)
+        mock_quote.return_value = {**self.quote, 'price': 110.0}
+
+        self._order(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+        mock_quote.assert_called_once()
+
+        mock_quote.reset_mock()
+        with override_settings(QUOTE_LOCK_SECONDS=0):
+            self._order(token)
+        mock_quote.assert_called_once()
+        self.assertEqual(
+            sorted(self.portfolio.orders.values_list('price_executed', flat=True)),
+            [Decimal('110'), Decimal('110')],
+        )
+
+    def test_expired_cached_quote_is_refetched_before_locking(self, mock_quote, mock_open):
+        quote_cache.get_cache().clear()
+        # Past the open-market TTL but inside the stale window
+        quote_cache.store_quotes({'AAPL': self.quote}, fetched_at=time.time() - 120)
+        mock_quote.side_effect = get_quote
+        fresh = QuoteResults({'AAPL': {**self.quote, 'price': 105.0}})
+
+        with patch('core.yfinance_client._fetch_quotes', return_value=fresh) as mock_fetch:
+            response = self.client.get(reverse('portfolios:quote-lookup'), {'symbol': 'AAPL'})
+        mock_fetch.assert_called_once_with(['AAPL'])
+        mock_quote.reset_mock()
+
+        self._order(response.json()['quote_token'])
+
+        mock_quote.assert_not_called()
+        self.assertEqual(self.portfolio.orders.get().price_executed, Decimal('105'))
+
+    def test_stale_quote_is_not_locked(self, mock_quote, mock_open):
+        mock_quote.return_value = {**self.quote, 'stale': True}
+
+        response = self.client.get(reverse('portfolios:quote-lookup'), {'symbol': 'AAPL'})
+
+        self.assertIsNone(response.json()['quote_token'])
+
+
+class IntradayValueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('intra', password='pass')
+        self.portfolio = Portfolio.objects.create(
+            user=self.user,
+            name='Intraday Portfolio',
+            substack_url='https://intra.substack.com',
+            cash_balance=Decimal('1000'),
+            holdings={'AAPL': 2, 'VOD.L': 100},
+        )
+        Instrument.objects.create(symbol='AAPL', currency='USD', refreshed_at=timezone.now())
+        Instrument.objects.create(symbol='VOD.L', currency='GBp', refreshed_at=timezone.now())
+
+    @patch('portfolios.intraday.fx.get_fx_rates', return_value={'USD': 1.0, 'GBP': 1.25})
+    @patch('portfolios.intraday.price_history.get_closes')
+    @patch('portfolios.intraday.intraday.get_bars')
+    def test_curve_combines_cached_bars(self, mock_bars, mock_closes, mock_fx):
+        index = pd.date_range('2024-05-01 13:30', periods=3, freq='min', tz='UTC')
+        mock_bars.return_value = {
+            'AAPL': pd.Series([100.0, 101.0], index=index[1:]),
+            'VOD.L': pd.Series([80.0, 82.0], index=index[[0, 2]]),
+        }
+        mock_closes.return_value = {'AAPL': pd.Series([99.0])}
+
+        response = self.client.get(
+            reverse('portfolios:portfolio-intraday', kwargs={'tag': self.portfolio.url_tag})
+        )
+
+        points = response.json()['points']
+        self.assertEqual([pt['value'] for pt in points], [1000 + 198 + 100, 1000 + 200 + 100, 1000 + 202 + 102.5])
+        self.assertEqual(points[0]['timestamp'], '2024-05-01T13:30:00+00:00')
+
+    @patch('portfolios.intraday.get_instruments')
+    @patch('portfolios.intraday.fx.get_fx_rates', return_value={'USD': 1.0, 'GBP': 1.25})
+    @patch('portfolios.intraday.price_history.get_closes', return_value={})
+    @patch('portfolios.intraday.intraday.get_bars')
+    def test_holding_with_unknown_currency_is_left_out(self, mock_bars, mock_closes, mock_fx, mock_instruments):
+        index = pd.date_range('2024-05-01 13:30', periods=2, freq='min', tz='UTC')
+        mock_bars.return_value = {
+            'AAPL': pd.Series([100.0, 101.0], index=index),
+            'VOD.L': pd.Series([80.0, 82.0], index=index),
+        }
+        mock_instruments.return_value = {'AAPL': Instrument.objects.get(symbol='AAPL')}
+
+        response = self.client.get(
+            reverse('portfolios:portfolio-intraday', kwargs={'tag': self.portfolio.url_tag})
+        )
+
+        self.assertEqual([pt['value'] for pt in response.json()['points']], [1000 + 200, 1000 + 202])
+
+
+@override_settings(LIVE_STREAM_ENABLED=True)
+class LivePortfolioStreamTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('liveowner', password='pass')
+        self.portfolio = Portfolio.objects.create(
+            user=self.owner,
+            name='Live Portfolio',
+            substack_url='https://live.substack.com',
+            cash_balance=Decimal('100'),
+            holdings={'AAPL': 2},
+            is_private=True,
+        )
+
+    def _first_event(self, mock_subscribe):
+        mock_subscribe.return_value.wait.return_value = {
+            'AAPL': {'price': 10.5, 'currency': 'USD', 'fx_rate': 1.0},
+        }
+        response = self.client.get(
+            reverse('portfolios:portfolio-live', kwargs={'tag': self.portfolio.url_tag})
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        next(chunks)  # reconnect delay
+        event = next(chunks).decode()
+        response.close()
+        mock_subscribe.return_value.close.assert_called_once()
+        return json.loads(event.split('data: ', 1)[1])
+
+    @patch('portfolios.views.live_quotes.subscribe')
+    def test_owner_gets_value_and_prices(self, mock_subscribe):
+        self.client.login(username='liveowner', password='pass')
+
+        data = self._first_event(mock_subscribe)
+
+        mock_subscribe.assert_called_once_with({'AAPL': 2})
+        self.assertEqual(Decimal(data['total_value']), Decimal('121'))
+        self.assertEqual(data['positions']['AAPL']['price'], '10.5')
+
+    @patch('portfolios.views.live_quotes.subscribe')
+    def test_private_portfolio_streams_value_only(self, mock_subscribe):
+        data = self._first_event(mock_subscribe)
+
+        self.assertEqual(Decimal(data['total_value']), Decimal('121'))
+        self.assertNotIn('positions', data)
+
+    @override_settings(LIVE_STREAM_ENABLED=False)
+    @patch('portfolios.views.live_quotes.subscribe')
+    def test_stream_is_off_unless_enabled(self, mock_subscribe):
+        response = self.client.get(
+            reverse('portfolios:portfolio-live', kwargs={'tag': self.portfolio.url_tag})
+        )
+
+        self.assertEqual(response.status_code, 404)
+        mock_subscribe.assert_not_called()
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('watcher', password='pass')
+        self.client.login(username='watcher', password='pass')
+
+    @patch('portfolios.views.get_quote')
+    def test_add_and_remove_symbols(self, mock_quote):
+        mock_quote.return_value = {'price': 1, 'currency': 'USD', 'fx_rate': 1}
+        url = reverse('portfolios:watchlist')
+
+        self.client.post(url, {'action': 'add', 'symbol': ' msft '})
+        self.client.post(url, {'action': 'add', 'symbol': 'MSFT'})
+        mock_quote.side_effect = InvalidSymbolError('NOPE')
+        response = self.client.post(url, {'action': 'add', 'symbol': 'nope'})
+
+        self.assertContains(response, 'is not a recognised ticker')
+        self.assertEqual(Watchlist.for_user(self.user).symbols, ['MSFT'])
+
+        self.client.post(url, {'action': 'remove', 'symbol': 'MSFT'})
+        self.assertEqual(Watchlist.for_user(self.user).symbols, [])
+
+    @patch('portfolios.views.symbol_index.add')
+    @patch('portfolios.views.get_quote')
+    def test_added_symbol_is_indexed_with_its_name_but_not_as_traded(self, mock_quote, mock_add):
+        mock_quote.return_value = {
+            'price': 1, 'currency': 'USD', 'fx_rate': 1, 'longName': 'Microsoft Corporation',
+        }
+
+        self.client.post(reverse('portfolios:watchlist'), {'action': 'add', 'symbol': 'MSFT'})
+
+        mock_add.assert_called_once_with('MSFT', 'Microsoft Corporation', traded=False)
+
+    @patch('portfolios.views.get_quotes')
+    def test_quotes_fetch_only_cold_symbols_in_one_batch(self, mock_quotes):
+        Watchlist.objects.create(user=self.user, symbols=['AAPL', 'MSFT', 'NOPE'])
+        store_latest_quotes({'AAPL': {'price': 190, 'currency': 'USD', 'fx_rate': 1}})
+        fetched = QuoteResults({'MSFT': {'price': 400, 'currency': 'USD', 'fx_rate': 1}})
+        fetched.invalid['NOPE'] = 'No listing found for NOPE'
+        mock_quotes.return_value = fetched
+
+        response = self.client.get(reverse('portfolios:watchlist-quotes'))
+
+        mock_quotes.assert_called_once_with(['MSFT', 'NOPE'], light=True)
+        quotes = response.json()['quotes']
+        self.assertEqual([row['symbol'] for row in quotes], ['AAPL', 'MSFT', 'NOPE'])
+        self.assertEqual(quotes[0]['price'], 190)
+        self.assertEqual(quotes[1]['price'], 400)
+        self.assertEqual(quotes[2]['error'], 'Ticker not found.')
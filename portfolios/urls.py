@@ -13,8 +13,15 @@ urlpatterns = [
     path("create/", views.PortfolioCreateView.as_view(), name="portfolio-create"),
     path("order/", views.OrderCreateView.as_view(), name="order-create"),
     path("quote/", views.lookup_quote, name="quote-lookup"),
+    path("quotes/", views.lookup_quotes, name="quotes-lookup"),
+    path("symbols/search/", views.search_symbols, name="symbol-search"),
     path("toggle-privacy/", views.toggle_privacy, name="portfolio-toggle-privacy"),
     path("follow/<slug:tag>/", views.toggle_follow, name="portfolio-follow-toggle"),
     path("allow-list/", views.allow_list, name="portfolio-allow-list"),
+    path("watchlist/", views.watchlist, name="watchlist"),
+    path("watchlist/quotes/", views.watchlist_quotes, name="watchlist-quotes"),
     path("history/", views.portfolio_history, name="portfolio-history"),
+    path("chart/<slug:tag>/", views.portfolio_chart, name="portfolio-chart"),
+    path("intraday/<slug:tag>/", views.portfolio_intraday, name="portfolio-intraday"),
+    path("live/<slug:tag>/", views.portfolio_live, name="portfolio-live"),
 ]
@@ -1,36 +1,55 @@
 from django.shortcuts import redirect, get_object_or_404, render
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, CreateView, ListView
-from django.db.models import Q
+from django.db.models import Count, Max, Q
 from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from django.utils.cache import (
+    add_never_cache_headers,
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from django.core.cache import cache
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from decimal import Decimal
 from urllib.parse import urlparse, urlunparse
+import gzip
+import hashlib
 import random
+import time
 import feedparser
 
-from core.yfinance_client import get_quote
+from core import live_quotes, market_hours, quote_lock, rate_limit, symbol_index
+from core.symbol_registry import invalid_symbols
+from core.circuit_breaker import retry_budget
+from core.middleware import DEFAULT_REQUEST_RETRY_BUDGET
+from core.instruments import get_instruments
+from core.yfinance_client import InvalidSymbolError, QuoteResults, get_quote, get_quotes, iter_quotes
 from core.email import send_email
-from .models import Portfolio, Order, PortfolioSnapshot, PortfolioFollower, PortfolioAllowedEmail, NotificationSetting
+from .models import LatestQuote, Portfolio, Order, PortfolioSnapshot, PortfolioFollower, PortfolioAllowedEmail, NotificationSetting, Watchlist
 from .constants import BENCHMARK_CHOICES
+from . import charts
+from .intraday import intraday_values
+from .pricing import latest_quotes
 from .forms import (
     PortfolioForm,
     OrderForm,
     AllowedEmailForm,
     AllowedEmailUploadForm,
+    WatchlistSymbolForm,
     AccountForm,
     NotificationSettingForm,
 )
 from core.forms import EmailVerificationForm
-import yfinance as yf
 import json
 import csv
 from io import StringIO
@@ -40,6 +59,17 @@ try:
 except ImportError:  # pragma: no cover
     load_workbook = None
 
+DEFAULT_QUOTE_BATCH_MAX_SYMBOLS = 50
+DEFAULT_CHART_MAX_AGE = 5 * 60
+DEFAULT_PUBLIC_PAGE_CACHE_SECONDS = 60
+# Bump when the public page markup changes, so cached copies are not reused
+PUBLIC_PAGE_VERSION = 1
+PUBLIC_PAGE_KEY = "public-portfolio-page:{etag}"
+DEFAULT_LIVE_STREAM_ENABLED = False
+DEFAULT_LIVE_STREAM_SECONDS = 5 * 60
+DEFAULT_LIVE_STREAM_KEEPALIVE = 20
+LIVE_STREAM_RETRY_MS = 5000
+
 
 def _fetch_substack_metadata(substack_url):
     parsed_url = urlparse(substack_url)
@@ -57,20 +87,59 @@ def _fetch_substack_metadata(substack_url):
     return title, subtitle
 
 
-def _get_position_value(symbol, qty):
-    """Return tuple of (mid_local, currency, fx_rate, value_usd) for a holding."""
-    try:
-        quote = get_quote(symbol)
+def _valuation_quotes(symbols):
+    """Return ``{symbol: quote}`` for valuing ``symbols``.
+
+    Stored quotes are used where fresh; the rest come from one batched
+    light ``get_quotes`` call, since valuing a holding only needs price,
+    currency and FX. Symbols that cannot be priced are left out, so a
+    failing holding only blanks its own row.
+    """
+    symbols = list(symbols)
+    quotes = dict(latest_quotes(symbols))
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    if missing:
+        try:
+            quotes.update(get_quotes(missing, light=True))
+        except Exception:
+            pass
+    return quotes
+
+
+def _shared_fx_rates(quotes):
+    """Return one USD rate per quote currency, taken from its freshest quote.
+
+    Stored and freshly fetched quotes can carry rates from different
+    moments; valuing every position in a currency at the same rate keeps
+    the positions consistent with each other and with the total.
+    """
+    now = timezone.now()
+    rates = {}
+    for quote in quotes.values():
+        currency, rate = quote.get("currency"), quote.get("fx_rate")
+        if currency is None or rate is None:
+            continue
+        # Stale fallbacks rank below any live or stored quote
+        freshness = (not quote.get("stale"), quote.get("fetched_at") or now)
+        if currency not in rates or freshness > rates[currency][1]:
+            rates[currency] = (rate, freshness)
+    return {currency: rate for currency, (rate, _) in rates.items()}
+
+
+def _get_position_value(qty, quote, fx_rates=None):
+    """Return tuple of (mid_local, currency, fx_rate, value_usd) for a holding.
+
+    All four are ``None`` when ``quote`` is missing or incomplete.
+    """
+    if quote:
         price_val = quote.get("price")
         currency = quote.get("currency")
-        fx_rate_val = quote.get("fx_rate")
+        fx_rate_val = (fx_rates or {}).get(currency, quote.get("fx_rate"))
         if price_val is not None and fx_rate_val is not None:
             mid_local = Decimal(str(price_val))
             fx_rate = Decimal(str(fx_rate_val))
             value_usd = mid_local * fx_rate * Decimal(str(qty))
             return mid_local, currency, fx_rate, value_usd
-    except Exception:
-        pass
     return None, None, None, None
 
 
@@ -78,12 +147,13 @@ def build_portfolio_context(p, include_details=True):
     """Return context data for a portfolio."""
     positions = []
     total_value = p.cash_balance
+    invalid = invalid_symbols(p.holdings) if include_details else {}
+    quotes = _valuation_quotes(p.holdings)
+    fx_rates = _shared_fx_rates(quotes)
     for symbol, qty in p.holdings.items():
-        mid_local = currency = fx_rate = value_usd = None
-        if include_details:
-            mid_local, currency, fx_rate, value_usd = _get_position_value(symbol, qty)
-        else:
-            _, _, _, value_usd = _get_position_value(symbol, qty)
+        mid_local, currency, fx_rate, value_usd = _get_position_value(
+            qty, quotes.get(symbol), fx_rates
+        )
 
         if include_details:
             positions.append({
@@ -93,6 +163,7 @@ def build_portfolio_context(p, include_details=True):
                 "currency": currency,
                 "fx_rate": fx_rate,
                 "value_usd": value_usd,
+                "invalid": symbol in invalid,
             })
 
         if value_usd is not None:
@@ -122,74 +193,19 @@ def build_portfolio_context(p, include_details=True):
                 "total_value_usd": total_usd,
             })
 
-    history_data = []
-    for snap in p.snapshots.all().order_by("timestamp"):
-        history_data.append({
-            "date": snap.timestamp.date().isoformat(),
-            "value": snap.total_value,
-        })
-    if not history_data:
-        history_data.append({
-            "date": timezone.now().date().isoformat(),
-            "value": total_value,
-        })
-
-    benchmark_data = []
-    snaps = list(p.snapshots.all().order_by("timestamp"))
-    if snaps:
-        per_ticker = {t: [] for t, _ in BENCHMARK_CHOICES}
-        for snap in snaps:
-            date_iso = snap.timestamp.date().isoformat()
-            for ticker, _ in BENCHMARK_CHOICES:
-                price = snap.benchmark_values.get(ticker)
-                if price is not None:
-                    per_ticker[ticker].append({"date": date_iso, "price_usd": price})
-        for ticker, name in BENCHMARK_CHOICES:
-            pts = per_ticker[ticker]
-            if pts:
-                base = pts[0]["price_usd"]
-                for pt in pts:
-                    pt["price_usd"] = (pt["price_usd"] / base) * 100_000
-            benchmark_data.append({
-                "ticker": ticker,
-                "label": name,
-                "data": pts,
-            })
-    else:
-        for ticker, name in BENCHMARK_CHOICES:
-            benchmark_data.append({
-                "ticker": ticker,
-                "label": name,
-                "data": [],
-            })
-
+    # Selected benchmarks first; chart data is fetched from portfolio_chart
     default_benchmarks = p.benchmarks
-
-    if benchmark_data and default_benchmarks:
-        default_set = set(default_benchmarks)
-        ordered_data = []
-
-        for ticker, _ in BENCHMARK_CHOICES:
-            if ticker in default_set:
-                match = next((bm for bm in benchmark_data if bm["ticker"] == ticker), None)
-                if match:
-                    ordered_data.append(match)
-
-        for bm in benchmark_data:
-            if bm["ticker"] not in default_set:
-                ordered_data.append(bm)
-
-        benchmark_data = ordered_data
+    benchmark_data = sorted(
+        ({"ticker": ticker, "label": label} for ticker, label in BENCHMARK_CHOICES),
+        key=lambda bm: bm["ticker"] not in default_benchmarks,
+    )
 
     return {
         "positions": positions if include_details else [],
         "total_value": total_value,
         "cash_allocation": cash_allocation if include_details else None,
         "orders_data": orders_data if include_details else [],
-        "history_data": history_data,
-        "history_data_json": json.dumps(history_data, cls=DjangoJSONEncoder),
         "benchmark_data": benchmark_data,
-        "benchmark_data_json": json.dumps(benchmark_data, cls=DjangoJSONEncoder),
         "default_benchmarks": default_benchmarks,
     }
 
@@ -234,9 +250,20 @@ class PortfolioDetailView(LoginRequiredMixin, DetailView):
         ctx["allowed_count"] = self.object.allowed_emails.count()
         ctx["followers_count"] = self.object.followers.count()
         ctx["order_form"] = OrderForm()
+        ctx["live_stream"] = _live_stream_enabled()
         return ctx
 
 
+def _live_stream_enabled():
+    """Whether detail pages open a live value stream.
+
+    Each open stream holds a worker for ``LIVE_STREAM_SECONDS``, so it stays
+    off unless the deployment runs threaded or async workers to carry it.
+    """
+
+    return getattr(settings, "LIVE_STREAM_ENABLED", DEFAULT_LIVE_STREAM_ENABLED)
+
+
 def _get_followed_portfolios_for_user(user):
     followed_rels = (
         PortfolioFollower.objects.select_related("portfolio", "portfolio__user")
@@ -267,6 +294,74 @@ def _get_followed_portfolios_for_user(user):
     return followed_portfolios
 
 
+def _viewer_access(user, portfolio):
+    """Return (is_owner, is_allowed) for ``user`` viewing ``portfolio``."""
+
+    is_owner = user.is_authenticated and user == portfolio.user
+    is_allowed = False
+    if portfolio.is_private and user.is_authenticated and not is_owner:
+        identifier = user.email or user.username
+        is_allowed = portfolio.allowed_emails.filter(email=identifier).exists()
+    return is_owner, is_allowed
+
+
+def _public_page_seconds():
+    return getattr(settings, "PUBLIC_PAGE_CACHE_SECONDS", DEFAULT_PUBLIC_PAGE_CACHE_SECONDS)
+
+
+def _public_page_validators(portfolio, user):
+    """Return (ETag, last modified timestamp) for ``user``'s view of a public page.
+
+    The ETag changes with the last order, the snapshot history, the
+    privacy flag and followers, and with who is viewing. The page also shows
+    live values, so it changes with the latest stored quote for a holding
+    and, for values priced upstream, every ``PUBLIC_PAGE_CACHE_SECONDS``.
+    """
+    orders = portfolio.orders.aggregate(last_id=Max("id"), latest=Max("executed_at"))
+    priced = LatestQuote.objects.filter(
+        symbol__in={symbol.upper() for symbol in portfolio.holdings}
+    ).aggregate(latest=Max("fetched_at"))["latest"]
+    seconds = max(1, _public_page_seconds())
+    bucket = int(timezone.now().timestamp() // seconds)
+    snapshots = portfolio.snapshots.aggregate(
+        count=Count("id"), last_id=Max("id"), latest=Max("timestamp")
+    )
+    followers = portfolio.followers.aggregate(count=Count("id"), latest=Max("created_at"))
+    viewer = "anonymous"
+    if user.is_authenticated:
+        following = portfolio.followers.filter(follower=user).exists()
+        viewer = f"user:{user.pk}:{int(following)}"
+    key = ":".join(str(part) for part in (
+        PUBLIC_PAGE_VERSION,
+        portfolio.url_tag,
+        orders["last_id"],
+        snapshots["count"],
+        snapshots["last_id"],
+        snapshots["latest"],
+        int(portfolio.is_private),
+        followers["count"],
+        portfolio.name,
+        portfolio.short_description,
+        ",".join(portfolio.benchmarks),
+        priced,
+        bucket,
+        viewer,
+    ))
+    etag = quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+    last_modified = max(
+        moment.timestamp()
+        for moment in (
+            portfolio.created_at,
+            orders["latest"],
+            followers["latest"],
+            snapshots["latest"],
+            priced,
+        )
+        if moment is not None
+    )
+    return etag, max(last_modified, bucket * seconds)
+
+
 class PublicPortfolioDetailView(DetailView):
     model = Portfolio
     template_name = "portfolios/portfolio_detail.html"
@@ -277,21 +372,48 @@ class PublicPortfolioDetailView(DetailView):
     def get_queryset(self):
         return Portfolio.objects.filter(is_deleted=False)
 
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        self.viewer_access = _viewer_access(request.user, self.object)
+        if any(self.viewer_access):
+            # Owners and allow-listed viewers always get a fresh page
+            response = self.render_to_response(self.get_context_data(object=self.object))
+            add_never_cache_headers(response)
+            return response
+
+        etag, last_modified = _public_page_validators(self.object, request.user)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            # Anonymous viewers of public portfolios share one rendered page
+            shared = (
+                not request.user.is_authenticated
+                and not self.object.is_private
+                and not messages.get_messages(request)
+            )
+            key = PUBLIC_PAGE_KEY.format(etag=etag.strip('"'))
+            content = cache.get(key) if shared else None
+            if content is not None:
+                response = HttpResponse(content)
+            else:
+                response = self.render_to_response(self.get_context_data(object=self.object))
+                response.render()
+                if shared:
+                    cache.set(key, response.content, _public_page_seconds())
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=_public_page_seconds())
+        return response
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        is_owner = (
-            self.request.user.is_authenticated and self.request.user == self.object.user
+        is_owner, is_allowed = getattr(self, "viewer_access", None) or _viewer_access(
+            self.request.user, self.object
         )
-        is_allowed = False
-        if (
-            self.object.is_private
-            and self.request.user.is_authenticated
-            and self.request.user != self.object.user
-        ):
-            identifier = self.request.user.email or self.request.user.username
-            is_allowed = self.object.allowed_emails.filter(
-                email=identifier
-            ).exists()
         include_details = is_owner or not self.object.is_private or is_allowed
         ctx.update(build_portfolio_context(self.object, include_details=include_details))
         ctx["is_owner"] = is_owner
@@ -305,6 +427,7 @@ class PublicPortfolioDetailView(DetailView):
             ctx["is_following"] = False
         ctx["allowed_count"] = self.object.allowed_emails.count()
         ctx["followers_count"] = self.object.followers.count()
+        ctx["live_stream"] = _live_stream_enabled()
         return ctx
 
 
@@ -367,6 +490,38 @@ def toggle_follow(request, tag):
     return redirect("portfolios:portfolio-public-detail", tag=tag)
 
 
+def _market_open(symbol, quote):
+    """Whether ``symbol``'s market is open, from the exchange calendar or,
+    for exchanges it does not know, the quote's own ``market_state``."""
+
+    is_open = market_hours.is_open(symbol)
+    if is_open is None:
+        return (quote or {}).get("market_state") == "REGULAR"
+    return is_open
+
+
+def _quote_payload(symbol, quote):
+    """JSON body describing ``quote``, or ``None`` when it is incomplete."""
+
+    display_name = quote.get("longName") or quote.get("shortName")
+    price = quote.get("price")
+    currency = quote.get("currency")
+    fx_rate = quote.get("fx_rate")
+
+    if display_name is None or price is None or currency is None or fx_rate is None:
+        return None
+
+    return {
+        "symbol": (quote.get("symbol") or symbol).upper(),
+        "name": display_name,
+        "price": price,
+        "currency": currency,
+        "fx_rate": fx_rate,
+        "market_state": quote.get("market_state"),
+        "market_open": _market_open(symbol, quote),
+    }
+
+
 @login_required
 def lookup_quote(request):
     symbol = request.GET.get("symbol", "").strip()
@@ -374,30 +529,77 @@ def lookup_quote(request):
         return JsonResponse({"error": "Please enter a ticker symbol."}, status=400)
 
     try:
-        quote = get_quote(symbol)
+        # The previewed quote may be locked for execution, so it must be fresh
+        quote = get_quote(symbol, allow_stale=False)
+    except InvalidSymbolError:
+        return JsonResponse({"error": "Ticker not found. Please try another."}, status=404)
     except Exception:
         return JsonResponse({"error": "Unable to fetch quote for that ticker."}, status=400)
 
-    display_name = quote.get("longName") or quote.get("shortName")
-    price = quote.get("price")
-    currency = quote.get("currency")
-    fx_rate = quote.get("fx_rate")
-
-    if display_name is None or price is None or currency is None or fx_rate is None:
+    payload = _quote_payload(symbol, quote)
+    if payload is None:
         return JsonResponse({"error": "Ticker not found. Please try another."}, status=404)
+    payload["quote_token"] = quote_lock.issue(request.user.pk, payload["symbol"], quote)
+    return JsonResponse(payload)
 
-    market_state = quote.get("market_state")
-    return JsonResponse(
-        {
-            "symbol": (quote.get("symbol") or symbol).upper(),
-            "name": display_name,
-            "price": price,
-            "currency": currency,
-            "fx_rate": fx_rate,
-            "market_state": market_state,
-            "market_open": market_state == "REGULAR",
-        }
+
+@login_required
+def search_symbols(request):
+    """Type-ahead ticker suggestions from the local symbol index (no upstream call)."""
+
+    return JsonResponse({"results": symbol_index.search(request.GET.get("q", ""))})
+
+
+def _quote_lines(symbols, caller):
+    # The middleware's retry budget and rate-limit caller have ended by the
+    # time a streamed body is sent
+    retries = getattr(settings, "UPSTREAM_REQUEST_RETRY_BUDGET", DEFAULT_REQUEST_RETRY_BUDGET)
+    with retry_budget(retries), rate_limit.for_caller(caller):
+        for symbol, results in iter_quotes(symbols):
+            payload = None
+            if symbol in results:
+                payload = _quote_payload(symbol, results[symbol])
+                if payload is not None and results[symbol].get("stale"):
+                    payload["stale"] = True
+            if payload is None:
+                if symbol in results or symbol in results.invalid:
+                    error = "Ticker not found."
+                elif symbol in results.timed_out:
+                    error = "Timed out fetching quote."
+                else:
+                    error = "Unable to fetch quote."
+                payload = {"symbol": symbol, "error": error}
+            yield json.dumps(payload, cls=DjangoJSONEncoder) + "\n"
+
+
+@login_required
+def lookup_quotes(request):
+    """Quotes for ``?symbols=AAPL,VOD.L,...`` streamed as NDJSON, one line per
+    symbol in the order they become available."""
+
+    symbols = list(
+        dict.fromkeys(
+            symbol.strip().upper()
+            for symbol in request.GET.get("symbols", "").split(",")
+            if symbol.strip()
+        )
     )
+    if not symbols:
+        return JsonResponse({"error": "Please enter at least one ticker symbol."}, status=400)
+    max_symbols = getattr(settings, "QUOTE_BATCH_MAX_SYMBOLS", DEFAULT_QUOTE_BATCH_MAX_SYMBOLS)
+    if len(symbols) > max_symbols:
+        return JsonResponse(
+            {"error": f"Please request at most {max_symbols} tickers at once."}, status=400
+        )
+
+    response = StreamingHttpResponse(
+        _quote_lines(symbols, rate_limit.request_caller(request)),
+        content_type="application/x-ndjson",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx buffering the stream so early lines reach the client at once
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required
@@ -476,6 +678,88 @@ def allow_list(request):
     )
 
 
+def _watchlist_quotes(symbols):
+    """One row per watched symbol: stored quotes first, the rest in one batch."""
+
+    quotes = latest_quotes(symbols)
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    fetched = get_quotes(missing, light=True) if missing else QuoteResults()
+    names = get_instruments(symbols, lookup=False)
+
+    rows = []
+    for symbol in symbols:
+        quote = quotes.get(symbol) or fetched.get(symbol)
+        if quote is None:
+            error = "Ticker not found." if symbol in fetched.invalid else "Quote unavailable."
+            rows.append({"symbol": symbol, "error": error})
+            continue
+        rows.append({
+            "symbol": symbol,
+            "name": names[symbol].display_name if symbol in names else "",
+            "price": quote.get("price"),
+            "currency": quote.get("currency"),
+            "fx_rate": quote.get("fx_rate"),
+            "market_open": _market_open(symbol, quote),
+            "stale": bool(quote.get("stale")),
+        })
+    return rows
+
+
+@login_required
+def watchlist(request):
+    watchlist = Watchlist.for_user(request.user)
+    form = WatchlistSymbolForm()
+    if request.method == "POST":
+        action = request.POST.get("action")
+        if action == "add":
+            form = WatchlistSymbolForm(request.POST)
+            max_symbols = getattr(
+                settings, "QUOTE_BATCH_MAX_SYMBOLS", DEFAULT_QUOTE_BATCH_MAX_SYMBOLS
+            )
+            if form.is_valid():
+                symbol = form.cleaned_data["symbol"]
+                if symbol in watchlist.symbols:
+                    return redirect("portfolios:watchlist")
+                if len(watchlist.symbols) >= max_symbols:
+                    form.add_error("symbol", f"A watchlist holds at most {max_symbols} tickers.")
+                else:
+                    try:
+                        # A full quote also records the name shown in the list
+                        quote = get_quote(symbol)
+                    except InvalidSymbolError:
+                        form.add_error("symbol", f"“{symbol}” is not a recognised ticker.")
+                    except Exception:
+                        form.add_error("symbol", f"Could not fetch a quote for “{symbol}”.")
+                    else:
+                        watchlist.symbols.append(symbol)
+                        watchlist.save(update_fields=["symbols", "updated_at"])
+                        symbol_index.add(
+                            symbol,
+                            quote.get("longName") or quote.get("shortName") or "",
+                            traded=False,
+                        )
+                        return redirect("portfolios:watchlist")
+        elif action == "remove":
+            symbol = request.POST.get("symbol", "").strip().upper()
+            if symbol in watchlist.symbols:
+                watchlist.symbols.remove(symbol)
+                watchlist.save(update_fields=["symbols", "updated_at"])
+            return redirect("portfolios:watchlist")
+    return render(
+        request,
+        "portfolios/watchlist.html",
+        {"watchlist": watchlist, "form": form},
+    )
+
+
+@login_required
+def watchlist_quotes(request):
+    """Quotes for every symbol on the user's watchlist in one batched lookup."""
+
+    watchlist = Watchlist.for_user(request.user)
+    return JsonResponse({"quotes": _watchlist_quotes(watchlist.symbols)})
+
+
 class PortfolioExploreView(ListView):
     model = Portfolio
     template_name = "portfolios/portfolio_explore.html"
@@ -548,6 +832,7 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
         ctx["private_view"] = False
         ctx["allowed_count"] = self.portfolio.allowed_emails.count()
         ctx["order_form"] = kwargs.get("form", OrderForm())
+        ctx["live_stream"] = _live_stream_enabled()
         return ctx
 
     #-------------
@@ -562,22 +847,26 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
 
         print(symbol, side, quantity)
 
-        # 1) Fetch price
+        # 1) Fetch price, reusing the quote the user previewed while it is locked
         try:
-            quote = get_quote(symbol)
+            quote = quote_lock.redeem(
+                form.cleaned_data.get("quote_token"), self.request.user.pk, symbol
+            ) or get_quote(symbol, allow_stale=False)
             price = Decimal(str(quote["price"]))
             bid = Decimal(str(quote["bid"])) if quote.get("bid") is not None else None
             ask = Decimal(str(quote["ask"])) if quote.get("ask") is not None else None
             traded_today = quote["traded_today"]
             currency = quote["currency"]
             fx_rate = Decimal(str(quote["fx_rate"]))
-            market_state = quote["market_state"]
             print(price, bid, ask, traded_today, currency, fx_rate)
+        except InvalidSymbolError:
+            form.add_error(None, f"“{symbol}” is not a recognised ticker.")
+            return self.form_invalid(form)
         except Exception:
             form.add_error(None, f"Could not fetch live quote for “{symbol}”.")
             return self.form_invalid(form)
 
-        if not settings.DEBUG and market_state != "REGULAR":
+        if not settings.DEBUG and not _market_open(symbol, quote):
             form.add_error(
                 None,
                 "Order failed because the market is currently closed."
@@ -626,6 +915,7 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
                 self.portfolio.holdings[symbol] = remaining
 
         self.portfolio.save()
+        symbol_index.add(symbol, quote.get("longName") or quote.get("shortName") or "")
         follower_emails = []
         for follower_rel in self.portfolio.followers.select_related(
             "follower__notification_setting"
@@ -671,30 +961,118 @@ def portfolio_history(request):
     if not p:
         return JsonResponse({"error": "Not found"}, status=404)
 
-    data = [
-        {
-            "timestamp": snap.timestamp.isoformat(),
-            "value": snap.total_value,
-        }
-        for snap in p.snapshots.all()
-    ]
+    body = charts.history_json(p)
+    if body is not None:
+        return HttpResponse(body, content_type="application/json")
 
     # Create single datapoint if no snapshots
-    if not data:
-        total_value = p.cash_balance
-        for symbol, qty in p.holdings.items():
-            try:
-                quote = get_quote(symbol)
-                total_value += Decimal(str(quote["price"])) * Decimal(str(quote["fx_rate"])) * Decimal(str(qty))
-            except Exception:
-                pass
-        data.append({
-            "timestamp": timezone.now().isoformat(),
-            "value": total_value,
-        })
+    total_value = p.cash_balance
+    quotes = _valuation_quotes(p.holdings)
+    fx_rates = _shared_fx_rates(quotes)
+    for symbol, qty in p.holdings.items():
+        value_usd = _get_position_value(qty, quotes.get(symbol), fx_rates)[3]
+        if value_usd is not None:
+            total_value += value_usd
+    data = [{
+        "timestamp": timezone.now().isoformat(),
+        "value": total_value,
+    }]
+    return JsonResponse(data, safe=False)
 
 
-    return JsonResponse(data, safe=False)
+def portfolio_chart(request, tag):
+    """Columnar value history and rebased benchmarks for the detail chart.
+
+    ``benchmarks`` picks the series (default: the portfolio's chosen ones)
+    and ``portfolio=0`` leaves out the portfolio's own values, for loading a
+    benchmark the viewer ticks later. Like the chart itself this is available
+    wherever the chart is shown.
+    """
+    p = get_object_or_404(Portfolio, url_tag=tag, is_deleted=False)
+    raw = request.GET.get("benchmarks")
+    tickers = charts.benchmark_tickers(",".join(p.benchmarks) if raw is None else raw)
+    include_portfolio = request.GET.get("portfolio") != "0"
+
+    etag = charts.chart_etag(p, tickers, include_portfolio)
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is None:
+        body = charts.compressed_payload(p, tickers, etag, include_portfolio)
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = HttpResponse(body, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type="application/json")
+        response["ETag"] = quote_etag(etag)
+    patch_vary_headers(response, ["Accept-Encoding"])
+    patch_cache_control(
+        response,
+        max_age=getattr(settings, "CHART_MAX_AGE", DEFAULT_CHART_MAX_AGE),
+        **{"private" if p.is_private else "public": True},
+    )
+    return response
+
+
+def portfolio_intraday(request, tag):
+    """Today's minute-by-minute value, built from the shared intraday bar cache.
+
+    Only the value chart is shown, so it is available wherever the chart is.
+    """
+    p = get_object_or_404(Portfolio, url_tag=tag, is_deleted=False)
+    return JsonResponse({"points": intraday_values(p)})
+
+
+def _live_value(holdings, cash_balance, quotes, include_details):
+    total_value = cash_balance
+    positions = {}
+    for symbol, qty in holdings.items():
+        quote = quotes.get(symbol.upper())
+        if quote is None or quote.get("price") is None or quote.get("fx_rate") is None:
+            continue
+        price = Decimal(str(quote["price"]))
+        total_value += price * Decimal(str(quote["fx_rate"])) * Decimal(str(qty))
+        if include_details:
+            positions[symbol] = {"price": price, "currency": quote.get("currency")}
+    payload = {"timestamp": timezone.now().isoformat(), "total_value": total_value}
+    if include_details:
+        payload["positions"] = positions
+    return payload
+
+
+def _live_events(holdings, cash_balance, include_details):
+    subscription = live_quotes.subscribe(holdings)
+    keepalive = getattr(settings, "LIVE_STREAM_KEEPALIVE", DEFAULT_LIVE_STREAM_KEEPALIVE)
+    # Streams end after a while; EventSource reconnects and picks up new trades
+    duration = getattr(settings, "LIVE_STREAM_SECONDS", DEFAULT_LIVE_STREAM_SECONDS)
+    ends_at = time.monotonic() + duration
+    try:
+        yield f"retry: {LIVE_STREAM_RETRY_MS}\n\n"
+        while time.monotonic() < ends_at:
+            quotes = subscription.wait(min(keepalive, max(0.0, ends_at - time.monotonic())))
+            if quotes is None:
+                yield ": keep-alive\n\n"
+                continue
+            payload = _live_value(holdings, cash_balance, quotes, include_details)
+            yield f"event: value\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+    finally:
+        subscription.close()
+
+
+def portfolio_live(request, tag):
+    """Server-sent events with the portfolio's live value (and position prices
+    for viewers who may see positions), fed by the shared live-quote loop."""
+
+    if not _live_stream_enabled():
+        raise Http404("Live streams are disabled.")
+    p = get_object_or_404(Portfolio, url_tag=tag, is_deleted=False)
+    is_owner, is_allowed = _viewer_access(request.user, p)
+    include_details = is_owner or not p.is_private or is_allowed
+    response = StreamingHttpResponse(
+        _live_events(dict(p.holdings), p.cash_balance, include_details),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required